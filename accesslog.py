@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import time
+import fcntl
+import atexit
+import itertools
+import threading
+from collections import deque
+
+# JSON-lines access and event log: a file path, "-" for stderr, or empty to turn logging off
+LOG_PATH = os.environ.get("ACCESS_LOG", "-")
+# A log file is rotated before it grows past this size, and at every boundary of this period (UTC)
+ROTATE_BYTES = int(os.environ.get("ACCESS_LOG_MAX_BYTES", 64 * 1024 * 1024))
+ROTATE_SECONDS = int(os.environ.get("ACCESS_LOG_ROTATE_SECONDS", 24 * 3600))
+# Rotated files kept next to the live one
+BACKUPS = int(os.environ.get("ACCESS_LOG_BACKUPS", 7))
+# The writer wakes this often and writes everything queued as one batch
+FLUSH_INTERVAL = 0.5
+# Once this many records wait, only one in SAMPLE_RATE is queued; at MAX_PENDING the rest are dropped
+SAMPLE_ABOVE = 10_000
+SAMPLE_RATE = 10
+MAX_PENDING = 50_000
+# Fields of an access record, in the order access() takes them
+ACCESS_FIELDS = ('client', 'method', 'path', 'route', 'status', 'bytes_in', 'bytes_out', 'handler_ms', 'user_agent')
+
+
+def _timestamp(ts):
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(ts)) + f".{int(ts % 1 * 1000):03d}Z"
+
+
+class EventLog:
+    """Structured log records queued by request threads and written in batches by a background thread.
+
+    Queuing a record is a deque append, which takes no lock, so handlers never wait on log I/O;
+    records are only turned into JSON by the writer. When the writer falls behind, records are
+    sampled and then dropped instead of letting the queue grow, and the next batch says how many.
+    """
+
+    def __init__(self, path=LOG_PATH, max_bytes=ROTATE_BYTES, rotate_seconds=ROTATE_SECONDS,
+                 backups=BACKUPS, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self._tickets = itertools.count()
+        self._reset()
+        if path:
+            # A forked worker starts its own writer; records queued before the fork are the parent's to write
+            os.register_at_fork(after_in_child=self._reset)
+            atexit.register(self.flush)
+
+    def _reset(self):
+        self._pending = deque()
+        self._writer = None
+        self._file = None
+        self._period = None
+        self._lock = threading.Lock()
+        # Counted without a lock, so a racing increment can be lost; they only report pressure
+        self.dropped = 0
+        self.sampled = 0
+        self._reported = (0, 0)
+
+    def access(self, client, method, path, route, status, bytes_in, bytes_out, seconds, user_agent):
+        """Queue one request's access record; seconds is the time spent handling it."""
+        if self.path:
+            self._queue('access', (client, method, path, route, status, bytes_in, bytes_out, seconds, user_agent))
+
+    def event(self, kind, **fields):
+        """Queue an application event, such as a chat message or a server error."""
+        if self.path:
+            self._queue(kind, fields)
+
+    def _queue(self, kind, data):
+        pending = len(self._pending)
+        rate = 1
+        if pending >= SAMPLE_ABOVE:
+            if pending >= MAX_PENDING:
+                self.dropped += 1
+                return
+            if next(self._tickets) % SAMPLE_RATE:
+                self.sampled += 1
+                return
+            rate = SAMPLE_RATE
+        self._pending.append((time.time(), kind, data, rate))
+        if self._writer is None:
+            self._start_writer()
+
+    def _start_writer(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_forever, name='event-log', daemon=True)
+                self._writer.start()
+
+    def _write_forever(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _format(self, ts, kind, data, rate, pid):
+        record = {'ts': _timestamp(ts), 'type': kind, 'pid': pid}
+        if kind == 'access':
+            record.update(zip(ACCESS_FIELDS, data))
+            record['handler_ms'] = round(record['handler_ms'] * 1000, 3)
+        else:
+            record.update(data)
+        if rate > 1:
+            record['sample_rate'] = rate
+        return json.dumps(record, separators=(',', ':'), default=str) + '\n'
+
+    def flush(self):
+        """Write out everything queued so far in one write."""
+        with self._lock:
+            pending = self._pending
+            pid = os.getpid()
+            # Only what is queued now; records added meanwhile wait for the next batch
+            lines = [self._format(*pending.popleft(), pid) for _ in range(len(pending))]
+            counts = (self.dropped, self.sampled)
+            if counts != self._reported:
+                lost = {'dropped': counts[0] - self._reported[0], 'sampled_out': counts[1] - self._reported[1]}
+                lines.append(self._format(time.time(), 'log_pressure', lost, 1, pid))
+                self._reported = counts
+            if not lines:
+                return
+            text = ''.join(lines)
+            try:
+                if self.path == '-':
+                    sys.stderr.write(text)
+                    sys.stderr.flush()
+                else:
+                    data = text.encode()
+                    self._output(len(data)).write(data)
+            except (OSError, ValueError):
+                # A full disk or closed stream loses this batch but must not stop the writer
+                self.dropped += len(lines)
+                self._close()
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'ab', buffering=0)
+        self._period = int(time.time() // self.rotate_seconds)
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _replaced(self):
+        """Whether the path no longer names our open file, because another process rotated it."""
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _output(self, size):
+        """The open log file, rotated first when size more bytes would overflow it or its period is over."""
+        if self._file is not None and self._replaced():
+            self._close()
+        if self._file is None:
+            self._open()
+        written = os.fstat(self._file.fileno()).st_size
+        period = int(time.time() // self.rotate_seconds)
+        if written and (written + size > self.max_bytes or period != self._period):
+            self._rotate()
+        self._period = period
+        return self._file
+
+    def _rotate(self):
+        # Prefork workers share the file: whoever takes the lock first renames it, the rest reopen
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            if not self._replaced():
+                stamp = time.strftime('%Y%m%d-%H%M%S', time.gmtime())
+                target = f"{self.path}.{stamp}"
+                n = 0
+                while os.path.exists(target):
+                    n += 1
+                    target = f"{self.path}.{stamp}-{n}"
+                os.rename(self.path, target)
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._close()
+        self._open()
+        self._prune()
+
+    def _prune(self):
+        directory = os.path.dirname(self.path) or '.'
+        prefix = os.path.basename(self.path) + '.'
+        rotated = sorted(name for name in os.listdir(directory) if name.startswith(prefix))
+        for name in rotated[:max(0, len(rotated) - self.backups)]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+# The log every server mode and the app core write to
+LOG = EventLog()
@@ -0,0 +1,201 @@
+import os
+import math
+import time
+import functools
+import threading
+from collections import Counter, OrderedDict
+
+# Request admission for POST/PUT routes: body size caps, token-bucket rate limits per user and
+# overall, and a budget of upload bytes being received at once. State is per process, so with
+# prefork workers each worker enforces its own share.
+MAX_FORM_BODY = 64 * 1024
+MAX_UPLOAD_BODY = int(os.environ.get("MAX_UPLOAD_BYTES", 1024 ** 3))
+# Uploads beyond this many bytes in flight are turned away with 503 until others finish
+MAX_INFLIGHT_UPLOAD_BYTES = int(os.environ.get("MAX_INFLIGHT_UPLOAD_BYTES", 4 * 1024 ** 3))
+# Retry-After sent with 503 when the upload budget is full
+BUSY_RETRY_AFTER = 5
+# (requests per second, burst) for each client, then for everyone together
+LOGIN_RATE = ((0.2, 10), (50, 100))
+CHAT_RATE = ((1, 5), (200, 400))
+EVENT_RATE = ((0.2, 20), (20, 100))
+UPLOAD_RATE = ((0.1, 3), (10, 20))
+UPLOAD_CHUNK_RATE = ((10, 100), (1000, 2000))
+# Idle per-client buckets are dropped beyond this many (they refill to full anyway)
+MAX_TRACKED_CLIENTS = 100_000
+
+_rejections = Counter()
+_rejections_lock = threading.Lock()
+
+
+def rejection_counts():
+    """{(route, reason): count} for every request turned away since startup."""
+    with _rejections_lock:
+        return dict(_rejections)
+
+
+class TokenBucket:
+    """rate tokens per second up to burst; take() returns 0 or the seconds until a token is due."""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """A token bucket per client key plus one shared by all clients."""
+
+    def __init__(self, per_client, overall=None, max_clients=MAX_TRACKED_CLIENTS):
+        self.per_client = per_client
+        self.overall = TokenBucket(*overall) if overall else None
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, key):
+        """Spend a token for key; returns 0 if allowed, else seconds to wait."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(*self.per_client)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            wait = bucket.take(now)
+            if wait or self.overall is None:
+                return wait
+            wait = self.overall.take(now)
+            if wait:
+                # The client is not at fault, so give its token back
+                bucket.tokens += 1
+            return wait
+
+
+class ByteBudget:
+    """Counts bytes in flight against a limit without blocking."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, n):
+        with self._lock:
+            if self.used + n > self.limit:
+                return False
+            self.used += n
+            return True
+
+    def release(self, n):
+        with self._lock:
+            self.used -= n
+
+
+class Policy:
+    """Admission rules for one route: a body size cap, an optional rate limit and byte budget."""
+
+    def __init__(self, name, max_body, limiter=None, budget=None):
+        self.name = name
+        self.max_body = max_body
+        self.limiter = limiter
+        self.budget = budget
+
+    def _reject(self, reason, status, retry_after=None):
+        with _rejections_lock:
+            _rejections[(self.name, reason)] += 1
+        return status, retry_after
+
+    def admit(self, content_length, key, chunked=False):
+        """Return None to let a request in, or (status, retry_after) to turn it away.
+
+        Runs before any of the body is read. An admitted request holds its length in the byte
+        budget until release().
+        """
+        if content_length is None:
+            if chunked:
+                return self._reject('length_required', 411)
+            content_length = 0
+        try:
+            length = int(content_length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            return self._reject('bad_length', 400)
+        if length > self.max_body:
+            return self._reject('too_large', 413)
+        if self.limiter is not None:
+            wait = self.limiter.check(key)
+            if wait:
+                return self._reject('rate_limited', 429, math.ceil(wait))
+        if self.budget is not None and not self.budget.acquire(length):
+            return self._reject('overloaded', 503, BUSY_RETRY_AFTER)
+        return None
+
+    def release(self, content_length):
+        if self.budget is not None:
+            self.budget.release(int(content_length or 0))
+
+
+class RouteLimits:
+    """The policies for one app's routes; uploads and resumable chunks share one byte budget."""
+
+    def __init__(self):
+        uploads = ByteBudget(MAX_INFLIGHT_UPLOAD_BYTES)
+        self.login = Policy('login', MAX_FORM_BODY, RateLimiter(*LOGIN_RATE))
+        self.signup = Policy('signup', MAX_FORM_BODY, RateLimiter(*LOGIN_RATE))
+        self.chat = Policy('chat', MAX_FORM_BODY, RateLimiter(*CHAT_RATE))
+        self.events = Policy('events', MAX_FORM_BODY, RateLimiter(*EVENT_RATE))
+        self.upload = Policy('upload', MAX_UPLOAD_BODY, RateLimiter(*UPLOAD_RATE), uploads)
+        self.upload_chunk = Policy('upload_chunk', MAX_UPLOAD_BODY, RateLimiter(*UPLOAD_CHUNK_RATE), uploads)
+
+
+def client_key(handler):
+    """Rate-limit key: the logged-in user where the handler has logins, else the client address."""
+    is_logged_in = getattr(handler, '_is_logged_in', None)
+    return (is_logged_in and is_logged_in()) or handler.client_address[0]
+
+
+def send_rejection(handler, status, retry_after=None):
+    handler.send_response(status)
+    if retry_after is not None:
+        handler.send_header('Retry-After', str(retry_after))
+    handler.send_header('Content-Length', '0')
+    # The body was never read, so the connection cannot be reused
+    handler.close_connection = True
+    handler.end_headers()
+
+
+def limited(policy):
+    """Decorator for BaseHTTPRequestHandler route methods: apply policy before the body is read.
+
+    Requests without a body (GET, HEAD, DELETE) go straight through.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(handler, *args, **kwargs):
+            if handler.command not in ('POST', 'PUT'):
+                return method(handler, *args, **kwargs)
+            length = handler.headers.get('Content-Length')
+            rejection = policy.admit(length, client_key(handler), 'Transfer-Encoding' in handler.headers)
+            if rejection is not None:
+                send_rejection(handler, *rejection)
+                return None
+            try:
+                return method(handler, *args, **kwargs)
+            finally:
+                policy.release(length)
+        return wrapper
+    return decorator
@@ -0,0 +1,238 @@
+import asyncio
+from time import perf_counter
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+import accesslog
+
+# Minimal HTTP/1.1 server on asyncio streams: one small coroutine per connection instead of a thread
+MAX_HEADER_SIZE = 16 * 1024
+READ_LIMIT = 64 * 1024
+IDLE_TIMEOUT = 30
+MAX_FORM_SIZE = 1024 * 1024
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=''):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    """A parsed request head; the body is read on demand from the connection's StreamReader."""
+
+    __slots__ = ('method', 'target', 'path', 'query', 'version', 'headers', 'reader', 'remaining', 'client')
+
+    def __init__(self, method, target, version, headers, reader, client=('', 0)):
+        self.method = method
+        self.target = target
+        self.client = client
+        self.path, _, query = target.partition('?')
+        self.query = parse_qs(query)
+        self.version = version
+        self.headers = headers
+        self.reader = reader
+        self.remaining = int(headers.get('content-length') or 0)
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.1':
+            return connection != 'close'
+        return connection == 'keep-alive'
+
+    async def read(self, n=-1):
+        """Read up to n bytes of the body (all of it if n < 0)."""
+        if self.remaining <= 0:
+            return b''
+        n = self.remaining if n < 0 else min(n, self.remaining)
+        data = await self.reader.read(n)
+        self.remaining -= len(data)
+        return data
+
+    async def body(self, limit=MAX_FORM_SIZE):
+        if self.remaining > limit:
+            raise HTTPError(413, "Request body too large")
+        data = await self.reader.readexactly(self.remaining) if self.remaining else b''
+        self.remaining = 0
+        return data
+
+    async def drain(self):
+        """Discard any unread body so the next request on this connection parses cleanly."""
+        while self.remaining > 0:
+            if not await self.read(READ_LIMIT):
+                break
+
+
+class Response:
+    """A complete response, or a streaming one when stream is an async iterator of bytes.
+
+    headers may be a dict or a list of (name, value) pairs (for repeated headers like Set-Cookie).
+    file, an (open file, offset, count) tuple, sends that part of the file with loop.sendfile()
+    instead of body and closes it afterwards. route names the handler for the access log.
+    length, when set, is declared as the Content-Length instead of the body's, for an answer to
+    HEAD that carries the length of the body a GET would get.
+    """
+
+    __slots__ = ('status', 'headers', 'body', 'stream', 'file', 'route', 'length')
+
+    def __init__(self, body=b'', status=200, headers=None, content_type='text/html', stream=None, file=None,
+                 length=None):
+        self.status = status
+        self.headers = list(headers.items()) if isinstance(headers, dict) else list(headers or [])
+        if not any(key.lower() == 'content-type' for key, _ in self.headers):
+            self.headers.append(('Content-Type', content_type))
+        self.body = body.encode() if isinstance(body, str) else body
+        self.stream = stream
+        self.file = file
+        self.route = None
+        self.length = length
+
+
+class SyncReader:
+    """Blocking file-like view of a Request body for code running in an executor thread.
+
+    Socket reads still happen on the event loop; the worker thread just waits for them.
+    """
+
+    def __init__(self, request, loop):
+        self.request = request
+        self.loop = loop
+
+    def read(self, n=-1):
+        return asyncio.run_coroutine_threadsafe(self.request.read(n), self.loop).result()
+
+
+async def _read_head(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    if len(head) > MAX_HEADER_SIZE:
+        raise HTTPError(431)
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ')
+    except ValueError:
+        raise HTTPError(400, "Bad request line")
+    headers = {}
+    for line in lines[1:]:
+        key, sep, value = line.partition(':')
+        if sep:
+            headers[key.strip().lower()] = value.strip()
+    length = headers.get('content-length')
+    if length is not None and not length.isdigit():
+        # Caught here, where the error is answered, rather than when Request reads it
+        raise HTTPError(400, "Bad Content-Length")
+    return method, target, version, headers
+
+
+def _head_bytes(status, headers):
+    try:
+        reason = HTTPStatus(status).phrase
+    except ValueError:
+        reason = ''
+    lines = [f"HTTP/1.1 {status} {reason}"]
+    lines.extend(f"{key}: {value}" for key, value in headers)
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def _send(writer, request, response, keep_alive):
+    headers = response.headers
+    if response.stream is not None:
+        headers.append(('Connection', 'close'))
+        writer.write(_head_bytes(response.status, headers))
+        async for chunk in response.stream:
+            writer.write(chunk)
+            await writer.drain()
+        return False
+    if response.file is not None:
+        return await _send_file(writer, request, response, keep_alive)
+    if response.status not in (204, 304):
+        headers.append(('Content-Length', str(len(response.body) if response.length is None else response.length)))
+    headers.append(('Connection', 'keep-alive' if keep_alive else 'close'))
+    writer.write(_head_bytes(response.status, headers))
+    if request is None or request.method != 'HEAD':
+        writer.write(response.body)
+    await writer.drain()
+    return keep_alive
+
+
+async def _send_file(writer, request, response, keep_alive):
+    """Send the head, then let the kernel copy the file span to the socket (os.sendfile where it can)."""
+    file, offset, count = response.file
+    try:
+        response.headers.append(('Content-Length', str(count)))
+        response.headers.append(('Connection', 'keep-alive' if keep_alive else 'close'))
+        writer.write(_head_bytes(response.status, response.headers))
+        await writer.drain()
+        if count and request.method != 'HEAD':
+            await asyncio.get_running_loop().sendfile(writer.transport, file, offset, count)
+    finally:
+        file.close()
+    return keep_alive
+
+
+def _error_response(status, message=''):
+    return Response(f"<h1>{status} {HTTPStatus(status).phrase}</h1><p>{message}</p>", status=status)
+
+
+def _log_access(request, response, seconds):
+    if request.method == 'HEAD' or response.status in (204, 304):
+        bytes_out = 0
+    elif response.file is not None:
+        bytes_out = response.file[2]
+    elif response.stream is not None:
+        bytes_out = None
+    else:
+        bytes_out = len(response.body)
+    accesslog.LOG.access(request.client[0], request.method, request.target, response.route, response.status,
+                         int(request.headers.get('content-length') or 0), bytes_out, seconds,
+                         request.headers.get('user-agent'))
+
+
+async def handle_connection(app, reader, writer, idle_timeout=IDLE_TIMEOUT):
+    """Serve requests on one connection until the client closes it or it idles out."""
+    try:
+        keep_alive = True
+        while keep_alive:
+            try:
+                method, target, version, headers = await asyncio.wait_for(_read_head(reader), idle_timeout)
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                return
+            except asyncio.LimitOverrunError:
+                await _send(writer, None, _error_response(431), False)
+                return
+            except HTTPError as e:
+                await _send(writer, None, _error_response(e.status, str(e)), False)
+                return
+            request = Request(method, target, version, headers, reader, writer.get_extra_info('peername') or ('', 0))
+            start = perf_counter()
+            try:
+                response = await app(request)
+            except HTTPError as e:
+                response = _error_response(e.status, str(e))
+            _log_access(request, response, perf_counter() - start)
+            if request.remaining > 0 and response.status >= 400:
+                # A rejected body (too large, rate limited) is not worth reading just to reuse the connection
+                keep_alive = await _send(writer, request, response, False)
+                continue
+            await request.drain()
+            keep_alive = await _send(writer, request, response, request.keep_alive)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(app, host='', port=8080, backlog=4096):
+    """Run app (an async callable taking a Request and returning a Response) until cancelled."""
+    server = await asyncio.start_server(
+        lambda r, w: handle_connection(app, r, w), host or None, port, limit=READ_LIMIT, backlog=backlog,
+    )
+    async with server:
+        await server.serve_forever()
+
+
+def run(app, port=8080):
+    try:
+        asyncio.run(serve(app, port=port))
+    except KeyboardInterrupt:
+        pass
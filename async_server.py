@@ -0,0 +1,156 @@
+import io
+import json
+import asyncio
+import http.client
+from urllib.parse import unquote
+from concurrent.futures import ThreadPoolExecutor
+
+import chat
+import metrics
+import downloads
+import async_http
+
+# Runs an existing SimpleHTTPRequestHandler class on asyncio: idle connections cost a coroutine, not a thread
+DISK_WORKERS = 16
+
+
+class HandlerApp:
+    """Adapts a BaseHTTPRequestHandler subclass to async_http.
+
+    Cheap GETs run inline on the event loop. Anything that reads a body or touches disk
+    (uploads, form posts, resumable PUTs) runs in a bounded thread pool, with socket reads
+    still done by the loop. Chat feeds are served natively so waiting clients hold no thread,
+    and so are reel downloads, which go out with loop.sendfile() instead of through a buffer.
+    """
+
+    def __init__(self, handler_class, disk_workers=DISK_WORKERS):
+        self.handler_class = handler_class
+        self.executor = ThreadPoolExecutor(max_workers=disk_workers, thread_name_prefix='disk')
+        self.chat_room = getattr(handler_class, 'chat_room', None)
+        self.chat_feed = None
+        self.download_store = getattr(handler_class, 'download_store', None)
+
+    def _make_handler(self, request, rfile):
+        """Build a handler instance without the socket plumbing BaseRequestHandler.__init__ expects."""
+        handler = self.handler_class.__new__(self.handler_class)
+        handler.client_address = request.client
+        handler.server = None
+        handler.rfile = rfile
+        handler.wfile = io.BytesIO()
+        handler.command = request.method
+        handler.path = request.target
+        handler.request_version = request.version
+        handler.requestline = f"{request.method} {request.target} {request.version}"
+        handler.close_connection = True
+        handler.headers = http.client.HTTPMessage()
+        for key, value in request.headers.items():
+            handler.headers[key] = value
+        return handler
+
+    @staticmethod
+    def _run_handler(handler):
+        method = getattr(handler, 'do_' + handler.command, None)
+        if method is None:
+            handler.send_error(501)
+        else:
+            method()
+        return handler.wfile.getvalue()
+
+    def _handled(self, handler, raw):
+        response = self._to_response(raw, head=handler.command == 'HEAD')
+        response.route = getattr(handler, 'route_name', None)
+        return response
+
+    @staticmethod
+    def _to_response(raw, head=False):
+        """Turn the raw bytes the handler wrote into a Response we can frame for keep-alive.
+
+        The handler's Content-Length is dropped for the server's own, except in answer to HEAD,
+        where there is no body to measure.
+        """
+        if not raw:
+            return async_http.Response(b'<h1>404 Not Found</h1>', status=404)
+        head, _, body = raw.partition(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split(' ')[1])
+        headers = []
+        length = None
+        for line in lines[1:]:
+            key, _, value = line.partition(':')
+            if key.lower() == 'content-length':
+                if head and value.strip().isdigit():
+                    length = int(value)
+            elif key.lower() != 'connection':
+                headers.append((key, value.strip()))
+        return async_http.Response(body, status=status, headers=headers, length=length)
+
+    def _authorized(self, request):
+        handler = self._make_handler(request, io.BytesIO())
+        allowed = getattr(handler, '_allowed', None)
+        return allowed is None or allowed()
+
+    async def _chat(self, request):
+        if not self._authorized(request):
+            return async_http.Response(b'', status=403)
+        if self.chat_feed is None:
+            self.chat_feed = chat.AsyncFeed(self.chat_room, asyncio.get_running_loop())
+        if request.path == '/chat/stream':
+            after = chat.parse_after(request.headers.get('last-event-id') or request.query.get('after', [None])[0])
+            return async_http.Response(
+                status=200, content_type='text/event-stream', headers={'Cache-Control': 'no-store'},
+                stream=self.chat_feed.events(after),
+            )
+        after = chat.parse_after(request.query.get('after', [None])[0])
+        timeout = min(chat.POLL_TIMEOUT, chat.parse_after(request.query.get('timeout', [None])[0], chat.POLL_TIMEOUT))
+        messages = await self.chat_feed.wait(after, timeout)
+        body = json.dumps({"messages": [m.to_dict() for m in messages], "last_id": self.chat_room.last_id})
+        return async_http.Response(body, content_type='application/json', headers={'Cache-Control': 'no-store'})
+
+    async def _download(self, request):
+        if not self._authorized(request):
+            return async_http.Response(b'', status=403)
+        download = downloads.open_download(self.download_store, unquote(request.path[len(downloads.DOWNLOAD_PREFIX):]))
+        if download is None:
+            raise async_http.HTTPError(404)
+        status, headers, start, end = downloads.prepare(download, request.method, request.headers)
+        if status not in (200, 206):
+            download.file.close()
+            return async_http.Response(b'', status=status, headers=headers)
+        return async_http.Response(status=status, headers=headers, content_type=download.content_type,
+                                   file=(download.file, start, end - start))
+
+    @staticmethod
+    async def _recorded(route, method, respond):
+        """Count a natively served request under the same route name the handler method has."""
+        start = metrics.REGISTRY.start(route)
+        status = 500
+        try:
+            response = await respond
+            status = response.status
+            response.route = route
+            return response
+        except async_http.HTTPError as e:
+            status = e.status
+            raise
+        finally:
+            metrics.REGISTRY.finish(route, method, status, start)
+
+    async def __call__(self, request):
+        if self.chat_room is not None and request.method == 'GET' and request.path in ('/chat/stream', '/chat/messages'):
+            return await self._recorded('chat_feed', request.method, self._chat(request))
+        if (self.download_store is not None and request.method in ('GET', 'HEAD')
+                and request.path.startswith(downloads.DOWNLOAD_PREFIX)
+                and '/' not in request.path[len(downloads.DOWNLOAD_PREFIX):]):
+            return await self._recorded('reel', request.method, self._download(request))
+
+        if request.method in ('GET', 'HEAD') and not request.path.startswith('/uploads/'):
+            handler = self._make_handler(request, io.BytesIO())
+            return self._handled(handler, self._run_handler(handler))
+        loop = asyncio.get_running_loop()
+        handler = self._make_handler(request, async_http.SyncReader(request, loop))
+        return self._handled(handler, await loop.run_in_executor(self.executor, self._run_handler, handler))
+
+
+def run(handler_class, port=8080, disk_workers=DISK_WORKERS):
+    """Serve handler_class on port with the asyncio server."""
+    async_http.run(HandlerApp(handler_class, disk_workers), port=port)
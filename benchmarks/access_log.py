@@ -0,0 +1,77 @@
+"""Per-request cost of access logging in the handler thread: the old synchronous line vs the queued JSON record.
+
+The old way is what BaseHTTPRequestHandler.log_message does, one formatted, unbuffered write
+per request. The new way queues a record for accesslog's background writer. Both write to a
+file in a temporary directory; the report also counts what the writer sampled or dropped.
+
+Usage: python benchmarks/access_log.py [--requests 200000] [--threads 1 4 16]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import accesslog
+
+
+def sync_logger(path):
+    out = open(path, 'a', buffering=1)
+
+    def log():
+        # The fields BaseHTTPRequestHandler.log_request formats, written before the next request
+        date = time.strftime('%d/%b/%Y %H:%M:%S')
+        out.write(f'127.0.0.1 - - [{date}] "GET /page HTTP/1.1" 200 -\n')
+        out.flush()
+    return log
+
+
+def queued_logger(path):
+    log = accesslog.EventLog(path)
+
+    def record():
+        log.access('127.0.0.1', 'GET', '/page', 'page', 200, 0, 1321, 0.0004, 'bench')
+    return record, log
+
+
+def run(log, requests, threads):
+    """Nanoseconds per logged request, with threads logging at once."""
+    per_thread = requests // threads
+
+    def work():
+        for _ in range(per_thread):
+            log()
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / (per_thread * threads) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'threads':>8}{'sync ns':>10}{'queued ns':>11}{'written':>10}{'sampled':>10}{'dropped':>10}")
+        for threads in args.threads:
+            sync = run(sync_logger(os.path.join(directory, f"sync-{threads}.log")), args.requests, threads)
+            path = os.path.join(directory, f"queued-{threads}.log")
+            record, log = queued_logger(path)
+            queued = run(record, args.requests, threads)
+            log.flush()
+            with open(path) as f:
+                written = sum(1 for line in f if '"type":"access"' in line)
+            print(f"{threads:>8}{sync:>10.0f}{queued:>11.0f}{written:>10}{log.sampled:>10}{log.dropped:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Compare the asyncio server with threaded mode while thousands of chat clients sit connected.
+
+For each mode and client count: open N idle /chat/stream connections, then measure /events
+throughput and latency from a small pool of active clients, plus the server's RSS.
+
+Usage: python benchmarks/async_vs_threaded.py [--clients 1000,10000] [--seconds 5]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import resource
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from serving_modes import free_port, start_server
+
+
+def rss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except FileNotFoundError:
+        pass
+    return 0
+
+
+async def request(port, path, method="GET", body=b"", headers="", timeout=5):
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        head = (f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+                f"Content-Length: {len(body)}\r\n{headers}\r\n").encode()
+        writer.write(head + body)
+        await writer.drain()
+        return await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+
+
+async def open_idle(port, count, cookie):
+    """Open count chat streams and keep them open; returns the writers that connected."""
+    async def one():
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), 2)
+            writer.write(f"GET /chat/stream HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\n\r\n".encode())
+            await writer.drain()
+            return writer
+        except (OSError, asyncio.TimeoutError):
+            return None
+
+    writers = []
+    for start in range(0, count, 500):
+        batch = await asyncio.gather(*(one() for _ in range(min(500, count - start))))
+        writers.extend(w for w in batch if w is not None)
+    return writers
+
+
+async def drive(port, seconds, active):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                await request(port, "/events")
+                latencies.append(time.perf_counter() - start)
+            except (OSError, asyncio.TimeoutError):
+                errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(active)))
+    return latencies, errors
+
+
+async def measure(port, idle, seconds, active):
+    response = await request(port, "/login", "POST", b"username=testuser&password=password123",
+                             "Content-Type: application/x-www-form-urlencoded\r\n")
+    cookie = response.split(b"Set-Cookie: ", 1)[1].split(b";", 1)[0].decode()
+    writers = await open_idle(port, idle, cookie)
+    latencies, errors = await drive(port, seconds, active)
+    for writer in writers:
+        writer.close()
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else float('nan')
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else float('nan')
+    return len(writers), len(latencies) / seconds, p50, p99, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", default="1000,10000")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--active", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    print(f"{'mode':<10}{'idle':>7}{'held':>7}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}{'RSS MB':>9}")
+    for idle in (int(c) for c in args.clients.split(',')):
+        for mode in ("threaded", "async"):
+            port = free_port()
+            proc = start_server("DJ", port, mode, args.threads)
+            try:
+                held, rate, p50, p99, errors = asyncio.run(measure(port, idle, args.seconds, args.active))
+                rss = rss_kb(proc.pid) / 1024
+            finally:
+                proc.terminate()
+                proc.wait()
+            print(f"{mode:<10}{idle:>7}{held:>7}{rate:>9.0f}{p50:>9.1f}{p99:>9.1f}{errors:>8}{rss:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
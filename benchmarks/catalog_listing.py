@@ -0,0 +1,48 @@
+"""Time one home-page listing from the upload catalog as the number of reels grows.
+
+Usage: python benchmarks/catalog_listing.py [--counts 1000,10000,100000]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--counts", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'reels':>8}{'first page us':>15}{'deep page us':>15}")
+    for count in (int(c) for c in args.counts.split(',')):
+        with tempfile.TemporaryDirectory() as directory:
+            upload_catalog = catalog.open_catalog(directory)
+            db = upload_catalog._connect()
+            with db:
+                db.executemany(
+                    "INSERT INTO uploads (name, owner, size, mtime, digest) VALUES (?, ?, ?, ?, ?)",
+                    ((f"reel-{i:07}.mp4", "testuser", i * 1024, 1.7e9 + i, "0" * 64) for i in range(count)),
+                )
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                rows, cursor = upload_catalog.page()
+            first = (time.perf_counter() - start) / args.repeat * 1e6
+
+            # Walk halfway through the listing, then time the page found there
+            for _ in range(min(count // (2 * catalog.DEFAULT_PAGE_SIZE), 50)):
+                rows, cursor = upload_catalog.page(cursor=cursor)
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                upload_catalog.page(cursor=cursor)
+            deep = (time.perf_counter() - start) / args.repeat * 1e6
+            print(f"{count:>8}{first:>15.0f}{deep:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Messages/sec delivered when one chat room fans out to many waiting subscribers.
+
+Usage: python benchmarks/chat_fanout.py [--subscribers 10,100,1000] [--messages 2000]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chat
+
+
+def run(subscribers, messages, log_dir):
+    room = chat.ChatRoom("bench", log_dir=log_dir)
+    start_id = room.last_id
+    target = start_id + messages
+    delivered = [0] * subscribers
+    ready = threading.Barrier(subscribers + 1)
+
+    def subscriber(index):
+        last_id = start_id
+        ready.wait()
+        while last_id < target:
+            batch = room.wait(last_id, timeout=5)
+            if not batch:
+                break
+            delivered[index] += len(batch)
+            last_id = batch[-1].id
+
+    threads = [threading.Thread(target=subscriber, args=(i,)) for i in range(subscribers)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    start = time.perf_counter()
+    for i in range(messages):
+        room.post("bench", f"message {i}")
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return sum(delivered), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", default="10,100,1000")
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'subscribers':>12}{'delivered':>12}{'seconds':>10}{'msgs/s':>12}")
+    for count in (int(c) for c in args.subscribers.split(',')):
+        with tempfile.TemporaryDirectory() as log_dir:
+            delivered, elapsed = run(count, args.messages, log_dir)
+        print(f"{count:>12}{delivered:>12}{elapsed:>10.2f}{delivered / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
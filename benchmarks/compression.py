@@ -0,0 +1,58 @@
+"""Bytes saved against CPU spent for each content coding on the server's HTML pages.
+
+Static rows use the one-off precompression levels, dynamic rows the per-request ones.
+
+Usage: python benchmarks/compression.py [--repeat 200]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pages
+import DJ
+
+EVENTS = """
+            <h2>Upcoming Events</h2>
+            <ul class="list-group">
+                <li class="list-group-item">Python Workshop - Sept 25</li>
+                <li class="list-group-item">Web Development Bootcamp - Oct 10</li>
+            </ul>
+            """
+
+
+def chat_page(count):
+    items = ''.join(f"<li class='list-group-item'>user{i % 7}: message number {i} in the lobby</li>"
+                    for i in range(count))
+    return DJ.PAGE.render(content=f"<h2>Chat Room</h2><ul id='chat-history'>{items}</ul>")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    bodies = [
+        ("events", DJ.PAGE.render(content=EVENTS)),
+        ("chat 50", chat_page(50)),
+        ("chat 500", chat_page(500)),
+    ]
+    print(f"{'page':<10}{'coding':<8}{'level':>6}{'bytes':>9}{'saved':>8}{'us':>10}{'MB/s':>8}")
+    for name, body in bodies:
+        print(f"{name:<10}{'identity':<8}{'':>6}{len(body):>9}{'':>8}")
+        for levels in (pages.STATIC_LEVELS, pages.DYNAMIC_LEVELS):
+            for encoding in pages.ENCODINGS:
+                level = levels[encoding]
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    data = pages.compress(body, encoding, level)
+                elapsed = (time.perf_counter() - start) / args.repeat
+                saved = 1 - len(data) / len(body)
+                rate = len(body) / elapsed / 1e6
+                print(f"{'':<10}{encoding:<8}{level:>6}{len(data):>9}{saved:>8.0%}{elapsed * 1e6:>10.0f}{rate:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Cost of finding and verifying the session cookie in realistic browser Cookie headers.
+
+Usage: python benchmarks/cookie_parsing.py [--repeat 200000]
+"""
+import os
+import sys
+import time
+import argparse
+from http.cookies import SimpleCookie
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sessions
+
+SIGNER = sessions.TokenSigner(b"benchmark-secret")
+TOKEN = SIGNER.sign(sessions.new_session_id())
+
+HEADERS = {
+    "session only": f"session={TOKEN}",
+    "typical": ("_ga=GA1.1.1754383715.1712082377; theme=dark; "
+                f"session={TOKEN}; _ga_X1Y2Z3=GS1.1.1712082377.1.1.1712082390.0.0.0"),
+    "tracker-heavy": ("_ga=GA1.1.1754383715.1712082377; _gid=GA1.1.987654321.1712082377; "
+                      "_fbp=fb.1.1712082377000.123456789; OptanonConsent=isGpcEnabled=0&datestamp=Tue+Apr+02+2024"
+                      "&version=202401.1.0&browserGpcFlag=0&isIABGlobal=false&hosts=&landingPath=NotLandingPage"
+                      "&groups=C0001%3A1%2CC0002%3A1%2CC0003%3A1%2CC0004%3A1; _hjSessionUser_123=eyJpZCI6IjEyMyJ9; "
+                      f"lang=en-US; session={TOKEN}; _uetsid=0a1b2c3d4e5f; _uetvid=6a7b8c9d0e1f"),
+}
+
+
+def simple_cookie(header):
+    morsel = SimpleCookie(header).get(sessions.SESSION_COOKIE)
+    return morsel.value if morsel else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200000)
+    args = parser.parse_args()
+
+    sessions._signer = SIGNER
+    cases = [
+        ("SimpleCookie", simple_cookie),
+        ("parse_cookies", lambda h: sessions.parse_cookies(h).get(sessions.SESSION_COOKIE)),
+        ("cookie_value", lambda h: sessions.cookie_value(h, sessions.SESSION_COOKIE)),
+        ("session_id (+HMAC)", sessions.session_id),
+    ]
+    print(f"{'parser':<20}" + "".join(f"{name:>16}" for name in HEADERS) + "   (ns per header)")
+    for name, parse in cases:
+        row = f"{name:<20}"
+        for header in HEADERS.values():
+            assert parse(header) is not None
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                parse(header)
+            row += f"{(time.perf_counter() - start) / args.repeat * 1e9:>16.0f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Cost of the /events page and the events API as the number of events grows.
+
+Times a cached page hit (what nearly every request costs), a rebuild after a change,
+the first page of "next 30 days" and a tagged range query, for stores of increasing size.
+
+Usage: python benchmarks/events_page.py [--counts 1000,10000,50000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import events
+
+TAGS = ("python", "web", "data", "meetup", "workshop", "talk")
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--counts", default="1000,10000,50000")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    today = datetime.date.today()
+    midnight = datetime.datetime.combine(today, datetime.time())
+    render = lambda rows: events.render_list(rows, 'list-group-item').encode()
+    print(f"{'events':>8}{'page hit us':>13}{'rebuild us':>12}{'30 days us':>12}{'tag range us':>14}")
+    for count in (int(c) for c in args.counts.split(',')):
+        with tempfile.TemporaryDirectory() as directory:
+            store = events.EventStore(os.path.join(directory, "events.sqlite3"))
+            rng = random.Random(count)
+            store.import_events({
+                "title": f"Event {i}",
+                "starts": (midnight + datetime.timedelta(days=rng.randrange(-365, 730), minutes=rng.randrange(1440))).isoformat(timespec='minutes'),
+                "tags": rng.sample(TAGS, 2),
+            } for i in range(count))
+            cache = events.PageCache(store)
+            cache.get(render)
+            hit = timed(lambda: cache.get(render), args.repeat)
+
+            def rebuild():
+                cache._current = None
+                cache._pages.clear()
+                cache.get(render)
+            rebuild_us = timed(rebuild, max(args.repeat // 20, 1))
+            soon = timed(lambda: store.upcoming(days=30), args.repeat // 4)
+            end = (today + datetime.timedelta(days=90)).isoformat()
+            tagged = timed(lambda: store.query(today.isoformat(), end, tag="python"), args.repeat // 4)
+        print(f"{count:>8}{hit:>13.1f}{rebuild_us:>12.0f}{soon:>12.0f}{tagged:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Latency and throughput of a login -> home -> chat -> events browsing sequence,
+with a new connection per request versus one persistent HTTP/1.1 connection.
+
+Usage: python benchmarks/keepalive.py [--server DJ] [--sequences 500]
+"""
+import os
+import sys
+import time
+import argparse
+import http.client
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from serving_modes import free_port, start_server
+
+LOGIN = "username=testuser&password=password123"
+FORM = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+
+def browse(connect):
+    """One sequence; connect() returns the connection to use for the next request."""
+    conn = connect()
+    conn.request("POST", "/login", LOGIN, FORM)
+    response = conn.getresponse()
+    response.read()
+    cookie = {'Cookie': response.getheader('Set-Cookie', '').split(';')[0]}
+    for path in ("/", "/chat", "/events"):
+        conn = connect()
+        conn.request("GET", path, headers=cookie)
+        conn.getresponse().read()
+
+
+def run(port, sequences, persistent):
+    latencies = []
+    shared = http.client.HTTPConnection('127.0.0.1', port)
+
+    def connect():
+        if persistent:
+            return shared
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        conn.auto_open = 1
+        return conn
+
+    for _ in range(sequences):
+        start = time.perf_counter()
+        browse(connect)
+        latencies.append(time.perf_counter() - start)
+    shared.close()
+    latencies.sort()
+    total = sum(latencies)
+    return total / sequences * 1000, latencies[int(sequences * 0.99)] * 1000, 4 * sequences / total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", default="DJ")
+    parser.add_argument("--mode", default="threaded")
+    parser.add_argument("--sequences", type=int, default=500)
+    args = parser.parse_args()
+
+    port = free_port()
+    proc = start_server(args.server, port, args.mode, 4)
+    try:
+        print(f"{'connections':<14}{'mean ms':>9}{'p99 ms':>9}{'req/s':>9}")
+        for name, persistent in (("per request", False), ("keep-alive", True)):
+            mean, p99, rate = run(port, args.sequences, persistent)
+            print(f"{name:<14}{mean:>9.2f}{p99:>9.2f}{rate:>9.0f}")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+"""Load-test every server variant with mixed workloads and check the results against a baseline.
+
+Each target (the http.server variants and main.py's Flask app) is started in a scratch
+directory on a free port, then driven by an asyncio load generator:
+
+  browse       anonymous GETs of the home, upload, chat and events pages and the events API
+  login_storm  correct-password logins as fast as the clients can send them
+  chat_burst   signed-up users posting chat messages
+  uploads      signed-up users uploading reels of each --upload-sizes size at once (add 1G for the large case)
+
+Every virtual client connects from its own 127.x.y.z address over a keep-alive connection,
+so per-client admission limits apply as they would to real users; throttled requests show
+up in the status counts, and requests left unanswered for --timeout seconds as errors. Per
+scenario the report has p50/p99 latency, requests/s (and upload MB/s), status counts, and
+the server's peak RSS and CPU time, including its worker processes. Workloads are seeded,
+so two runs send the same requests in the same order.
+
+With --baseline, any scenario whose p99 or RSS grew, or whose throughput fell, by more than
+--tolerance makes the run exit with status 1, and so does one with more errors, timeouts or
+answers outside 2xx/3xx (failed_share) than the baseline had, beyond the same tolerance.
+
+Usage: python benchmarks/loadtest.py [--targets DJ devjam24 DEVJAMS devjam main] [--modes threaded]
+           [--scenarios browse login_storm chat_burst uploads] [--clients 32] [--requests 2000]
+           [--upload-sizes 1M 16M 128M] [--timeout 60] [--output results.json] [--baseline FILE] [--save-baseline FILE]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from serving_modes import ROOT, free_port
+
+TARGETS = ("DJ", "devjam24", "DEVJAMS", "devjam", "main")
+SCENARIOS = ("browse", "login_storm", "chat_burst", "uploads")
+# Pages every variant has; the ones behind a login answer anonymous visitors with a notice
+BROWSE_PATHS = ("/", "/events", "/events", "/events", "/upload", "/chat", "/events/upcoming?days=30")
+# Flask has no --port/--mode; its development server is started directly
+FLASK_LAUNCH = "import sys; sys.path.insert(0, {root!r}); import main; main.MEDIA_QUEUE.start(); main.app.run(port={port}, threaded=True)"
+UPLOAD_CHUNK = 1024 * 1024
+# A request with no complete response after this many seconds counts as an error
+REQUEST_TIMEOUT = 60
+# Checked against the baseline: metric -> True when bigger is worse
+COMPARED = {"p99_ms": True, "throughput_rps": False, "rss_peak_kb": True}
+# Also checked against the baseline, but failing on any rise past the tolerance, including from zero
+FAILURES = ("errors", "timeouts", "failed_share")
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+def parse_size(text):
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = text.strip().upper()
+    return int(float(text[:-1]) * units[text[-1]]) if text[-1] in units else int(text)
+
+
+def client_address(i):
+    """A distinct loopback source address for virtual client i."""
+    return f"127.{1 + i // 62500}.{i // 250 % 250}.{2 + i % 250}"
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection from a fixed source address, with a session cookie."""
+
+    def __init__(self, port, source, timeout=REQUEST_TIMEOUT):
+        self.port = port
+        self.source = source
+        self.timeout = timeout
+        self.cookie = None
+        self.reader = self.writer = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port, local_addr=(self.source, 0))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    def _head(self, method, path, length, content_type=None):
+        lines = [f"{method} {path} HTTP/1.1", "Host: localhost", f"Content-Length: {length}"]
+        if content_type:
+            lines.append(f"Content-Type: {content_type}")
+        if self.cookie:
+            lines.append(f"Cookie: {self.cookie}")
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode()
+
+    async def request(self, method, path, body=b'', content_type=None, parts=None, length=None):
+        """Send a request and read the whole response; returns the status.
+
+        parts, if given, is an iterable of byte chunks totalling length, streamed as the body.
+        A response that takes longer than the connection's timeout raises TimeoutError.
+        """
+        if self.writer is None:
+            await self._connect()
+        try:
+            return await asyncio.wait_for(self._exchange(method, path, body, content_type, parts, length), self.timeout)
+        except asyncio.TimeoutError:
+            # The connection is mid-request, so it cannot be reused
+            self.close()
+            raise
+
+    async def _exchange(self, method, path, body, content_type, parts, length):
+        # The head is read while the body is still going out: a server that rejects a body (413,
+        # 429, 503) answers and closes before reading it all, and the write then fails
+        head = asyncio.ensure_future(self.reader.readuntil(b'\r\n\r\n'))
+        complete = True
+        try:
+            try:
+                if parts is None:
+                    self.writer.write(self._head(method, path, len(body), content_type) + body)
+                else:
+                    self.writer.write(self._head(method, path, length, content_type))
+                    for chunk in parts:
+                        if head.done():
+                            complete = False
+                            break
+                        self.writer.write(chunk)
+                        await self.writer.drain()
+                await self.writer.drain()
+            except ConnectionError:
+                # The answer may already be buffered, with the task that reads it not yet run
+                await asyncio.wait({head}, timeout=1)
+                if not head.done() or head.exception() is not None:
+                    raise
+                complete = False
+            lines = (await head).decode('latin-1').split('\r\n')
+        finally:
+            if not head.done():
+                head.cancel()
+        version, status = lines[0].split(' ', 2)[:2]
+        if not complete:
+            self.close()
+            return int(status)
+        headers = {}
+        for line in lines[1:]:
+            key, _, value = line.partition(':')
+            key, value = key.strip().lower(), value.strip()
+            if key == 'set-cookie' and value.split('=', 1)[0] == 'session':
+                self.cookie = value.split(';', 1)[0]
+            headers[key] = value
+        if 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await self.reader.read()
+            self.close()
+        if headers.get('connection', '').lower() == 'close' or version == 'HTTP/1.0':
+            self.close()
+        return int(status)
+
+
+def form(**fields):
+    return '&'.join(f"{key}={value}" for key, value in fields.items()).encode()
+
+
+def multipart_upload(name, size, rng):
+    """(content_type, parts, length) for a multipart form with one file of size bytes."""
+    boundary = f"bench{rng.getrandbits(64):016x}"
+    head = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{name}"\r\n'
+            f'Content-Type: video/mp4\r\n\r\n').encode()
+    tail = f'\r\n--{boundary}--\r\n'.encode()
+    # A unique first chunk keeps uploads from deduplicating into one blob
+    block = rng.randbytes(UPLOAD_CHUNK)
+
+    def parts():
+        yield head
+        sent = 0
+        while sent < size:
+            chunk = block if sent else name.encode().ljust(UPLOAD_CHUNK, b'\0')
+            chunk = chunk[:size - sent]
+            sent += len(chunk)
+            yield chunk
+        yield tail
+    return f"multipart/form-data; boundary={boundary}", parts(), len(head) + size + len(tail)
+
+
+class Scenario:
+    """A workload: setup() runs once per client untimed, step() is one timed request."""
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    @property
+    def clients(self):
+        return min(self.args.clients, len(self.args.upload_sizes) * 2) if self.name == "uploads" else self.args.clients
+
+    @property
+    def requests(self):
+        return self.clients * len(self.args.upload_sizes) if self.name == "uploads" else self.args.requests
+
+    async def setup(self, conn, i, run_id):
+        if self.name in ("chat_burst", "uploads"):
+            # Variants without accounts answer 404/405 here and let anyone post
+            await conn.request("POST", "/signup", form(username=f"bench{run_id}x{i}", password="benchmark-password"),
+                               "application/x-www-form-urlencoded")
+
+    async def step(self, conn, n, rng):
+        """Send request number n for this client; returns (status, body bytes sent)."""
+        if self.name == "browse":
+            return await conn.request("GET", rng.choice(BROWSE_PATHS)), 0
+        if self.name == "login_storm":
+            return await conn.request("POST", "/login", form(username="testuser", password="password123"),
+                                      "application/x-www-form-urlencoded"), 0
+        if self.name == "chat_burst":
+            return await conn.request("POST", "/chat", form(message=f"load+test+message+{n}"),
+                                      "application/x-www-form-urlencoded"), 0
+        size = self.args.upload_sizes[n % len(self.args.upload_sizes)]
+        content_type, parts, length = multipart_upload(f"bench-{rng.getrandbits(48):012x}.mp4", size, rng)
+        return await conn.request("POST", "/upload", content_type=content_type, parts=parts, length=length), size
+
+
+def process_tree(pid):
+    """pid and all of its descendants, from /proc."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, ()))
+    return tree
+
+
+def usage(pid):
+    """(RSS in KiB, CPU seconds) summed over the process tree under pid."""
+    rss = cpu = 0
+    for member in process_tree(pid):
+        try:
+            with open(f'/proc/{member}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+            with open(f'/proc/{member}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        rss += int(line.split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+    return rss, cpu
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+async def run_scenario(scenario, port, pid, seed):
+    """Run one scenario against the server on port; returns its results dict."""
+    rng = random.Random(f"{seed}:{scenario.name}")
+    run_id = rng.getrandbits(32)
+    conns = [Connection(port, client_address(i), scenario.args.timeout) for i in range(scenario.clients)]
+    await asyncio.gather(*(scenario.setup(conn, i, run_id) for i, conn in enumerate(conns)))
+
+    latencies, statuses, errors, timeouts, sent = [], {}, 0, 0, 0
+
+    async def worker(conn, i):
+        nonlocal errors, timeouts, sent
+        client_rng = random.Random(f"{seed}:{scenario.name}:{i}")
+        # Each client always sends the same share of the requests
+        for n in range(i, scenario.requests, scenario.clients):
+            start = time.perf_counter()
+            try:
+                status, body_bytes = await scenario.step(conn, n, client_rng)
+            except asyncio.TimeoutError:
+                errors += 1
+                timeouts += 1
+                continue
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                errors += 1
+                conn.close()
+                continue
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status < 400:
+                sent += body_bytes
+
+    peak_rss = usage(pid)[0]
+    sampling = True
+
+    async def sample():
+        nonlocal peak_rss
+        while sampling:
+            peak_rss = max(peak_rss, usage(pid)[0])
+            await asyncio.sleep(0.2)
+
+    sampler = asyncio.ensure_future(sample())
+    cpu_before = usage(pid)[1]
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(conn, i) for i, conn in enumerate(conns)))
+    elapsed = time.perf_counter() - start
+    sampling = False
+    await sampler
+    rss, cpu_after = usage(pid)
+    for conn in conns:
+        conn.close()
+
+    latencies.sort()
+    failed = sum(count for status, count in statuses.items() if not 200 <= status < 400)
+    result = {
+        "clients": scenario.clients,
+        "requests": len(latencies),
+        "errors": errors,
+        "timeouts": timeouts,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "failed_share": round(failed / len(latencies), 4) if latencies else 0,
+        "rss_peak_kb": max(peak_rss, rss),
+        "cpu_seconds": round(cpu_after - cpu_before, 2),
+    }
+    if scenario.name == "uploads":
+        result["upload_mb_per_s"] = round(sent / elapsed / 1e6, 1)
+    return result
+
+
+def launch(target, port, mode, workers, workdir):
+    """Start target in workdir and wait until it accepts connections; returns the Popen, or None if it exits."""
+    if target == "main":
+        command = [sys.executable, "-c", FLASK_LAUNCH.format(root=ROOT, port=port)]
+    else:
+        command = [sys.executable, os.path.join(ROOT, f"{target}.py"), "--port", str(port), "--mode", mode]
+        if workers:
+            command += ["--workers", str(workers)]
+    log = open(os.path.join(workdir, "server.log"), "wb")
+    proc = subprocess.Popen(command, cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+    log.close()
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            return None
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    return None
+
+
+def run_target(target, mode, args):
+    """All scenarios against one target and mode, each with a fresh server and data directory."""
+    results = {}
+    for name in args.scenarios:
+        workdir = tempfile.mkdtemp(prefix=f"loadtest-{target}-")
+        port = free_port()
+        proc = launch(target, port, mode, args.workers, workdir)
+        try:
+            if proc is None:
+                with open(os.path.join(workdir, "server.log"), errors="replace") as f:
+                    last = (f.read().strip().splitlines() or ["exited without output"])[-1]
+                print(f"{target:<10}{mode:<10}skipped: {last}", file=sys.stderr)
+                return {"skipped": last}
+            results[name] = asyncio.run(run_scenario(Scenario(name, args), port, proc.pid, args.seed))
+        finally:
+            if proc is not None:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+            shutil.rmtree(workdir, ignore_errors=True)
+        r = results[name]
+        print(f"{target:<10}{mode:<10}{name:<13}{r['throughput_rps']:>9.1f}{r['p50_ms'] or 0:>9.2f}{r['p99_ms'] or 0:>10.2f}"
+              f"{r['rss_peak_kb'] // 1024:>8}{r['cpu_seconds']:>7.2f}{r['errors']:>8}  {r['statuses']}", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions of results against baseline, as readable strings."""
+    regressions = []
+    for key, scenarios in results["runs"].items():
+        for name, current in scenarios.items():
+            before = baseline.get("runs", {}).get(key, {}).get(name)
+            if not isinstance(current, dict) or not isinstance(before, dict):
+                continue
+            for metric, bigger_is_worse in COMPARED.items():
+                old, new = before.get(metric), current.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                if (change if bigger_is_worse else -change) > tolerance:
+                    regressions.append(f"{key} {name}: {metric} {old} -> {new} ({change:+.0%})")
+            for metric in FAILURES:
+                old, new = before.get(metric), current.get(metric)
+                if old is None or new is None:
+                    continue
+                if new > old * (1 + tolerance):
+                    regressions.append(f"{key} {name}: {metric} {old} -> {new}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    parser.add_argument("--modes", nargs="+", default=["threaded"])
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--upload-sizes", nargs="+", type=parse_size, default=[parse_size(s) for s in ("1M", "16M", "128M")])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT, help="seconds per request")
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--save-baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "clients": args.clients, "requests": args.requests, "upload_sizes": args.upload_sizes, "seed": args.seed,
+        },
+        "runs": {},
+    }
+    print(f"{'target':<10}{'mode':<10}{'scenario':<13}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>10}{'RSS MB':>8}{'CPU s':>7}{'errors':>8}",
+          file=sys.stderr)
+    for target in args.targets:
+        # Flask's development server has only the one mode
+        for mode in (["flask"] if target == "main" else args.modes):
+            results["runs"][f"{target}/{mode}"] = run_target(target, mode, args)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(text + "\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Behaviour under a login flood: what the flooders get back and how a normal visitor fares meanwhile.
+
+Each login costs a scrypt hash, so an unthrottled flood pins every core. Also reports the
+per-request cost of Policy.admit() itself.
+
+Usage: python benchmarks/login_flood.py [--server DJ] [--flooders 16] [--seconds 5]
+"""
+import os
+import sys
+import time
+import argparse
+import http.client
+import multiprocessing
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import admission
+from serving_modes import free_port, start_server
+
+FORM = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+
+def flood(args):
+    """Wrong-password logins until the deadline; returns a Counter of status codes."""
+    port, deadline = args
+    statuses = Counter()
+    while time.time() < deadline:
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        try:
+            conn.request("POST", "/login", "username=testuser&password=wrong", FORM)
+            statuses[conn.getresponse().status] += 1
+        except OSError:
+            statuses['error'] += 1
+        finally:
+            conn.close()
+    return statuses
+
+
+def visitor(port, deadline):
+    latencies = []
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    while time.time() < deadline:
+        start = time.perf_counter()
+        conn.request("GET", "/events")
+        conn.getresponse().read()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.05)
+    conn.close()
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+def admit_cost(repeat, clients):
+    policy = admission.Policy('bench', admission.MAX_FORM_BODY, admission.RateLimiter((1e9, 1e9), (1e9, 1e9)))
+    keys = [f"10.0.{i // 256}.{i % 256}" for i in range(clients)]
+    start = time.perf_counter()
+    for i in range(repeat):
+        policy.admit('512', keys[i % clients])
+    return (time.perf_counter() - start) / repeat * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", default="DJ")
+    parser.add_argument("--mode", default="threaded")
+    parser.add_argument("--flooders", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    for clients in (1, 10000):
+        print(f"admit() with {clients} client keys: {admit_cost(200000, clients):.0f} ns")
+
+    port = free_port()
+    proc = start_server(args.server, port, args.mode, 32)
+    try:
+        deadline = time.time() + args.seconds
+        idle = visitor(port, deadline)
+        deadline = time.time() + args.seconds
+        with multiprocessing.Pool(args.flooders) as pool:
+            result = pool.map_async(flood, [(port, deadline)] * args.flooders)
+            busy = visitor(port, deadline)
+            statuses = sum(result.get(), Counter())
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    print(f"flood responses: " + ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items(), key=str)))
+    print(f"{'/events':<10}{'p50 ms':>9}{'p99 ms':>9}")
+    print(f"{'idle':<10}{idle[0]:>9.2f}{idle[1]:>9.2f}")
+    print(f"{'flooded':<10}{busy[0]:>9.2f}{busy[1]:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
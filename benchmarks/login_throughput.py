@@ -0,0 +1,77 @@
+"""Login throughput and latency for the credential store at several KDF cost settings.
+
+Many request threads log in at once; hashing is bounded by the store's KDF pool.
+
+Usage: python benchmarks/login_throughput.py [--threads 32] [--logins 64] [--workers N]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import credentials
+
+SETTINGS = [
+    ("scrypt", {"SCRYPT_N": 2 ** 14}),
+    ("scrypt", {"SCRYPT_N": 2 ** 15}),
+    ("scrypt", {"SCRYPT_N": 2 ** 16}),
+    ("pbkdf2_sha256", {"PBKDF2_ITERATIONS": 100_000}),
+    ("pbkdf2_sha256", {"PBKDF2_ITERATIONS": 600_000}),
+]
+
+
+def run(store, threads, logins):
+    latencies = []
+    lock = threading.Lock()
+    remaining = [logins]
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            assert store.verify("testuser", "password123")
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return logins / elapsed, latencies[len(latencies) // 2] * 1000, latencies[-1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=credentials.HASH_WORKERS)
+    args = parser.parse_args()
+
+    print(f"{'kdf':<15}{'cost':>10}{'hash ms':>9}{'logins/s':>10}{'p50 ms':>9}{'max ms':>9}")
+    for kdf, params in SETTINGS:
+        credentials.PASSWORD_KDF = kdf
+        for name, value in params.items():
+            setattr(credentials, name, value)
+        with tempfile.TemporaryDirectory() as directory:
+            store = credentials.CredentialStore(os.path.join(directory, "users.json"), workers=args.workers)
+            start = time.perf_counter()
+            store.add("testuser", "password123")
+            single = (time.perf_counter() - start) * 1000
+            rate, p50, worst = run(store, args.threads, args.logins)
+        cost = next(iter(params.values()))
+        print(f"{kdf:<15}{cost:>10}{single:>9.1f}{rate:>10.1f}{p50:>9.0f}{worst:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
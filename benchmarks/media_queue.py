@@ -0,0 +1,76 @@
+"""Cost the media queue adds to an upload request, and how fast the worker pool drains a backlog.
+
+Stores a batch of small MP4-like files in a temporary upload directory, times submit() (the only
+part an upload request waits for) and then the time until every job is done.
+
+Usage: python benchmarks/media_queue.py [--files 200] [--workers 1 2 4]
+"""
+import os
+import sys
+import time
+import shutil
+import struct
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import media
+import catalog
+import blobstore
+
+
+def box(kind, payload):
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+
+def fake_mp4(seconds):
+    """ftyp + moov/mvhd + a random mdat, enough for the metadata fallback to read a duration."""
+    mvhd = box(b'mvhd', bytes(12) + struct.pack('>II', 1000, int(seconds * 1000)) + bytes(80))
+    return box(b'ftyp', b'isom\0\0\0\0isomiso2') + box(b'moov', mvhd) + box(b'mdat', os.urandom(64 * 1024))
+
+
+def run(files, workers):
+    root = tempfile.mkdtemp()
+    try:
+        store = blobstore.BlobStore(root)
+        upload_catalog = catalog.open_catalog(root)
+        uploads = []
+        for i in range(files):
+            path = os.path.join(root, f"incoming-{i}")
+            with open(path, 'wb') as f:
+                f.write(fake_mp4(10 + i))
+            name = store.add(path, f"reel-{i}.mp4")
+            entry = store.get(name)
+            upload_catalog.record(name, None, entry['size'], entry['digest'])
+            uploads.append((name, entry['digest']))
+
+        media.POLL_INTERVAL = 0.05
+        queue = media.MediaQueue(root, store, upload_catalog, workers=workers)
+        start = time.perf_counter()
+        for name, digest in uploads:
+            queue.submit(name, digest)
+        submit_us = (time.perf_counter() - start) / files * 1e6
+        while any(queue.status(digest)["state"] != "done" for _, digest in uploads):
+            time.sleep(0.05)
+        drain = time.perf_counter() - start
+        return submit_us, files / drain
+    finally:
+        shutil.rmtree(root)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    print(f"encoder: {media.FFMPEG or 'none (metadata only)'}")
+    print(f"{'workers':>8}{'submit us':>11}{'jobs/s':>9}")
+    for workers in args.workers:
+        submit_us, rate = run(args.files, workers)
+        print(f"{workers:>8}{submit_us:>11.0f}{rate:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Per-request cost of the metrics middleware, alone and with several threads recording at once.
+
+Dispatches a do-nothing route through a Router with and without metrics.record_request and
+reports the difference, then times one /metrics scrape.
+
+Usage: python benchmarks/metrics_overhead.py [--requests 200000] [--threads 1 4 16]
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import routing
+import metrics
+
+
+class FakeHandler:
+    """Just enough of a BaseHTTPRequestHandler for Router.dispatch and the middleware."""
+
+    command = 'GET'
+    headers = {}
+    response_status = 200
+
+    def __init__(self, path):
+        self.path = path
+
+
+def make_router(instrumented):
+    router = routing.Router()
+    if instrumented:
+        router.use(metrics.record_request)
+    for i in range(20):
+        router.add(f"/page{i}", lambda handler: None)
+    return router
+
+
+def run(router, requests, threads):
+    """Nanoseconds per dispatch with threads threads sharing the work."""
+    per_thread = requests // threads
+
+    def work(i):
+        handler = FakeHandler(f"/page{i % 20}")
+        for _ in range(per_thread):
+            router.dispatch(handler)
+
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / (per_thread * threads) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    plain, instrumented = make_router(False), make_router(True)
+    print(f"{'threads':>8}{'plain ns':>10}{'metrics ns':>12}{'overhead ns':>13}")
+    for threads in args.threads:
+        base = min(run(plain, args.requests, threads) for _ in range(3))
+        timed = min(run(instrumented, args.requests, threads) for _ in range(3))
+        print(f"{threads:>8}{base:>10.0f}{timed:>12.0f}{timed - base:>13.0f}")
+
+    start = time.perf_counter()
+    body = metrics.render()
+    print(f"scrape: {len(body)} bytes in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
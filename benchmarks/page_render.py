@@ -0,0 +1,60 @@
+"""Compare the old per-request f-string page build with the pre-encoded PageTemplate.
+
+Reports time and bytes allocated per render for a static page (/events) and a dynamic one.
+
+Usage: python benchmarks/page_render.py [--repeat 100000]
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import DJ
+
+EVENTS = """
+            <h2>Upcoming Events</h2>
+            <ul class="list-group">
+                <li class="list-group-item">Python Workshop - Sept 25</li>
+                <li class="list-group-item">Web Development Bootcamp - Oct 10</li>
+            </ul>
+            <a href="/" class="btn btn-secondary btn-block mt-3">Go Back</a>
+            """
+
+
+def measure(render, content, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        render(content)
+    elapsed = (time.perf_counter() - start) / repeat * 1e6
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+    render(content)
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=100000)
+    args = parser.parse_args()
+
+    # The layout as the old f-string, formatted and encoded in full on every request
+    source = DJ.PAGE.render(content='\0').decode().replace('{', '{{').replace('}', '}}').replace('\0', '{content}')
+    cases = [
+        ("f-string", "static", lambda c: source.format(content=c).encode(), EVENTS),
+        ("segments", "static", lambda c: DJ.PAGE.segments(content=c), EVENTS),
+        ("cached", "static", lambda c: DJ.PAGE.cached(content=c), EVENTS),
+        ("f-string", "dynamic", lambda c: source.format(content=c).encode(), "<h2>Welcome, testuser!</h2>"),
+        ("segments", "dynamic", lambda c: DJ.PAGE.segments(content=c), "<h2>Welcome, testuser!</h2>"),
+    ]
+    print(f"{'renderer':<10}{'page':<9}{'us/render':>11}{'peak bytes':>12}")
+    for name, page, render, content in cases:
+        elapsed, peak = measure(render, content, args.repeat)
+        print(f"{name:<10}{page:<9}{elapsed:>11.2f}{peak:>12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Download throughput for a stored reel: sendfile() versus copying the file through Python.
+
+Serves one file from a temporary BlobStore with the threaded server and has concurrent clients
+fetch it whole (and as 1 MiB ranges, like a seeking player) for a few seconds each.
+
+Usage: python benchmarks/reel_downloads.py [--size-mb 256] [--clients 8] [--seconds 5]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import http.client
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import serving
+import blobstore
+import downloads
+from serving_modes import free_port
+
+NAME = "reel.mp4"
+
+
+class SendfileHandler(serving.KeepAliveHandler):
+    store = None
+
+    def do_GET(self):
+        downloads.send_download(self, self.store, NAME)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CopyHandler(SendfileHandler):
+    """The read()/write() loop a handler would use without downloads.send_file."""
+
+    def do_GET(self):
+        with downloads.open_download(self.store, NAME) as download:
+            status, headers, start, end = downloads.prepare(download, self.command, self.headers)
+            self.send_response(status)
+            for key, value in headers:
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(end - start))
+            self.end_headers()
+            download.file.seek(start)
+            remaining = end - start
+            while remaining:
+                chunk = download.file.read(min(remaining, 1024 * 1024))
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+
+def serve(handler_class, root, port):
+    handler_class.store = blobstore.BlobStore(root)
+    httpd = serving.make_server(handler_class, port, mode="threaded", workers=32)
+    httpd.serve_forever()
+
+
+def client(args):
+    """Download until the deadline; returns bytes received."""
+    port, size, ranged, deadline = args
+    buffer = bytearray(1024 * 1024)
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    received, offset = 0, 0
+    while time.time() < deadline:
+        headers = {}
+        if ranged:
+            headers['Range'] = f"bytes={offset}-{offset + len(buffer) - 1}"
+            offset = (offset + 7 * len(buffer)) % (size - len(buffer))
+        conn.request("GET", "/", headers=headers)
+        response = conn.getresponse()
+        while True:
+            n = response.readinto(buffer)
+            if not n:
+                break
+            received += n
+    conn.close()
+    return received
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        size = args.size_mb * 1024 * 1024
+        path = os.path.join(root, "incoming")
+        with open(path, 'wb') as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+        blobstore.BlobStore(root).add(path, NAME)
+
+        print(f"{'server':<10}{'request':<10}{'Gbit/s':>9}")
+        for name, handler_class in (("copy", CopyHandler), ("sendfile", SendfileHandler)):
+            port = free_port()
+            server = multiprocessing.Process(target=serve, args=(handler_class, root, port), daemon=True)
+            server.start()
+            time.sleep(0.5)
+            try:
+                for ranged in (False, True):
+                    deadline = time.time() + args.seconds
+                    with multiprocessing.Pool(args.clients) as pool:
+                        total = sum(pool.map(client, [(port, size, ranged, deadline)] * args.clients))
+                    rate = total * 8 / args.seconds / 1e9
+                    print(f"{name:<10}{'1 MiB' if ranged else 'whole':<10}{rate:>9.2f}")
+            finally:
+                server.terminate()
+                server.join()
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
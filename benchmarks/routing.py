@@ -0,0 +1,72 @@
+"""Dispatch cost of an if/elif chain on self.path versus routing.Router as the route count grows.
+
+Each app has N literal routes and N routes with a parameter segment; the request hits the last
+route registered, which is the worst case for the chain.
+
+Usage: python benchmarks/routing.py [--repeat 200000] [--routes 10 100 1000]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import routing
+
+
+def handler(*args, **kwargs):
+    return None
+
+
+def build_chain(count):
+    """Compile the if/elif dispatch the handlers used before the router."""
+    lines = ["def dispatch(path):"]
+    for i in range(count):
+        lines.append(f"    {'if' if i == 0 else 'elif'} path == '/page{i}':")
+        lines.append("        return handler()")
+    for i in range(count):
+        lines.append(f"    elif path.startswith('/items{i}/'):")
+        lines.append(f"        return handler(path[{len(f'/items{i}/')}:])")
+    lines.append("    return 404")
+    namespace = {"handler": handler}
+    exec("\n".join(lines), namespace)
+    return namespace["dispatch"]
+
+
+def build_router(count):
+    router = routing.Router()
+    for i in range(count):
+        router.add(f"/page{i}", handler)
+        router.add(f"/items{i}/<item_id>", handler)
+    return router
+
+
+def per_call(func, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(arg)
+    return (time.perf_counter() - start) / repeat * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200000)
+    parser.add_argument("--routes", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    print(f"{'routes':>8}{'chain literal':>16}{'chain param':>14}{'router literal':>16}{'router param':>14}   (ns per lookup)")
+    for count in args.routes:
+        chain = build_chain(count)
+        router = build_router(count)
+        literal, param = f"/page{count - 1}", f"/items{count - 1}/42"
+        assert router.match(literal)[0] and router.match(param)[1] == {"item_id": "42"}
+        print(f"{count:>8}"
+              f"{per_call(chain, literal, args.repeat):>16.0f}"
+              f"{per_call(chain, param, args.repeat):>14.0f}"
+              f"{per_call(router.match, literal, args.repeat):>16.0f}"
+              f"{per_call(router.match, param, args.repeat):>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Load test: requests/sec for each serving mode as the worker count grows.
+
+Usage: python benchmarks/serving_modes.py [--server DJ] [--seconds 5] [--clients 32]
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import subprocess
+import http.client
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(module, port, mode, workers):
+    """Start one of the http.server variants and wait until it accepts connections."""
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, f"{module}.py"), "--port", str(port), "--mode", mode, "--workers", str(workers)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"{module} did not start on port {port}")
+
+
+def client(args):
+    """Issue GETs against path until the deadline; returns the number of completed requests."""
+    port, path, deadline = args
+    done = 0
+    while time.time() < deadline:
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        try:
+            conn.request("GET", path)
+            conn.getresponse().read()
+            done += 1
+        except OSError:
+            pass
+        finally:
+            conn.close()
+    return done
+
+
+def measure(port, path, seconds, clients):
+    deadline = time.time() + seconds
+    with multiprocessing.Pool(clients) as pool:
+        total = sum(pool.map(client, [(port, path, deadline)] * clients))
+    return total / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", default="DJ")
+    parser.add_argument("--path", default="/events")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    counts = sorted({1, 2, 4, 8, 16, args.max_workers} & set(range(1, args.max_workers + 1)))
+    runs = [("single", 1)] + [(mode, n) for mode in ("threaded", "prefork") for n in counts]
+    print(f"{'mode':<10}{'workers':>8}{'req/s':>12}")
+    for mode, workers in runs:
+        port = free_port()
+        proc = start_server(args.server, port, mode, workers)
+        try:
+            rate = measure(port, args.path, args.seconds, args.clients)
+        finally:
+            proc.terminate()
+            proc.wait()
+        print(f"{mode:<10}{workers:>8}{rate:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
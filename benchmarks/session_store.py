@@ -0,0 +1,58 @@
+"""Create and look up sessions in each backend at up to a million live sessions.
+
+Usage: python benchmarks/session_store.py [--count 1000000] [--lookups 100000] [--backends memory,sqlite,file]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import resource
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sessions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--backends", default=",".join(sessions.SESSION_BACKENDS))
+    args = parser.parse_args()
+
+    print(f"{'backend':<9}{'sessions':>10}{'create/s':>10}{'get us':>8}{'miss us':>9}{'reopen s':>10}{'peak RSS MB':>13}")
+    for backend in args.backends.split(','):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, sessions.SESSION_FILES.get(backend, 'unused'))
+            store = sessions.open_session_store(backend, path)
+            start = time.perf_counter()
+            ids = [store.create(f"user{i}") for i in range(args.count)]
+            create_rate = args.count / (time.perf_counter() - start)
+
+            sample = random.sample(ids, min(args.lookups, len(ids)))
+            start = time.perf_counter()
+            for sid in sample:
+                store.get(sid)
+            hit = (time.perf_counter() - start) / len(sample) * 1e6
+            unknown = [sessions.new_session_id() for _ in sample]
+            start = time.perf_counter()
+            for sid in unknown:
+                store.get(sid)
+            miss = (time.perf_counter() - start) / len(sample) * 1e6
+
+            reopen = float('nan')
+            if backend != "memory":
+                start = time.perf_counter()
+                reopened = sessions.open_session_store(backend, path)
+                assert reopened.get(sample[0]) is not None
+                reopen = time.perf_counter() - start
+                del reopened
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"{backend:<9}{len(store):>10}{create_rate:>10.0f}{hit:>8.2f}{miss:>9.2f}{reopen:>10.2f}{rss:>13.0f}")
+            del store, ids, sample, unknown
+
+
+if __name__ == "__main__":
+    main()
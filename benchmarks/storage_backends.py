@@ -0,0 +1,77 @@
+"""Time to store one upload with each storage backend, and how S3 uploads scale with parts in flight.
+
+The S3 backend is run against s3local.py with a per-connection bandwidth cap and per-request
+latency, standing in for a remote store whose single streams are slower than the link. With
+one connection the parts go up one after another; with more, that many go up at once.
+
+Usage: python benchmarks/storage_backends.py [--size-mb 64] [--part-mb 8] [--connections 1 2 4 8] [--bandwidth-mb 20] [--latency-ms 5]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+import s3local
+import blobstore
+from serving_modes import free_port
+
+
+def store_once(backend, root, source):
+    """Seconds to add a fresh copy of source to a BlobStore over backend."""
+    path = os.path.join(root, "incoming")
+    shutil.copyfile(source, path)
+    store = blobstore.BlobStore(root, backend)
+    digest = blobstore.file_digest(path)
+    start = time.perf_counter()
+    store.add(path, "reel.mp4", digest=digest, durable=True)
+    elapsed = time.perf_counter() - start
+    store.remove("reel.mp4")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--part-mb", type=int, default=8)
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--bandwidth-mb", type=float, default=20, help="stand-in's per-connection cap")
+    parser.add_argument("--latency-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "source")
+        with open(source, 'wb') as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        print(f"{'backend':>16}{'seconds':>10}{'MB/s':>9}")
+        for name in ("local", "sharded"):
+            root = os.path.join(directory, name)
+            seconds = store_once(storage.open_backend(root, name), root, source)
+            print(f"{name:>16}{seconds:>10.3f}{args.size_mb / seconds:>9.0f}")
+
+        port = free_port()
+        server = s3local.make_server(port, os.path.join(directory, "s3data"), args.latency_ms / 1000,
+                                     args.bandwidth_mb * 1024 * 1024)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            for connections in args.connections:
+                root = os.path.join(directory, f"s3-{connections}")
+                backend = storage.S3Backend(root, endpoint=f"http://127.0.0.1:{port}", bucket="bench",
+                                            part_size=args.part_mb * 1024 * 1024, connections=connections)
+                seconds = store_once(backend, root, source)
+                label = f"s3 x{connections}"
+                print(f"{label:>16}{seconds:>10.3f}{args.size_mb / seconds:>9.0f}")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
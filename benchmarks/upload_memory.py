@@ -0,0 +1,110 @@
+"""Peak memory of the streaming multipart parser versus cgi.FieldStorage + read().
+
+Usage: python benchmarks/upload_memory.py [--sizes 16,128,512]   (sizes in MB)
+"""
+import os
+import sys
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import multipart
+
+BOUNDARY = "----benchmarkboundary"
+
+
+class SyntheticBody:
+    """File-like multipart body of a given payload size that is never held in memory at once."""
+
+    def __init__(self, size):
+        self.head = (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"reel.mp4\"\r\n"
+                     f"Content-Type: video/mp4\r\n\r\n").encode()
+        self.tail = f"\r\n--{BOUNDARY}--\r\n".encode()
+        self.payload = size
+        self.length = len(self.head) + size + len(self.tail)
+        self.pos = 0
+        self.block = bytes(range(256)) * 256
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = self.length - self.pos
+        out = bytearray()
+        while n > 0 and self.pos < self.length:
+            if self.pos < len(self.head):
+                piece = self.head[self.pos:self.pos + n]
+            elif self.pos < len(self.head) + self.payload:
+                offset = (self.pos - len(self.head)) % len(self.block)
+                left = len(self.head) + self.payload - self.pos
+                piece = self.block[offset:offset + min(n, left)]
+            else:
+                start = self.pos - len(self.head) - self.payload
+                piece = self.tail[start:start + n]
+            out += piece
+            self.pos += len(piece)
+            n -= len(piece)
+        return bytes(out)
+
+    def readline(self, n=-1):
+        limit = n if n and n > 0 else 1 << 16
+        start = self.pos
+        chunk = self.read(limit)
+        end = chunk.find(b'\n')
+        if end >= 0:
+            chunk = chunk[:end + 1]
+            self.pos = start + len(chunk)
+        return chunk
+
+
+def run_streaming(size, directory):
+    body = SyntheticBody(size)
+    fields, files = multipart.parse_form(body, f"multipart/form-data; boundary={BOUNDARY}", body.length, directory)
+    os.remove(os.path.join(directory, files['file'].save()))
+
+
+def run_cgi(size, directory):
+    import warnings
+    warnings.simplefilter("ignore", DeprecationWarning)
+    import cgi
+    from email.message import Message
+
+    body = SyntheticBody(size)
+    headers = Message()
+    headers['Content-Type'] = f"multipart/form-data; boundary={BOUNDARY}"
+    headers['Content-Length'] = str(body.length)
+    form = cgi.FieldStorage(fp=body, headers=headers, environ={'REQUEST_METHOD': 'POST'})
+    path = os.path.join(directory, "reel.mp4")
+    with open(path, 'wb') as f:
+        f.write(form['file'].file.read())
+    os.remove(path)
+
+
+def measure(func, size, directory):
+    tracemalloc.start()
+    func(size, directory)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="16,128,512")
+    parser.add_argument("--skip-cgi", action="store_true")
+    args = parser.parse_args()
+
+    runners = [("streaming", run_streaming)]
+    if not args.skip_cgi:
+        runners.append(("cgi", run_cgi))
+
+    print(f"{'parser':<10}{'size MB':>9}{'peak KB':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size_mb in (int(s) for s in args.sizes.split(',')):
+            for name, func in runners:
+                peak = measure(func, size_mb * 1024 * 1024, directory)
+                print(f"{name:<10}{size_mb:>9}{peak / 1024:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""How long a worker takes to become ready, per front end of the app core.
+
+For each target this reports the time to import it in a fresh interpreter, the time from
+spawning the server to its first answered request (run directly and through the WSGI
+callable), and the time from forking a pre-fork worker off a loaded server to that worker's
+first answered request. Bytecode caches are written first, as on a deployed server.
+
+Usage: python benchmarks/worker_startup.py [--targets DJ devjam24 DEVJAMS devjam main] [--runs 7] [--budget 100]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+import http.client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from serving_modes import free_port
+
+TARGETS = ("DJ", "devjam24", "DEVJAMS", "devjam", "main")
+
+IMPORT_TIMER = "import sys, time; sys.path.insert(0, {root!r}); t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+FORK_TIMER = """
+import os, sys, time, http.client
+sys.path.insert(0, {root!r})
+import serving, wsgi, {module} as target
+handler = getattr(target, 'SimpleHTTPRequestHandler', None)
+if handler is None:
+    handler = type('Handler', (wsgi.WSGIHandler,), {{'application': staticmethod(wsgi.load({module!r} + ':app'))}})
+handler.log_message = lambda *args: None
+httpd = serving.make_server(handler, {port}, mode='single')
+for _ in range({runs}):
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        httpd.handle_request()
+        os._exit(0)
+    conn = http.client.HTTPConnection('127.0.0.1', {port}, timeout=10)
+    conn.request('GET', '/')
+    conn.getresponse().read()
+    print(time.perf_counter() - start)
+    conn.close()
+    os.waitpid(pid, 0)
+"""
+
+
+def child_env():
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def spawn_command(target, port, use_wsgi):
+    if target == "main":
+        return [sys.executable, os.path.join(ROOT, "wsgi.py"), "main:app", "--port", str(port), "--mode", "single"]
+    command = [sys.executable, os.path.join(ROOT, f"{target}.py"), "--port", str(port), "--mode", "single"]
+    return command + ["--wsgi"] if use_wsgi else command
+
+
+def first_response(command, port, workdir):
+    """Seconds from starting command to its first answered GET /."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(command, cwd=workdir, env=child_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = start + 20
+        while time.perf_counter() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{' '.join(command)} exited with {proc.returncode}")
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                conn.request('GET', '/')
+                conn.getresponse().read()
+                conn.close()
+                return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.002)
+        raise RuntimeError(f"{' '.join(command)} did not answer")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def run_python(code, workdir):
+    out = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=child_env(),
+                         capture_output=True, text=True, check=True).stdout
+    return [float(line) for line in out.split()]
+
+
+def median_ms(samples):
+    return statistics.median(samples) * 1000
+
+
+def measure(target, runs, workdir):
+    if target == "main":
+        try:
+            import flask  # noqa: F401
+        except ImportError:
+            return None
+    # The first run creates the databases and bytecode; it is not what a restart costs
+    run_python(IMPORT_TIMER.format(root=ROOT, module=target), workdir)
+    imports = [run_python(IMPORT_TIMER.format(root=ROOT, module=target), workdir)[0] for _ in range(runs)]
+    direct = [first_response(spawn_command(target, port, False), port, workdir) for port in [free_port()] * runs]
+    through_wsgi = [first_response(spawn_command(target, port, True), port, workdir) for port in [free_port()] * runs]
+    forked = run_python(FORK_TIMER.format(root=ROOT, module=target, port=free_port(), runs=runs), workdir)
+    return median_ms(imports), median_ms(direct), median_ms(through_wsgi), median_ms(forked)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--targets", nargs="+", default=list(TARGETS))
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget", type=float, default=100, help="milliseconds a forked worker may take to be ready")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], env=child_env(), check=True)
+    print(f"bare interpreter start: {(time.perf_counter() - start) * 1000:.0f} ms (included in the spawn columns)")
+    print(f"{'target':>10}{'import ms':>11}{'spawn ms':>10}{'spawn wsgi ms':>15}{'fork ms':>9}{'budget':>8}")
+    for target in args.targets:
+        with tempfile.TemporaryDirectory() as workdir:
+            result = measure(target, args.runs, workdir)
+        if result is None:
+            print(f"{target:>10}  skipped: Flask is not installed")
+            continue
+        imported, direct, through_wsgi, forked = result
+        verdict = "ok" if forked < args.budget else "over"
+        print(f"{target:>10}{imported:>11.1f}{direct:>10.1f}{through_wsgi:>15.1f}{forked:>9.2f}{verdict:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import hashlib
+
+import storage
+import persistence
+
+# Content-addressed store: names map to sha256 digests in .index.json, a storage backend keeps the blobs
+INDEX_NAME = ".index.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    """Hash a file sequentially without loading it into memory."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """Deduplicating upload store: an index of names over blobs that a storage backend keeps.
+
+    With the default backend the blobs are files under .blobs/ and the visible UPLOAD_DIR/<name>
+    files are hardlinks to them.
+    """
+
+    def __init__(self, root, backend=None):
+        self.root = root
+        self._index = persistence.JSONFile(os.path.join(root, INDEX_NAME))
+        os.makedirs(root, exist_ok=True)
+        self.backend = backend or storage.DiskBackend(root)
+
+    def blob_path(self, digest):
+        """A local path holding the blob, which a remote backend downloads into its cache first."""
+        return self.backend.local_path(digest)
+
+    def open_blob(self, digest):
+        return self.backend.open(digest)
+
+    def blob_mtime(self, digest):
+        """When the blob was stored, or None if it is missing."""
+        return self.backend.mtime(digest)
+
+    def _name_taken(self, index, name, digest):
+        existing = index.get(name)
+        if existing is not None:
+            return existing['digest'] != digest
+        # A file left over from before the store existed also counts as taken
+        return self.backend.name_taken(name, digest)
+
+    def _unique_name(self, index, name, digest):
+        # Names are links next to the index and its lock and temp files, so they may not be hidden
+        name = os.path.basename(name).lstrip('.') or digest[:16]
+        if not self._name_taken(index, name, digest):
+            return name
+        stem, ext = os.path.splitext(name)
+        return f"{stem}-{digest[:8]}{ext}"
+
+    def add(self, path, name, digest=None, durable=False):
+        """Move the file at path into the store under name and return the name actually used.
+
+        If the content is already stored the new copy is dropped and name just references the
+        existing blob. A different file already using name gets a digest suffix instead of
+        being overwritten, and leading dots are dropped.
+        """
+        digest = digest or file_digest(path)
+        size = os.path.getsize(path)
+        # Storing can take a while on a remote backend, so it is done without holding the index lock
+        if not self.backend.exists(digest):
+            self.backend.put(path, digest, durable)
+        with self._index.locked() as index:
+            # remove() of the last name using this content may have deleted it in the meantime
+            if not self.backend.exists(digest):
+                self.backend.put(path, digest, durable)
+            name = self._unique_name(index, name, digest)
+            self.backend.link(name, digest)
+            index[name] = {"digest": digest, "size": size}
+            self._index.save()
+        self.backend.discard(path, digest)
+        return name
+
+    def get(self, name):
+        """Return the index entry ({'digest', 'size'}) for name, or None."""
+        with self._index.loaded() as index:
+            return index.get(name)
+
+    def names(self):
+        """Return the stored names in sorted order."""
+        with self._index.loaded() as index:
+            return sorted(index)
+
+    def open(self, name):
+        entry = self.get(name)
+        if entry is None:
+            raise FileNotFoundError(name)
+        return self.backend.open(entry['digest'])
+
+    def remove(self, name):
+        """Drop name from the index and delete its blob once nothing references it."""
+        with self._index.locked() as index:
+            entry = index.pop(name, None)
+            if entry is None:
+                return False
+            self._index.save()
+            self.backend.unlink(name, entry['digest'])
+            if not any(e['digest'] == entry['digest'] for e in index.values()):
+                self.backend.delete(entry['digest'])
+        return True
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import base64
+
+import persistence
+
+# Persistent catalog of uploads so listings cost O(page size) instead of os.listdir()
+CATALOG_NAME = ".catalog.sqlite3"
+DEFAULT_PAGE_SIZE = 50
+SORT_COLUMNS = ("mtime", "name", "size")
+
+
+def encode_cursor(sort_value, name):
+    return base64.urlsafe_b64encode(json.dumps([sort_value, name]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor from a previous page; returns None for missing or garbled cursors."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, name = json.loads(base64.urlsafe_b64decode(padded))
+        return sort_value, name
+    except (ValueError, TypeError):
+        return None
+
+
+class UploadCatalog:
+    """SQLite-backed index of uploads (name, owner, size, mtime, digest) with keyset pagination.
+
+    Like the event store, every change bumps a generation number in the same transaction, so
+    rendered listings in any process can be checked for staleness with one indexed read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # One connection per thread; WAL lets readers and the writer work concurrently
+        self._connect = persistence.ThreadConnections(self.path)
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS uploads (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    digest TEXT NOT NULL,
+                    media TEXT
+                )""")
+            # Catalogs created before media processing lack the column
+            if 'media' not in {row[1] for row in db.execute("PRAGMA table_info(uploads)")}:
+                db.execute("ALTER TABLE uploads ADD COLUMN media TEXT")
+            db.execute("CREATE INDEX IF NOT EXISTS uploads_mtime ON uploads (mtime, name)")
+            db.execute("CREATE INDEX IF NOT EXISTS uploads_size ON uploads (size, name)")
+            db.execute("CREATE INDEX IF NOT EXISTS uploads_owner ON uploads (owner, mtime, name)")
+            db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0)")
+
+    def generation(self):
+        """A number that changes whenever any upload is added, changed or removed."""
+        return self._connect().execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+
+    @staticmethod
+    def _bump(db):
+        db.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+
+    def record(self, name, owner, size, digest, mtime=None):
+        """Insert or update one upload."""
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO uploads (name, owner, size, mtime, digest) VALUES (?, ?, ?, ?, ?)",
+                (name, owner, size, mtime if mtime is not None else time.time(), digest),
+            )
+            self._bump(db)
+
+    def set_media(self, digest, media):
+        """Attach processing results (duration, container, poster...) to every upload with this content."""
+        with self._connect() as db:
+            db.execute("UPDATE uploads SET media = ? WHERE digest = ?", (json.dumps(media), digest))
+            self._bump(db)
+
+    def remove(self, name):
+        with self._connect() as db:
+            db.execute("DELETE FROM uploads WHERE name = ?", (name,))
+            self._bump(db)
+
+    def get(self, name):
+        row = self._connect().execute(
+            "SELECT name, owner, size, mtime, digest, media FROM uploads WHERE name = ?", (name,)
+        ).fetchone()
+        return self._row(row) if row else None
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM uploads").fetchone()[0]
+
+    def page(self, sort="mtime", descending=True, limit=DEFAULT_PAGE_SIZE, cursor=None, owner=None):
+        """Return (rows, next_cursor) for one page, continuing after cursor if given."""
+        if sort not in SORT_COLUMNS:
+            sort = "mtime"
+        limit = max(1, min(int(limit), 500))
+        order = "DESC" if descending else "ASC"
+        where, params = [], []
+        if owner is not None:
+            where.append("owner = ?")
+            params.append(owner)
+        after = decode_cursor(cursor)
+        if after is not None:
+            if sort == "name":
+                where.append(f"name {'<' if descending else '>'} ?")
+                params.append(after[1])
+            else:
+                where.append(f"({sort}, name) {'<' if descending else '>'} (?, ?)")
+                params.extend(after)
+        order_by = "name" if sort == "name" else f"{sort} {order}, name"
+        sql = "SELECT name, owner, size, mtime, digest, media FROM uploads"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order_by} {order} LIMIT ?"
+        rows = [self._row(r) for r in self._connect().execute(sql, params + [limit + 1])]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last[sort], last["name"])
+        return rows, next_cursor
+
+    def import_store(self, store):
+        """Backfill the catalog from a blob store's name index (used once, when the catalog is empty)."""
+        with self._connect() as db:
+            for name in store.names():
+                entry = store.get(name)
+                if entry is None:
+                    continue
+                mtime = store.blob_mtime(entry['digest'])
+                if mtime is None:
+                    continue
+                db.execute(
+                    "INSERT OR IGNORE INTO uploads (name, owner, size, mtime, digest) VALUES (?, NULL, ?, ?, ?)",
+                    (name, entry['size'], mtime, entry['digest']),
+                )
+            self._bump(db)
+
+    @staticmethod
+    def _row(row):
+        return {"name": row[0], "owner": row[1], "size": row[2], "mtime": row[3], "digest": row[4],
+                "media": json.loads(row[5]) if row[5] else None}
+
+
+def open_catalog(upload_dir, store=None):
+    """Open the catalog in upload_dir, backfilling it from store the first time."""
+    upload_catalog = UploadCatalog(os.path.join(upload_dir, CATALOG_NAME))
+    if store is not None and upload_catalog.count() == 0:
+        upload_catalog.import_store(store)
+    return upload_catalog
@@ -0,0 +1,390 @@
+import os
+import re
+import json
+import time
+import fcntl
+import threading
+from html import escape
+from urllib.parse import parse_qs
+from collections import deque
+from itertools import islice
+
+# Chat rooms: bounded in-memory history backed by an append-only JSON-lines log per room.
+# The log is shared by every worker process; ids are allocated under an flock on it.
+CHAT_LOG_DIR = "chat_logs"
+HISTORY_SIZE = 500
+MAX_MESSAGE_LENGTH = 2000
+POLL_TIMEOUT = 25
+HEARTBEAT_INTERVAL = 15
+# How often a waiting client checks the log for messages posted by other worker processes,
+# and how stale a woken waiter's view may be (so waking many waiters costs one stat, not one each)
+SYNC_INTERVAL = 0.5
+SYNC_STALENESS = 0.05
+# Share of a server's request threads that streams and long-polls may hold at once. Past it a
+# stream is refused with 503 (the page then polls every RETRY_AFTER seconds) and a long-poll
+# answers without waiting; a server with no thread pool gets none
+WAITING_SHARE = float(os.environ.get("CHAT_WAITING_SHARE", 0.5))
+RETRY_AFTER = 3
+DEFAULT_ROOM = "lobby"
+ROOM_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Appends live messages to the #chat-history list via Server-Sent Events
+CHAT_SCRIPT = """
+<script>
+    var chatHistory = document.getElementById('chat-history');
+    function showMessage(message) {
+        var item = document.createElement('li');
+        item.className = chatHistory.dataset.itemClass || '';
+        item.textContent = message.user + ': ' + message.text;
+        chatHistory.appendChild(item);
+        chatHistory.dataset.lastId = message.id;
+    }
+    function poll() {
+        fetch('/chat/messages?after=' + chatHistory.dataset.lastId)
+            .then(function (response) { return response.json(); })
+            .then(function (data) { data.messages.forEach(showMessage); })
+            .finally(function () { setTimeout(poll, %d); });
+    }
+    var source = new EventSource('/chat/stream?after=' + chatHistory.dataset.lastId);
+    source.onmessage = function (event) { showMessage(JSON.parse(event.data)); };
+    source.onerror = function () {
+        // The server is out of stream slots (or the stream is gone for good): poll instead
+        if (source.readyState === EventSource.CLOSED) {
+            poll();
+        }
+    };
+</script>
+""" % (RETRY_AFTER * 1000)
+
+
+class Message:
+    """One chat message; the SSE frame is encoded once and shared by every subscriber."""
+
+    __slots__ = ('id', 'user', 'text', 'ts', 'sse')
+
+    def __init__(self, id, user, text, ts):
+        self.id = id
+        self.user = user
+        self.text = text
+        self.ts = ts
+        self.sse = f"id: {id}\ndata: {json.dumps(self.to_dict())}\n\n".encode()
+
+    def to_dict(self):
+        return {"id": self.id, "user": self.user, "text": self.text, "ts": self.ts}
+
+
+def _tail_lines(path, count, block_size=64 * 1024):
+    """Return the last count lines of a file without reading all of it."""
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return []
+    with f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        data = b''
+        while end > 0 and data.count(b'\n') <= count:
+            start = max(0, end - block_size)
+            f.seek(start)
+            data = f.read(end - start) + data
+            end = start
+    return [line for line in data.split(b'\n') if line][-count:]
+
+
+class ChatRoom:
+    """A room whose waiters are all woken by one notify_all per posted message.
+
+    Messages posted by other processes sharing the log are picked up whenever the room is
+    read, and by waiting clients every SYNC_INTERVAL seconds.
+    """
+
+    def __init__(self, name, log_dir=CHAT_LOG_DIR, history_size=HISTORY_SIZE):
+        self.name = name
+        self.messages = deque(maxlen=history_size)
+        self.last_id = 0
+        self._cond = threading.Condition()
+        self._listeners = []
+        self._next_sync = 0
+        os.makedirs(log_dir, exist_ok=True)
+        self.log_path = os.path.join(log_dir, f"{name}.jsonl")
+        try:
+            # Lines appended after this are read again by _refresh, which skips ids it has
+            self._offset = os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            self._offset = 0
+        for line in _tail_lines(self.log_path, history_size):
+            self._add_line(line)
+        self._refresh(force=True)
+
+    def _add_line(self, line):
+        try:
+            data = json.loads(line)
+            message = Message(data['id'], data['user'], data['text'], data['ts'])
+        except (ValueError, KeyError):
+            return None
+        if message.id <= self.last_id:
+            return None
+        self.messages.append(message)
+        self.last_id = message.id
+        return message
+
+    def _refresh(self, force=False):
+        """Load whole lines other processes have appended to the log since it was last read."""
+        now = time.monotonic()
+        if not force and now < self._next_sync:
+            return False
+        self._next_sync = now + SYNC_STALENESS
+        try:
+            size = os.stat(self.log_path).st_size
+        except FileNotFoundError:
+            return False
+        if size <= self._offset:
+            return False
+        with open(self.log_path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        end = data.rfind(b'\n') + 1
+        self._offset += end
+        added = [line for line in data[:end].split(b'\n') if line and self._add_line(line)]
+        if added:
+            self._cond.notify_all()
+        return bool(added)
+
+    def post(self, user, text):
+        """Append a message to the log and the history, then wake every waiting client."""
+        text = (text or '').strip()[:MAX_MESSAGE_LENGTH]
+        if not text:
+            return None
+        with self._cond:
+            # Opened per post: an flock belongs to the open file, which forked workers would share
+            with open(self.log_path, 'ab') as log:
+                fcntl.flock(log, fcntl.LOCK_EX)
+                # Catch up first, so the id follows whatever another process posted last
+                self._refresh(force=True)
+                message = Message(self.last_id + 1, user, text, time.time())
+                line = (json.dumps(message.to_dict()) + '\n').encode()
+                log.write(line)
+                log.flush()
+                self._offset += len(line)
+            self.messages.append(message)
+            self.last_id = message.id
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener()
+        return message
+
+    def since(self, after_id):
+        """Return buffered messages newer than after_id."""
+        with self._cond:
+            self._refresh(force=True)
+            return self._newer(after_id)
+
+    def _newer(self, after_id):
+        newest = []
+        for message in reversed(self.messages):
+            if message.id <= after_id:
+                break
+            newest.append(message)
+        return newest[::-1]
+
+    def recent(self, count=50):
+        """Return up to count of the newest messages, oldest first."""
+        with self._cond:
+            self._refresh(force=True)
+            return list(islice(reversed(self.messages), count))[::-1]
+
+    def wait(self, after_id, timeout=POLL_TIMEOUT):
+        """Block until a message newer than after_id arrives or timeout passes."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._refresh()
+                if self.last_id > after_id:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(min(remaining, SYNC_INTERVAL))
+            return self._newer(after_id)
+
+    def add_listener(self, callback):
+        """Call callback (from the posting thread) after every new message."""
+        with self._cond:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._cond:
+            self._listeners.remove(callback)
+
+
+class AsyncFeed:
+    """Lets any number of coroutines wait on a room with one cross-thread wakeup per message.
+
+    All waiters share a single future that is resolved and replaced after each post.
+    """
+
+    def __init__(self, room, loop):
+        self.room = room
+        self.loop = loop
+        self._future = loop.create_future()
+        room.add_listener(self._notify)
+
+    def _notify(self):
+        self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        future, self._future = self._future, self.loop.create_future()
+        future.set_result(None)
+
+    def close(self):
+        self.room.remove_listener(self._notify)
+
+    async def wait(self, after_id, timeout=POLL_TIMEOUT):
+        """Async counterpart of ChatRoom.wait."""
+        # Only the asyncio server makes feeds; the other modes start faster without importing it
+        import asyncio
+        if self.room.last_id <= after_id:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._future), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.room.since(after_id)
+
+    async def events(self, last_id, heartbeat=HEARTBEAT_INTERVAL):
+        """Async counterpart of event_stream."""
+        messages = self.room.since(last_id)
+        while True:
+            if messages:
+                yield b''.join(m.sse for m in messages)
+                last_id = messages[-1].id
+            else:
+                yield b": keepalive\n\n"
+            messages = await self.wait(last_id, heartbeat)
+
+
+class ChatHub:
+    """Creates rooms on first use."""
+
+    def __init__(self, log_dir=CHAT_LOG_DIR, history_size=HISTORY_SIZE):
+        self.log_dir = log_dir
+        self.history_size = history_size
+        self.rooms = {}
+        self._lock = threading.Lock()
+
+    def room(self, name=DEFAULT_ROOM):
+        if not ROOM_NAME.match(name or ''):
+            raise ValueError(f"Invalid room name: {name!r}")
+        with self._lock:
+            room = self.rooms.get(name)
+            if room is None:
+                room = self.rooms[name] = ChatRoom(name, self.log_dir, self.history_size)
+            return room
+
+
+def parse_after(value, default=0):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def event_stream(room, last_id, heartbeat=HEARTBEAT_INTERVAL):
+    """Yield Server-Sent Event bytes forever: backlog first, then new messages or keepalives."""
+    messages = room.since(last_id)
+    while True:
+        if messages:
+            yield b''.join(m.sse for m in messages)
+            last_id = messages[-1].id
+        else:
+            yield b": keepalive\n\n"
+        messages = room.wait(last_id, heartbeat)
+
+
+def stream_events(wfile, room, last_id, heartbeat=HEARTBEAT_INTERVAL):
+    """Write Server-Sent Events to wfile until the client goes away."""
+    try:
+        for frame in event_stream(room, last_id, heartbeat):
+            wfile.write(frame)
+            wfile.flush()
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+
+
+_waiting_lock = threading.Lock()
+_waiting = {}
+
+
+def _take_waiting_slot(server):
+    """Count a request that will hold one of server's threads; False when the share is used up."""
+    if server is None:
+        # Under the WSGI adapter the handler cannot see the server or its pool
+        return True
+    limit = int(getattr(server, 'workers', 0) * WAITING_SHARE)
+    with _waiting_lock:
+        held = _waiting.get(server, 0)
+        if held >= limit:
+            return False
+        _waiting[server] = held + 1
+    return True
+
+
+def _release_waiting_slot(server):
+    if server is not None:
+        with _waiting_lock:
+            _waiting[server] -= 1
+
+
+def render_history(room, item_class='', count=50):
+    """Render the newest messages as an escaped <ul id="chat-history"> plus the live-update script."""
+    items = ''.join(
+        f"<li class='{item_class}'>{escape(m.user)}: {escape(m.text)}</li>" for m in room.recent(count)
+    )
+    return (f"<ul class='list-group' id='chat-history' data-last-id='{room.last_id}' data-item-class='{item_class}'>"
+            f"{items}</ul>{CHAT_SCRIPT}")
+
+
+def serve_chat_api(handler, room):
+    """Serve /chat/messages (long-poll JSON) and /chat/stream (SSE) for a BaseHTTPRequestHandler.
+
+    Only WAITING_SHARE of the server's threads are left waiting on the room at once, so the
+    rest of the site stays reachable however many chat pages are open. Returns False if the request path is neither endpoint.
+    """
+    path, _, query = handler.path.partition('?')
+    params = parse_qs(query)
+    if path == '/chat/messages':
+        after = parse_after(params.get('after', [None])[0])
+        timeout = min(POLL_TIMEOUT, parse_after(params.get('timeout', [None])[0], POLL_TIMEOUT))
+        messages = room.since(after)
+        if not messages and timeout and _take_waiting_slot(handler.server):
+            try:
+                messages = room.wait(after, timeout)
+            finally:
+                _release_waiting_slot(handler.server)
+        body = json.dumps({"messages": [m.to_dict() for m in messages], "last_id": room.last_id}).encode()
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.send_header('Cache-Control', 'no-store')
+        handler.end_headers()
+        handler.wfile.write(body)
+        return True
+    if path == '/chat/stream':
+        after = parse_after(handler.headers.get('Last-Event-ID') or params.get('after', [None])[0])
+        if not _take_waiting_slot(handler.server):
+            handler.send_response(503)
+            handler.send_header('Retry-After', str(RETRY_AFTER))
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return True
+        try:
+            handler.send_response(200)
+            handler.send_header('Content-Type', 'text/event-stream')
+            handler.send_header('Cache-Control', 'no-store')
+            handler.end_headers()
+            handler.close_connection = True
+            stream_events(handler.wfile, room, after)
+        finally:
+            _release_waiting_slot(handler.server)
+        return True
+    return False
@@ -0,0 +1,153 @@
+import os
+import hmac
+import base64
+import hashlib
+import secrets
+import threading
+from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
+
+import persistence
+
+# Registered users and their salted password hashes, persisted as JSON
+USERS_FILE = "users.json"
+# KDF and cost for new hashes; PASSWORD_KDF=pbkdf2_sha256 where scrypt's memory use is a problem
+PASSWORD_KDF = os.environ.get("PASSWORD_KDF", "scrypt")
+SCRYPT_N = int(os.environ.get("SCRYPT_N", 2 ** 15))
+SCRYPT_R = int(os.environ.get("SCRYPT_R", 8))
+SCRYPT_P = int(os.environ.get("SCRYPT_P", 1))
+PBKDF2_ITERATIONS = int(os.environ.get("PBKDF2_ITERATIONS", 600_000))
+SALT_BYTES = 16
+HASH_BYTES = 32
+# hashlib's KDFs release the GIL, so this many hashes run in parallel while the rest queue
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", 0)) or os.cpu_count() or 1
+
+
+def _b64(data):
+    return base64.b64encode(data).decode()
+
+
+def _scrypt(password, salt, n, r, p):
+    # maxmem needs headroom above the 128 * n * r bytes scrypt itself uses
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=HASH_BYTES,
+                          maxmem=256 * n * r + 1024 * 1024)
+
+
+def hash_password(password, kdf=None):
+    """Return an encoded hash: "scrypt$n$r$p$salt$hash" or "pbkdf2_sha256$iterations$salt$hash"."""
+    kdf = kdf or PASSWORD_KDF
+    salt = secrets.token_bytes(SALT_BYTES)
+    if kdf == "scrypt":
+        digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+    if kdf == "pbkdf2_sha256":
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, PBKDF2_ITERATIONS, HASH_BYTES)
+        return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${_b64(salt)}${_b64(digest)}"
+    raise ValueError(f"Unknown password KDF: {kdf}")
+
+
+def verify_password(password, encoded):
+    """Check password against an encoded hash in constant time.
+
+    Entries without a "$" are legacy plaintext passwords; they still verify so they can be upgraded.
+    """
+    kind, _, rest = encoded.partition('$')
+    try:
+        if kind == "scrypt":
+            n, r, p, salt, digest = rest.split('$')
+            computed = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+        elif kind == "pbkdf2_sha256":
+            iterations, salt, digest = rest.split('$')
+            computed = hashlib.pbkdf2_hmac('sha256', password.encode(), base64.b64decode(salt), int(iterations), HASH_BYTES)
+        elif not rest:
+            return hmac.compare_digest(password.encode(), encoded.encode())
+        else:
+            return False
+    except ValueError:
+        return False
+    return hmac.compare_digest(computed, base64.b64decode(digest))
+
+
+def needs_rehash(encoded):
+    """True when a hash was made with another KDF or weaker settings than the current ones."""
+    parts = encoded.split('$')
+    if parts[0] != PASSWORD_KDF:
+        return True
+    if parts[0] == "scrypt":
+        return (int(parts[1]), int(parts[2]), int(parts[3])) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return int(parts[1]) < PBKDF2_ITERATIONS
+
+
+class CredentialStore:
+    """Username -> password hash, kept in a JSON file shared by every worker process.
+
+    Hashing runs on a small bounded thread pool, so a burst of logins uses at most HASH_WORKERS
+    cores however many request threads are waiting on it.
+    """
+
+    def __init__(self, path=USERS_FILE, workers=HASH_WORKERS):
+        self._users = persistence.JSONFile(path, mode=0o600)
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+
+    @cached_property
+    def _dummy_hash(self):
+        """Used to spend the same time on unknown users as on wrong passwords.
+
+        Made on the first unknown-user login rather than at startup, where it cost a whole KDF run.
+        """
+        return hash_password(secrets.token_urlsafe(16))
+
+    def _kdf_executor(self):
+        # The store is first used at import, in the parent, and its threads do not survive fork
+        with self._lock:
+            if self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='kdf')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _hash(self, password):
+        return self._kdf_executor().submit(hash_password, password).result()
+
+    def _verify(self, password, encoded):
+        return self._kdf_executor().submit(verify_password, password, encoded).result()
+
+    def __contains__(self, username):
+        with self._users.loaded() as users:
+            return username in users
+
+    def add(self, username, password):
+        """Register a new user; returns False if the name is taken."""
+        if username in self:
+            return False
+        encoded = self._hash(password)
+        with self._users.locked() as users:
+            if username in users:
+                return False
+            users[username] = encoded
+            self._users.save()
+        return True
+
+    def ensure(self, username, password):
+        """Create username with password unless it already exists (for seeded accounts)."""
+        if username not in self:
+            self.add(username, password)
+
+    def verify(self, username, password):
+        """Check a login, upgrading the stored hash if it predates the current KDF settings."""
+        with self._users.loaded() as users:
+            encoded = users.get(username)
+        if encoded is None:
+            self._verify(password, self._dummy_hash)
+            return False
+        if not self._verify(password, encoded):
+            return False
+        if needs_rehash(encoded):
+            upgraded = self._hash(password)
+            with self._users.locked() as users:
+                if users.get(username) == encoded:
+                    users[username] = upgraded
+                    self._users.save()
+        return True
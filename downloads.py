@@ -0,0 +1,170 @@
+import os
+import re
+import mmap
+import socket
+import mimetypes
+import email.utils
+
+import pages
+
+# Stored reels are served under this prefix, e.g. /reels/clip.mp4
+DOWNLOAD_PREFIX = "/reels/"
+# Downloads may sit behind a login, so shared caches must not keep them; the ETag makes revalidation cheap
+DOWNLOAD_HEADERS = (('Cache-Control', 'private, no-cache'),)
+# Where sendfile() is not possible, the file is mmapped and written out this many bytes at a time
+WRITE_CHUNK = 4 * 1024 * 1024
+
+_BYTE_RANGE = re.compile(r'\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$', re.ASCII | re.IGNORECASE)
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+class Download:
+    """An open stored file with the validators and type to serve it with; closes the file on exit."""
+
+    __slots__ = ('file', 'size', 'mtime', 'etag', 'last_modified', 'content_type')
+
+    def __init__(self, file, digest, name):
+        self.file = file
+        st = os.fstat(file.fileno())
+        self.size = st.st_size
+        self.mtime = int(st.st_mtime)
+        # Blobs are content-addressed, so the digest is a strong ETag every worker agrees on
+        self.etag = f'"{digest}"'
+        self.last_modified = email.utils.formatdate(self.mtime, usegmt=True)
+        self.content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()
+
+
+def open_download(store, name):
+    """Open the blob stored under name in a BlobStore, or return None if there is no such upload."""
+    entry = store.get(name)
+    if entry is None:
+        return None
+    try:
+        return Download(store.open_blob(entry['digest']), entry['digest'], name)
+    except FileNotFoundError:
+        return None
+
+
+def parse_range(header, size):
+    """Return (start, end) for a single "bytes=" range, or None to send the whole file.
+
+    Multiple ranges are answered with the whole file, which RFC 9110 allows and players never need.
+    Raises RangeNotSatisfiable when the range lies entirely past the end of the file.
+    """
+    match = _BYTE_RANGE.match(header)
+    if match is None or not (match[1] or match[2]):
+        return None
+    first, last = match[1], match[2]
+    if not first:
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return size - min(suffix, size), size
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    return start, min(int(last) + 1, size) if last else size
+
+
+def _http_date(value):
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def not_modified(download, headers):
+    """True when If-None-Match (or, without it, If-Modified-Since) shows the client has this file."""
+    if_none_match = headers.get('if-none-match')
+    if if_none_match:
+        return pages.etag_matches(if_none_match, download.etag)
+    since = _http_date(headers.get('if-modified-since'))
+    return since is not None and download.mtime <= since
+
+
+def _if_range_matches(download, if_range):
+    """If-Range needs a strong match on the ETag or the exact Last-Modified date."""
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == download.etag
+    return if_range == download.last_modified
+
+
+def prepare(download, method, headers):
+    """Decide how to answer a GET or HEAD for download.
+
+    Returns (status, headers, start, end): 200, 206, 304 or 416, the validator and range
+    headers to send, and the byte span of the file that makes up the body.
+    """
+    common = [('ETag', download.etag), ('Last-Modified', download.last_modified),
+              ('Accept-Ranges', 'bytes'), *DOWNLOAD_HEADERS]
+    if not_modified(download, headers):
+        return 304, common, 0, 0
+    range_header = headers.get('range')
+    if range_header and method == 'GET' and _if_range_matches(download, headers.get('if-range')):
+        try:
+            byte_range = parse_range(range_header, download.size)
+        except RangeNotSatisfiable:
+            return 416, common + [('Content-Range', f"bytes */{download.size}")], 0, 0
+        if byte_range is not None:
+            start, end = byte_range
+            return 206, common + [('Content-Range', f"bytes {start}-{end - 1}/{download.size}")], start, end
+    return 200, common, 0, download.size
+
+
+def send_file(handler, file, offset, count):
+    """Write count bytes of file from offset without copying them through Python where possible.
+
+    A plain socket gets sendfile(), and a WSGI handler's wfile takes the file itself; anything
+    else (a TLS socket, a buffer) is written straight out of an mmap of the file.
+    """
+    sendfile = getattr(handler.wfile, 'sendfile', None)
+    if sendfile is not None:
+        # Under WSGI the server sends the file once the handler has returned
+        sendfile(file, offset, count)
+        return
+    sock = getattr(handler, 'connection', None)
+    if type(sock) is socket.socket:
+        sock.sendfile(file, offset, count)
+        return
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+        for pos in range(offset, offset + count, WRITE_CHUNK):
+            handler.wfile.write(view[pos:min(pos + WRITE_CHUNK, offset + count)])
+
+
+def send_download(handler, store, name):
+    """Serve the upload stored under name to a BaseHTTPRequestHandler, with Range and conditional GET."""
+    download = open_download(store, name)
+    if download is None:
+        handler.send_error(404)
+        return
+    send(handler, download)
+
+
+def send(handler, download):
+    """Answer the handler's request with an open Download, then close it."""
+    with download:
+        status, headers, start, end = prepare(download, handler.command, handler.headers)
+        handler.send_response(status)
+        if status in (200, 206):
+            handler.send_header('Content-Type', download.content_type)
+        for key, value in headers:
+            handler.send_header(key, value)
+        if status != 304:
+            handler.send_header('Content-Length', str(end - start))
+        handler.end_headers()
+        if handler.command != 'HEAD' and end > start:
+            send_file(handler, download.file, start, end - start)
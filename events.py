@@ -0,0 +1,349 @@
+import os
+import sys
+import json
+import argparse
+import datetime
+import threading
+from html import escape
+
+import pages
+import catalog
+import persistence
+
+# Events live in SQLite with indexes on start time and on (tag, start time)
+EVENTS_FILE = os.environ.get("EVENTS_DB", "events.sqlite3")
+# How many upcoming events the /events page lists
+EVENTS_PAGE_SIZE = 100
+# Rendered /events pages kept per tag filter; all are dropped when the events change
+RENDERED_PAGES = 64
+API_PAGE_SIZE = 50
+MAX_API_PAGE = 500
+# Demo events, added on the first start at their next occurrence
+SEED_EVENTS = (("Python Workshop", 9, 25), ("Web Development Bootcamp", 10, 10))
+
+
+class EventError(ValueError):
+    pass
+
+
+def parse_start(value):
+    """Normalise an ISO date or date-time to 'YYYY-MM-DD' or 'YYYY-MM-DDTHH:MM', which sort as text."""
+    try:
+        if len(value) <= 10:
+            return datetime.date.fromisoformat(value).isoformat()
+        return datetime.datetime.fromisoformat(value).strftime('%Y-%m-%dT%H:%M')
+    except (TypeError, ValueError):
+        raise EventError(f"Invalid start: {value!r}") from None
+
+
+def parse_tags(value):
+    """Tags from a list or a comma-separated string, lower-cased and deduplicated in order."""
+    if isinstance(value, str):
+        value = value.split(',')
+    return list(dict.fromkeys(tag.strip().lower() for tag in value or () if tag.strip()))
+
+
+class EventStore:
+    """SQLite-backed events with keyset-paginated range queries by start time, optionally by tag.
+
+    Every change bumps a generation number in the same transaction, so caches in any process
+    can tell with one indexed read whether what they rendered is still current.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # One connection per thread; WAL lets readers and the writer work concurrently
+        self._connect = persistence.ThreadConnections(self.path)
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    starts TEXT NOT NULL,
+                    location TEXT,
+                    description TEXT,
+                    tags TEXT NOT NULL DEFAULT '[]'
+                )""")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS event_tags (
+                    tag TEXT NOT NULL,
+                    starts TEXT NOT NULL,
+                    event_id INTEGER NOT NULL,
+                    PRIMARY KEY (tag, starts, event_id)
+                ) WITHOUT ROWID""")
+            db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS events_starts ON events (starts, id)")
+            db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0)")
+
+    def generation(self):
+        """A number that changes whenever any event is added, changed or removed."""
+        return self._connect().execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+
+    @staticmethod
+    def _bump(db):
+        db.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+
+    @staticmethod
+    def _insert(db, title, starts, tags=(), location=None, description=None):
+        if not title or not title.strip():
+            raise EventError("An event needs a title")
+        starts, tags = parse_start(starts), parse_tags(tags)
+        event_id = db.execute(
+            "INSERT INTO events (title, starts, location, description, tags) VALUES (?, ?, ?, ?, ?)",
+            (title.strip(), starts, location or None, description or None, json.dumps(tags)),
+        ).lastrowid
+        db.executemany("INSERT INTO event_tags (tag, starts, event_id) VALUES (?, ?, ?)",
+                       [(tag, starts, event_id) for tag in tags])
+        return event_id
+
+    def add(self, title, starts, tags=(), location=None, description=None):
+        """Add one event and return its id."""
+        with self._connect() as db:
+            event_id = self._insert(db, title, starts, tags, location, description)
+            self._bump(db)
+        return event_id
+
+    def import_events(self, items):
+        """Add many events (dicts with title, starts and optionally tags, location, description) at once."""
+        with self._connect() as db:
+            ids = [self._insert(db, item.get('title'), item.get('starts'), item.get('tags'),
+                                item.get('location'), item.get('description')) for item in items]
+            self._bump(db)
+        return ids
+
+    def remove(self, event_id):
+        """Remove an event; returns False if there was none with this id."""
+        with self._connect() as db:
+            if not db.execute("DELETE FROM events WHERE id = ?", (event_id,)).rowcount:
+                return False
+            db.execute("DELETE FROM event_tags WHERE event_id = ?", (event_id,))
+            self._bump(db)
+        return True
+
+    def get(self, event_id):
+        row = self._connect().execute(
+            "SELECT id, title, starts, location, description, tags FROM events WHERE id = ?", (event_id,)
+        ).fetchone()
+        return self._row(row) if row else None
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def query(self, start=None, end=None, tag=None, limit=API_PAGE_SIZE, cursor=None):
+        """Return (events, next_cursor) starting at or after start and before end, in start order."""
+        limit = max(1, min(int(limit), MAX_API_PAGE))
+        if tag:
+            sql = ("SELECT e.id, e.title, e.starts, e.location, e.description, e.tags"
+                   " FROM event_tags t JOIN events e ON e.id = t.event_id")
+            where, params, starts, event_id = ["t.tag = ?"], [tag.lower()], "t.starts", "t.event_id"
+        else:
+            sql = "SELECT id, title, starts, location, description, tags FROM events e"
+            where, params, starts, event_id = [], [], "e.starts", "e.id"
+        if start:
+            where.append(f"{starts} >= ?")
+            params.append(start)
+        if end:
+            where.append(f"{starts} < ?")
+            params.append(end)
+        after = catalog.decode_cursor(cursor)
+        if after is not None:
+            where.append(f"({starts}, {event_id}) > (?, ?)")
+            params.extend(after)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {starts}, {event_id} LIMIT ?"
+        rows = [self._row(r) for r in self._connect().execute(sql, params + [limit + 1])]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = catalog.encode_cursor(rows[-1]["starts"], rows[-1]["id"])
+        return rows, next_cursor
+
+    def upcoming(self, days=None, tag=None, limit=API_PAGE_SIZE, cursor=None, today=None):
+        """Events from today on, or only those in the next days days."""
+        today = today or datetime.date.today()
+        end = (today + datetime.timedelta(days=days)).isoformat() if days is not None else None
+        return self.query(today.isoformat(), end, tag, limit, cursor)
+
+    @staticmethod
+    def _row(row):
+        return {"id": row[0], "title": row[1], "starts": row[2], "location": row[3],
+                "description": row[4], "tags": json.loads(row[5])}
+
+    def seed(self, events=SEED_EVENTS, today=None):
+        """Add the demo events once, on their next (month, day) from today."""
+        today = today or datetime.date.today()
+        with self._connect() as db:
+            if db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('seeded', 1)").rowcount:
+                for title, month, day in events:
+                    when = datetime.date(today.year, month, day)
+                    if when < today:
+                        when = when.replace(year=today.year + 1)
+                    self._insert(db, title, when.isoformat())
+                self._bump(db)
+
+
+def open_event_store(path=EVENTS_FILE):
+    """Open the event store, adding the demo events the first time."""
+    store = EventStore(path)
+    store.seed()
+    return store
+
+
+def format_start(starts):
+    """'Fri, Sep 25 2026' or 'Fri, Sep 25 2026 18:30'."""
+    if 'T' in starts:
+        return datetime.datetime.fromisoformat(starts).strftime('%a, %b %d %Y %H:%M')
+    return datetime.date.fromisoformat(starts).strftime('%a, %b %d %Y')
+
+
+def render_list(events, item_class=''):
+    """Render events as an escaped <ul> of "title - date" items with location and tags."""
+    items = []
+    for event in events:
+        extra = f" @ {escape(event['location'])}" if event['location'] else ''
+        if event['tags']:
+            extra += ' [' + escape(', '.join(event['tags'])) + ']'
+        items.append(f"<li class='{item_class}'>{escape(event['title'])} - {format_start(event['starts'])}{extra}</li>")
+    if not items:
+        items.append(f"<li class='{item_class}'>No upcoming events.</li>")
+    return f"<ul class='list-group'>{''.join(items)}</ul>"
+
+
+def parse_query(params):
+    """Keyword arguments for EventStore.upcoming/query from parsed query-string params.
+
+    Takes days (upcoming in the next N days) or from/to dates, plus tag, limit and cursor.
+    """
+    def first(key):
+        values = params.get(key)
+        return values[0] if values else None
+    try:
+        limit = int(first('limit') or API_PAGE_SIZE)
+        days = int(first('days')) if first('days') else None
+    except ValueError:
+        raise EventError("limit and days must be integers") from None
+    if days is not None and days < 0:
+        raise EventError("days must not be negative")
+    start, end = first('from'), first('to')
+    kwargs = {"tag": first('tag'), "limit": limit, "cursor": first('cursor')}
+    if start or end:
+        kwargs["start"] = parse_start(start) if start else None
+        kwargs["end"] = parse_start(end) if end else None
+    else:
+        kwargs["days"] = days
+    return kwargs
+
+
+def find_events(store, params):
+    """Run an API query from query-string params; returns the JSON-ready result."""
+    kwargs = parse_query(params)
+    rows, next_cursor = store.query(**kwargs) if 'days' not in kwargs else store.upcoming(**kwargs)
+    return {"events": rows, "next_cursor": next_cursor}
+
+
+def add_from_form(store, fields):
+    """Add an event from parsed form fields (title, starts, tags, location, description); returns it."""
+    def first(key):
+        values = fields.get(key)
+        return values[0] if values else None
+    return store.get(store.add(first('title'), first('starts'), first('tags'), first('location'), first('description')))
+
+
+def send_json(handler, status, data, headers=()):
+    body = json.dumps(data).encode()
+    handler.send_response(status)
+    handler.send_header('Content-Type', 'application/json')
+    handler.send_header('Content-Length', str(len(body)))
+    for key, value in headers:
+        handler.send_header(key, value)
+    handler.end_headers()
+    if handler.command != 'HEAD':
+        handler.wfile.write(body)
+
+
+def serve_events_api(handler, store):
+    """Answer GET /events/upcoming for a routed BaseHTTPRequestHandler."""
+    try:
+        send_json(handler, 200, find_events(store, handler.query), (('Cache-Control', 'no-cache'),))
+    except EventError as e:
+        send_json(handler, 400, {"error": str(e)})
+
+
+class PageCache:
+    """Rendered /events pages, reused until the events change or the date rolls over.
+
+    A hit costs one read of the store's generation; pages come back as CachedPage, so they
+    carry precompressed variants and ETags and go out like static files.
+    """
+
+    def __init__(self, store, size=RENDERED_PAGES, page_size=EVENTS_PAGE_SIZE):
+        self.store = store
+        self.size = size
+        self.page_size = page_size
+        self._pages = {}
+        self._current = None
+        self._lock = threading.Lock()
+
+    def get(self, render, tag=None):
+        """Return the CachedPage for tag, calling render(events) to build it on a miss."""
+        current = (self.store.generation(), datetime.date.today())
+        key = (current, tag or None)
+        page = self._pages.get(key)
+        if page is None:
+            events, _ = self.store.upcoming(tag=tag, limit=self.page_size)
+            page = pages.CachedPage(render(events))
+            with self._lock:
+                if current != self._current:
+                    self._pages.clear()
+                    self._current = current
+                if len(self._pages) >= self.size:
+                    self._pages.pop(next(iter(self._pages)))
+                self._pages[key] = page
+        return page
+
+
+def main(argv=None):
+    """Manage events from the command line: add, remove, import a JSON list, or list upcoming."""
+    parser = argparse.ArgumentParser(prog="events.py", description=main.__doc__)
+    parser.add_argument("--db", default=EVENTS_FILE)
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add")
+    add.add_argument("title")
+    add.add_argument("starts", help="YYYY-MM-DD or YYYY-MM-DDTHH:MM")
+    add.add_argument("--tag", action="append", default=[])
+    add.add_argument("--location")
+    add.add_argument("--description")
+    remove = commands.add_parser("remove")
+    remove.add_argument("id", type=int)
+    load = commands.add_parser("import")
+    load.add_argument("file", help="JSON list of {title, starts, tags, location, description}")
+    listing = commands.add_parser("list")
+    listing.add_argument("--days", type=int)
+    listing.add_argument("--tag")
+    args = parser.parse_args(argv)
+
+    store = open_event_store(args.db)
+    try:
+        if args.command == "add":
+            print(store.add(args.title, args.starts, args.tag, args.location, args.description))
+        elif args.command == "remove":
+            if not store.remove(args.id):
+                sys.exit(f"No event {args.id}")
+        elif args.command == "import":
+            with open(args.file) as f:
+                print(f"Imported {len(store.import_events(json.load(f)))} events")
+        else:
+            cursor = None
+            while True:
+                rows, cursor = store.upcoming(args.days, args.tag, MAX_API_PAGE, cursor)
+                for event in rows:
+                    print(f"{event['id']:>6}  {event['starts']:<16}  {event['title']}")
+                if cursor is None:
+                    break
+    except EventError as e:
+        sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()
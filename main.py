@@ -1,90 +1,88 @@
-from flask import Flask, request, render_template, redirect, url_for, make_response
 import os
+from flask import Flask
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+import pages
+import wsgi
+from events import format_start
+from webapp import AppHandler, CHAT_ROOM, UPLOAD_CATALOG, MEDIA_QUEUE
 
-UPLOAD_DIR = "uploads"
-USER_CREDENTIALS = {'testuser': 'password123'}
-LOGGED_IN_USERS = {}
+# Template and fixed context for each page of the app core
+TEMPLATES = {
+    'welcome': ("index.html", {}),
+    'home': ("index.html", {}),
+    'login': ("login.html", {}),
+    'login_failed': ("login.html", {'error': "Invalid username or password."}),
+    'signup': ("signup.html", {}),
+    'signup_failed': ("signup.html", {'error': "Username already exists."}),
+    'denied': ("access_denied.html", {}),
+    'upload': ("upload.html", {}),
+    'uploaded': ("upload_success.html", {}),
+    'upload_failed': ("upload.html", {'error': "No file selected for upload."}),
+    'chat': ("chat.html", {}),
+    'events': ("events.html", {}),
+}
 
-# Ensure upload directory exists
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
+# Rendered bytes, precompressed variants and ETags for pages that are the same for every anonymous visitor
+STATIC_PAGES = {}
+# The uploads list is the same for everyone who sees it, so it is rendered once per catalog change
+FRAGMENTS = pages.FragmentCache()
+# Compiled templates are kept here between runs; unset, Jinja picks a private directory under /tmp
+TEMPLATE_CACHE_DIR = os.environ.get("TEMPLATE_CACHE_DIR") or None
 
 app = Flask(__name__)
+app.add_template_filter(format_start, 'event_date')
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
 
-@app.route("/")
-def index():
-    username = request.cookies.get('username')
-    if username in LOGGED_IN_USERS:
-        uploaded_files = os.listdir(UPLOAD_DIR)
-        return render_template("index.html", username=username, files=uploaded_files)
-    return render_template("index.html", username=None)
 
-@app.route("/login", methods=["GET", "POST"])
-def login():
-    """
-    if request.method == "POST":
-        username = request.form.get('username')
-        password = request.form.get('password')
-        if username in USER_CREDENTIALS and USER_CREDENTIALS[username] == password:
-            LOGGED_IN_USERS[username] = True
-            resp = make_response(redirect(url_for('index')))
-            resp.set_cookie('username', username)
-            return resp
-        return render_template("login.html", error="Invalid username or password.")
-        """
-    return render_template("login.html")
+def precompile_templates():
+    """Load every template now, from the bytecode cache when it is current, instead of on its first request."""
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
 
-@app.route("/signup", methods=["GET", "POST"])
-def signup():
-    if request.method == "POST":
-        username = request.form.get('username')
-        password = request.form.get('password')
-        if username in USER_CREDENTIALS:
-            return render_template("signup.html", error="Username already exists.")
-        USER_CREDENTIALS[username] = password
-        LOGGED_IN_USERS[username] = True
-        resp = make_response(redirect(url_for('index')))
-        resp.set_cookie('username', username)
-        return resp
-    return render_template("signup.html")
 
-@app.route("/upload", methods=["GET", "POST"])
-def upload():
-    username = request.cookies.get('username')
-    if username not in LOGGED_IN_USERS:
-        return render_template("access_denied.html")
-    
-    if request.method == "POST":
-        uploaded_file = request.files['file']
-        if uploaded_file.filename:
-            file_path = os.path.join(UPLOAD_DIR, uploaded_file.filename)
-            uploaded_file.save(file_path)
-            return render_template("upload_success.html", filename=uploaded_file.filename)
-        return render_template("upload.html", error="No file selected for upload.")
-    
-    return render_template("upload.html")
+class TemplatePages(AppHandler):
+    """The app core with its pages rendered from templates/ by Flask's Jinja environment."""
 
-@app.route("/chat", methods=["GET", "POST"])
-def chat():
-    username = request.cookies.get('username')
-    if username not in LOGGED_IN_USERS:
-        return render_template("access_denied.html")
+    def page_bytes(self, view, **values):
+        template, context = TEMPLATES[view]
+        return app.jinja_env.get_template(template).render(**context, **values).encode()
 
-    if request.method == "POST":
-        message = request.form.get('message')
-        return render_template("chat.html", username=username, message=message)
-    
-    return render_template("chat.html", username=username)
+    def render(self, view, **values):
+        if not values:
+            page = STATIC_PAGES.get(view)
+            if page is None:
+                page = STATIC_PAGES[view] = pages.CachedPage(self.page_bytes(view))
+            pages.send_cached_page(self, page)
+            return
+        if view == 'home':
+            sort = self.query.get('sort', ['mtime'])[0]
+            cursor = self.query.get('cursor', [None])[0]
+            values['uploads'] = FRAGMENTS.get(('uploads', sort, cursor), UPLOAD_CATALOG.generation(),
+                                              lambda: self.uploads_list(sort, cursor))
+        elif view == 'chat':
+            values.update(messages=CHAT_ROOM.recent(), last_id=CHAT_ROOM.last_id)
+        pages.send_page(self, [self.page_bytes(view, **values)])
 
-@app.route("/events")
-def events():
-    return render_template("events.html")
+    @staticmethod
+    def uploads_list(sort, cursor):
+        files, next_cursor = UPLOAD_CATALOG.page(sort=sort, descending=sort != 'name', cursor=cursor)
+        return Markup(app.jinja_env.get_template("_uploads.html").render(
+            files=files, next_cursor=next_cursor, sort=sort))
 
-@app.route("/logout")
-def logout():
-    resp = make_response(redirect(url_for('index')))
-    resp.set_cookie('username', '', expires=0)
-    return resp
+    def chat_history(self):
+        # chat.html renders the messages itself
+        return None
+
+    def events_list(self, rows):
+        return rows
+
+
+# Every route of the app core is answered without going through Flask; anything else still reaches Flask
+app.wsgi_app = wsgi.WSGIApp(TemplatePages, fallback=app.wsgi_app)
+# Done on import so that pre-fork workers share the compiled templates
+precompile_templates()
 
 if __name__ == "__main__":
+    MEDIA_QUEUE.start()
     app.run(port=8080)
@@ -0,0 +1,344 @@
+import os
+import json
+import stat
+import time
+import shutil
+import struct
+import sqlite3
+import functools
+import threading
+import subprocess
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import persistence
+
+# Background processing of uploaded reels: metadata, a poster frame and a low-bitrate preview.
+# Jobs are keyed by blob digest, so identical uploads are processed once, and kept in SQLite
+# so they survive restarts.
+JOBS_NAME = ".jobs.sqlite3"
+MEDIA_DIR_NAME = ".media"
+# Jobs running at once across every server process; MEDIA_WORKERS=0 picks half the cores
+MEDIA_WORKERS = int(os.environ.get("MEDIA_WORKERS", 0)) or max(1, (os.cpu_count() or 1) // 2)
+# Worker processes run at this nice level so transcoding yields the CPU to request handling
+MEDIA_NICE = int(os.environ.get("MEDIA_NICE", 10))
+# Threads each ffmpeg run may use
+ENCODER_THREADS = int(os.environ.get("MEDIA_ENCODER_THREADS", 1))
+# A failing job is retried this many times before it is marked failed
+MAX_ATTEMPTS = 3
+# Dispatchers also look for work from other processes (or from before a restart) this often
+POLL_INTERVAL = 5
+# Any single ffprobe/ffmpeg run is killed after this many seconds
+ENCODE_TIMEOUT = 600
+
+# The encoder is optional; without it only metadata is extracted
+FFMPEG = shutil.which("ffmpeg")
+FFPROBE = shutil.which("ffprobe")
+POSTER_NAME = "poster.jpg"
+PREVIEW_NAME = "preview.mp4"
+POSTER_WIDTH = 480
+PREVIEW_HEIGHT = 360
+PREVIEW_SECONDS = 30
+
+
+def sniff_container(path):
+    """Guess the container from the first bytes of the file."""
+    with open(path, 'rb') as f:
+        head = f.read(64)
+    if head[4:8] == b'ftyp':
+        return 'mov' if head[8:12] == b'qt  ' else 'mp4'
+    if head[:4] == b'\x1aE\xdf\xa3':
+        return 'webm' if b'webm' in head else 'mkv'
+    if head[:4] == b'RIFF' and head[8:12] == b'AVI ':
+        return 'avi'
+    if head[:4] == b'OggS':
+        return 'ogg'
+    return None
+
+
+def _find_box(f, kind, start, end):
+    """Return the (payload start, end) of the first ISO-BMFF box of kind between start and end."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, box = struct.unpack('>I4s', f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return None
+        if box == kind:
+            return pos + header, pos + size
+        pos += size
+    return None
+
+
+def mp4_duration(path):
+    """Duration in seconds from the moov/mvhd box of an MP4 or QuickTime file, or None."""
+    with open(path, 'rb') as f:
+        moov = _find_box(f, b'moov', 0, os.fstat(f.fileno()).st_size)
+        mvhd = moov and _find_box(f, b'mvhd', *moov)
+        if not mvhd:
+            return None
+        f.seek(mvhd[0])
+        version = f.read(4)[0]
+        if version == 1:
+            f.seek(16, os.SEEK_CUR)
+            timescale, duration = struct.unpack('>IQ', f.read(12))
+        else:
+            f.seek(8, os.SEEK_CUR)
+            timescale, duration = struct.unpack('>II', f.read(8))
+    return round(duration / timescale, 3) if timescale else None
+
+
+def probe(path):
+    """Size, container, duration and video stream details, via ffprobe when it is installed."""
+    info = {"size": os.path.getsize(path), "container": sniff_container(path), "duration": None}
+    if FFPROBE:
+        result = subprocess.run(
+            [FFPROBE, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path],
+            capture_output=True, check=True, timeout=ENCODE_TIMEOUT,
+        )
+        data = json.loads(result.stdout)
+        duration = data.get('format', {}).get('duration')
+        info["duration"] = round(float(duration), 3) if duration else None
+        video = next((s for s in data.get('streams', []) if s.get('codec_type') == 'video'), None)
+        if video:
+            info.update(video_codec=video.get('codec_name'), width=video.get('width'), height=video.get('height'))
+    elif info["container"] in ('mp4', 'mov'):
+        info["duration"] = mp4_duration(path)
+    return info
+
+
+def _encode(args, output):
+    """Run ffmpeg into a temp file and move it into place, so a half-written output is never used."""
+    stem, ext = os.path.splitext(output)
+    temp = f"{stem}.tmp{ext}"
+    try:
+        subprocess.run([FFMPEG, '-v', 'error', '-nostdin', '-y', *args, '-threads', str(ENCODER_THREADS), temp],
+                       capture_output=True, check=True, timeout=ENCODE_TIMEOUT)
+        os.replace(temp, output)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+def process_media(source, output_dir):
+    """The job itself, run in a worker process. Outputs that already exist are kept, so reruns are cheap."""
+    os.makedirs(output_dir, exist_ok=True)
+    info = probe(source)
+    if FFMPEG and info.get('video_codec', True):
+        poster = os.path.join(output_dir, POSTER_NAME)
+        if not os.path.exists(poster):
+            seek = min(1.0, (info["duration"] or 0) / 2)
+            _encode(['-ss', str(seek), '-i', source, '-frames:v', '1', '-vf', f'scale={POSTER_WIDTH}:-2'], poster)
+        preview = os.path.join(output_dir, PREVIEW_NAME)
+        if not os.path.exists(preview):
+            _encode(['-i', source, '-t', str(PREVIEW_SECONDS), '-vf', f'scale=-2:{PREVIEW_HEIGHT}',
+                     '-c:v', 'libx264', '-preset', 'veryfast', '-b:v', '400k',
+                     '-c:a', 'aac', '-b:a', '64k', '-movflags', '+faststart'], preview)
+    info["poster"] = os.path.exists(os.path.join(output_dir, POSTER_NAME))
+    info["preview"] = os.path.exists(os.path.join(output_dir, PREVIEW_NAME))
+    return info
+
+
+def _exit_with(parent):
+    while os.getppid() == parent:
+        time.sleep(1)
+    os._exit(1)
+
+
+def _init_worker(parent):
+    """Runs in each forked pool process: lower its priority, drop the server's sockets, exit with it."""
+    os.nice(MEDIA_NICE)
+    # The fork copied the listening socket and open client connections; holding them would keep
+    # the port bound and connections open after the server is done with them. Pointing the fds at
+    # /dev/null rather than closing them keeps the numbers from being reused under stale objects.
+    if os.path.isdir('/proc/self/fd'):
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for name in os.listdir('/proc/self/fd'):
+            try:
+                if stat.S_ISSOCK(os.fstat(int(name)).st_mode):
+                    os.dup2(devnull, int(name))
+            except OSError:
+                pass
+        os.close(devnull)
+    # Pool workers otherwise wait on their queue forever once the server is killed
+    threading.Thread(target=_exit_with, args=(parent,), daemon=True).start()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MediaQueue:
+    """Persistent job queue with a dispatcher thread per server process feeding a process pool.
+
+    Jobs are claimed in a transaction that also counts the running ones, so at most `workers`
+    run at once however many server processes share the queue. Jobs left running by a process
+    that died go back to pending.
+    """
+
+    def __init__(self, upload_dir, store, upload_catalog, workers=MEDIA_WORKERS):
+        self.path = os.path.join(upload_dir, JOBS_NAME)
+        self.media_dir = os.path.join(upload_dir, MEDIA_DIR_NAME)
+        self.store = store
+        self.catalog = upload_catalog
+        self.workers = max(1, workers)
+        # One connection per thread; WAL lets readers and the writer work concurrently
+        self._connect = persistence.ThreadConnections(self.path)
+        self._wake = threading.Event()
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._running = set()
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    digest TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    owner INTEGER,
+                    queued REAL NOT NULL,
+                    result TEXT,
+                    error TEXT
+                )""")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, queued)")
+
+    def output_dir(self, digest):
+        return os.path.join(self.media_dir, digest[:2], digest)
+
+    def output_path(self, digest, filename):
+        """Path of a derived file (POSTER_NAME, PREVIEW_NAME) for a blob."""
+        return os.path.join(self.output_dir(digest), filename)
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def submit(self, name, digest):
+        """Queue an upload for processing. Only an insert, so the upload request can answer right away."""
+        with self._connect() as db:
+            db.execute("INSERT OR IGNORE INTO jobs (digest, name, state, queued) VALUES (?, ?, 'pending', ?)",
+                       (digest, name, time.time()))
+            state, result = db.execute("SELECT state, result FROM jobs WHERE digest = ?", (digest,)).fetchone()
+        if state == 'done':
+            # Same content under a new name: reuse the earlier results
+            self.catalog.set_media(digest, json.loads(result))
+            return
+        self.start()
+        self._wake.set()
+
+    def status(self, digest):
+        row = self._connect().execute(
+            "SELECT state, attempts, result, error FROM jobs WHERE digest = ?", (digest,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"state": row[0], "attempts": row[1], "result": json.loads(row[2]) if row[2] else None, "error": row[3]}
+
+    def start(self):
+        """Start this process's dispatcher thread; after a fork the child starts its own."""
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._executor = None
+            self._running = set()
+            threading.Thread(target=self._dispatch, name='media-dispatch', daemon=True).start()
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 initargs=(os.getpid(),))
+        return self._executor
+
+    def _dispatch(self):
+        while True:
+            try:
+                self._recover()
+                while len(self._running) < self.workers:
+                    digest = self._claim()
+                    if digest is None:
+                        break
+                    try:
+                        source = self.store.blob_path(digest)
+                    except OSError as e:
+                        # A remote store could not hand over the blob; that counts as a failed attempt
+                        future = Future()
+                        future.set_exception(e)
+                    else:
+                        future = self._pool().submit(process_media, source, self.output_dir(digest))
+                    self._running.add(digest)
+                    future.add_done_callback(functools.partial(self._finished, digest))
+            except (sqlite3.Error, BrokenProcessPool):
+                self._executor = None
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+
+    def _claim(self):
+        """Mark the oldest pending job as ours and return its digest, unless enough are running already."""
+        db = self._connect()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            running = db.execute("SELECT COUNT(*) FROM jobs WHERE state = 'running'").fetchone()[0]
+            if running >= self.workers:
+                return None
+            row = db.execute("SELECT digest FROM jobs WHERE state = 'pending' ORDER BY queued LIMIT 1").fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE jobs SET state = 'running', owner = ?, attempts = attempts + 1 WHERE digest = ?",
+                       (os.getpid(), row[0]))
+        return row[0]
+
+    def _recover(self):
+        """Requeue jobs whose process died (or that this process claimed before a restart)."""
+        db = self._connect()
+        stale = [(digest, owner) for digest, owner in db.execute("SELECT digest, owner FROM jobs WHERE state = 'running'")
+                 if not _alive(owner) or (owner == os.getpid() and digest not in self._running)]
+        with db:
+            for digest, owner in stale:
+                db.execute("UPDATE jobs SET state = 'pending', owner = NULL WHERE digest = ? AND state = 'running' AND owner = ?",
+                           (digest, owner))
+
+    def _finished(self, digest, future):
+        try:
+            info = future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._executor = None
+            with self._connect() as db:
+                db.execute("""
+                    UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                                    owner = NULL, error = ?
+                    WHERE digest = ?""", (MAX_ATTEMPTS, f"{type(e).__name__}: {e}", digest))
+        else:
+            with self._connect() as db:
+                db.execute("UPDATE jobs SET state = 'done', owner = NULL, result = ?, error = NULL WHERE digest = ?",
+                           (json.dumps(info), digest))
+            self.catalog.set_media(digest, info)
+        finally:
+            self._running.discard(digest)
+            self._wake.set()
+
+
+def open_media_queue(upload_dir, store, upload_catalog, workers=MEDIA_WORKERS):
+    """Open the job queue in upload_dir, queueing every stored upload the first time."""
+    queue = MediaQueue(upload_dir, store, upload_catalog, workers)
+    if queue.count() == 0:
+        with queue._connect() as db:
+            for name in store.names():
+                entry = store.get(name)
+                if entry is not None:
+                    db.execute("INSERT OR IGNORE INTO jobs (digest, name, state, queued) VALUES (?, ?, 'pending', ?)",
+                               (entry['digest'], name, time.time()))
+    return queue
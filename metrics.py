@@ -0,0 +1,290 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+from time import perf_counter
+from bisect import bisect_left
+
+import admission
+
+# Upper bounds, in seconds, of the latency histogram buckets: 1-2.5-5 steps from 10us to 50s
+LATENCY_BUCKETS = tuple(round(base * 10 ** exp, 6) for exp in range(-5, 2) for base in (1, 2.5, 5))
+# With prefork, each worker writes its totals to the shared directory this often
+FLUSH_INTERVAL = 1
+# Requests whose accepted body sizes are counted
+BODY_METHODS = frozenset(('POST', 'PUT'))
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Shard:
+    """One thread's counters. Only its own thread writes to it, so updates take no lock.
+
+    Each route has a list of [requests started, body bytes accepted, {(method, status): histogram}],
+    where a histogram is [count per bucket..., count above the last bucket, sum of seconds].
+    Requests in flight are the started ones not yet in a histogram.
+    """
+
+    __slots__ = ('routes', 'rejections')
+
+    def __init__(self):
+        self.routes = {}
+        # (route, reason) -> count, copied from admission when totals are taken
+        self.rejections = {}
+
+    def route(self, route):
+        stats = self.routes.get(route)
+        if stats is None:
+            stats = self.routes[route] = [0, 0, {}]
+        return stats
+
+    @staticmethod
+    def observe(stats, method, status, seconds, body_bytes=0):
+        hists = stats[2]
+        hist = hists.get((method, status))
+        if hist is None:
+            hist = hists[method, status] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        hist[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        hist[-1] += seconds
+        if body_bytes:
+            stats[1] += body_bytes
+
+    def merge(self, other):
+        """Add another shard's (or snapshot's) counts into this one.
+
+        other may be a live shard whose thread is still adding keys, so its dicts are copied
+        to lists (one atomic step under the GIL) before they are walked.
+        """
+        for route, (started, body_bytes, hists) in list(other.routes.items()):
+            stats = self.route(route)
+            stats[0] += started
+            stats[1] += body_bytes
+            for key, hist in list(hists.items()):
+                mine = stats[2].get(key)
+                if mine is None:
+                    stats[2][key] = list(hist)
+                else:
+                    for i, value in enumerate(hist):
+                        mine[i] += value
+        for key, value in list(other.rejections.items()):
+            self.rejections[key] = self.rejections.get(key, 0) + value
+
+    def to_json(self):
+        return {
+            "routes": [[route, started, body_bytes, [[*key, hist] for key, hist in list(hists.items())]]
+                       for route, (started, body_bytes, hists) in list(self.routes.items())],
+            "rejections": [[*key, value] for key, value in list(self.rejections.items())],
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        shard = cls()
+        for route, started, body_bytes, hists in data["routes"]:
+            shard.routes[route] = [started, body_bytes, {(method, status): hist for method, status, hist in hists}]
+        for route, reason, value in data["rejections"]:
+            shard.rejections[route, reason] = value
+        return shard
+
+
+class Registry:
+    """Request metrics kept in per-thread shards and summed when scraped.
+
+    Recording a request touches only the calling thread's shard. Shards of threads that have
+    exited are folded into one retired shard at scrape time. With share(), every process
+    writes its totals into a common directory so a scrape of any worker sees them all.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = Shard()
+        self._lock = threading.Lock()
+        self._directory = None
+        self._flusher_pid = None
+        self._flush_lock = threading.Lock()
+
+    def shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = Shard()
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            if self._directory is not None and self._flusher_pid != os.getpid():
+                self._start_flusher()
+            return shard
+
+    def start(self, route):
+        """Count a request for route as started; returns the start time to pass to finish()."""
+        self.shard().route(route)[0] += 1
+        return perf_counter()
+
+    def finish(self, route, method, status, start, body_bytes=0):
+        Shard.observe(self._local.shard.routes[route], method, status, perf_counter() - start, body_bytes)
+
+    def totals(self):
+        """This process's counts summed into one Shard."""
+        total = Shard()
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    self._retired.merge(shard)
+            self._shards = live
+            total.merge(self._retired)
+            for _, shard in live:
+                total.merge(shard)
+        total.rejections.update(admission.rejection_counts())
+        return total
+
+    def share(self, directory):
+        """Write totals under directory and include every process's file in scrapes.
+
+        Call before forking; each child starts its flusher on its first request.
+        """
+        self._directory = directory
+        # Threads and shards belong to the parent; children start with empty counts
+        self._local = threading.local()
+        self._shards = []
+        self._retired = Shard()
+
+    def _start_flusher(self):
+        self._flusher_pid = os.getpid()
+        thread = threading.Thread(target=self._flush_forever, name='metrics-flush', daemon=True)
+        thread.start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        path = os.path.join(self._directory, f"{os.getpid()}.json")
+        with self._flush_lock:
+            with open(path + '.tmp', 'w') as f:
+                json.dump(self.totals().to_json(), f)
+            os.replace(path + '.tmp', path)
+
+    def collect(self):
+        """Counts for a scrape: this process's, plus every other process's last flush when shared."""
+        if self._directory is None:
+            return self.totals()
+        self.flush()
+        total = Shard()
+        for name in os.listdir(self._directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self._directory, name)) as f:
+                    total.merge(Shard.from_json(json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return total
+
+
+# The registry every routed handler records into
+REGISTRY = Registry()
+
+
+def record_request(handler, call_next, registry=REGISTRY):
+    """Router middleware: time the request and count it by route, method and status.
+
+    This runs on every request, so it reaches the thread's shard without going through Registry.
+    """
+    route = handler.route_name
+    try:
+        shard = registry._local.shard
+    except AttributeError:
+        shard = registry.shard()
+    stats = shard.routes.get(route) or shard.route(route)
+    stats[0] += 1
+    start = perf_counter()
+    try:
+        call_next()
+    finally:
+        elapsed = perf_counter() - start
+        method, status = handler.command, handler.response_status
+        hists = stats[2]
+        hist = hists.get((method, status))
+        if hist is None:
+            hist = hists[method, status] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        hist[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+        hist[-1] += elapsed
+        if method in BODY_METHODS and status < 400:
+            stats[1] += int(handler.headers.get('Content-Length') or 0)
+
+
+def share_between_processes():
+    """Set up a temporary directory for forked workers to pool their metrics; returns its cleanup."""
+    directory = tempfile.mkdtemp(prefix='metrics-')
+    REGISTRY.share(directory)
+    return lambda: shutil.rmtree(directory, ignore_errors=True)
+
+
+def _labels(**labels):
+    return ','.join(f'{key}="{value}"' for key, value in labels.items())
+
+
+def render(registry=REGISTRY):
+    """The current metrics in the Prometheus text exposition format."""
+    total = registry.collect()
+    requests, latency, in_flight, body_bytes = [], {}, [], []
+    for route, (started, accepted, hists) in sorted(total.routes.items()):
+        finished = 0
+        for (method, status), hist in sorted(hists.items()):
+            count = sum(hist[:-1])
+            finished += count
+            requests.append(f"http_requests_total{{{_labels(route=route, method=method, status=status)}}} {count}")
+            merged = latency.setdefault((route, method), [0] * len(hist))
+            for i, value in enumerate(hist):
+                merged[i] += value
+        in_flight.append(f"http_requests_in_flight{{{_labels(route=route)}}} {started - finished}")
+        if accepted:
+            body_bytes.append(f"http_request_body_bytes_total{{{_labels(route=route)}}} {accepted}")
+    lines = [
+        "# HELP http_requests_total Requests answered, by route, method and status.",
+        "# TYPE http_requests_total counter",
+        *requests,
+        "# HELP http_request_duration_seconds Time from routing a request to its handler returning.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (route, method), hist in latency.items():
+        labels = _labels(route=route, method=method)
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, hist):
+            cumulative += count
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        cumulative += hist[-2]
+        lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+        lines.append(f"http_request_duration_seconds_sum{{{labels}}} {hist[-1]:.6f}")
+        lines.append(f"http_request_duration_seconds_count{{{labels}}} {cumulative}")
+    lines += [
+        "# HELP http_requests_in_flight Requests currently being handled, by route.",
+        "# TYPE http_requests_in_flight gauge",
+        *in_flight,
+        "# HELP http_request_body_bytes_total Bytes of request bodies accepted, by route; rate() gives upload bytes/s.",
+        "# TYPE http_request_body_bytes_total counter",
+        *body_bytes,
+    ]
+    lines += [
+        "# HELP http_admission_rejections_total Requests turned away before their body was read.",
+        "# TYPE http_admission_rejections_total counter",
+    ]
+    for (route, reason), count in sorted(total.rejections.items()):
+        lines.append(f"http_admission_rejections_total{{{_labels(route=route, reason=reason)}}} {count}")
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def send_metrics(handler, registry=REGISTRY):
+    """Answer GET /metrics for a BaseHTTPRequestHandler."""
+    body = render(registry)
+    handler.send_response(200)
+    handler.send_header('Content-Type', METRICS_CONTENT_TYPE)
+    handler.send_header('Content-Length', str(len(body)))
+    handler.send_header('Cache-Control', 'no-store')
+    handler.end_headers()
+    if handler.command != 'HEAD':
+        handler.wfile.write(body)
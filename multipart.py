@@ -0,0 +1,204 @@
+import os
+import hashlib
+import tempfile
+
+# Streaming replacement for cgi.FieldStorage: file parts go straight to disk
+BUFFER_SIZE = 64 * 1024
+MAX_HEADER_SIZE = 16 * 1024
+MAX_FIELD_SIZE = 1024 * 1024
+
+
+class MultipartError(ValueError):
+    """Raised when a multipart/form-data body is malformed."""
+
+
+class StoredFile:
+    """A file part that has been streamed into a temp file next to its final location."""
+
+    def __init__(self, filename, temp_path, directory):
+        self.filename = filename
+        self.temp_path = temp_path
+        self.directory = directory
+        self.size = 0
+        self.hash = hashlib.sha256()
+
+    @property
+    def digest(self):
+        """Hex SHA-256 of the content, computed while it was streamed to disk."""
+        return self.hash.hexdigest()
+
+    def save(self, name=None, store=None, durable=False):
+        """Atomically move the temp file into place (or into store) and return the final name.
+
+        durable fsyncs the data and the store's directory first, so the upload survives a crash
+        once save() returns.
+        """
+        name = os.path.basename(name or self.filename)
+        if durable:
+            fd = os.open(self.temp_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        if store is not None:
+            name = store.add(self.temp_path, name, digest=self.digest, durable=durable)
+        else:
+            os.replace(self.temp_path, os.path.join(self.directory, name))
+        self.temp_path = None
+        return name
+
+    def discard(self):
+        """Remove the temp file if it was never saved."""
+        if self.temp_path and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+        self.temp_path = None
+
+
+def parse_options_header(value):
+    """Split a header like 'form-data; name="file"; filename="a.mp4"' into (value, params)."""
+    parts = (value or '').split(';')
+    params = {}
+    for item in parts[1:]:
+        key, sep, val = item.strip().partition('=')
+        if not sep:
+            continue
+        val = val.strip()
+        if len(val) >= 2 and val[0] == val[-1] == '"':
+            val = val[1:-1].replace('\\"', '"')
+        params[key.strip().lower()] = val
+    return parts[0].strip().lower(), params
+
+
+def _parse_part_headers(raw):
+    headers = {}
+    for line in raw.decode('utf-8', 'replace').split('\r\n'):
+        key, sep, val = line.partition(':')
+        if sep:
+            headers[key.strip().lower()] = val.strip()
+    return headers
+
+
+class MultipartParser:
+    """Incremental multipart/form-data parser that keeps at most one buffer of data in memory."""
+
+    def __init__(self, fp, boundary, content_length, upload_dir, buffer_size=BUFFER_SIZE):
+        if not boundary:
+            raise MultipartError("Missing multipart boundary")
+        self.fp = fp
+        self.remaining = content_length
+        self.upload_dir = upload_dir
+        self.buffer_size = buffer_size
+        self.delimiter = b'\r\n--' + boundary.encode('latin-1')
+        self.buffer = bytearray()
+        self.eof = False
+
+    def _fill(self):
+        """Read the next chunk of the body into the buffer; returns False at end of input."""
+        if self.eof or self.remaining <= 0:
+            self.eof = True
+            return False
+        chunk = self.fp.read(min(self.buffer_size, self.remaining))
+        if not chunk:
+            self.eof = True
+            return False
+        self.remaining -= len(chunk)
+        self.buffer += chunk
+        return True
+
+    def _read_until(self, marker, limit):
+        """Consume and return bytes up to marker, buffering at most limit bytes."""
+        while True:
+            index = self.buffer.find(marker)
+            if index >= 0:
+                data = bytes(self.buffer[:index])
+                del self.buffer[:index + len(marker)]
+                return data
+            if len(self.buffer) > limit or not self._fill():
+                raise MultipartError("Unexpected end of multipart headers")
+
+    def _stream_body(self, write):
+        """Pass part data to write() until the next delimiter, holding back a possible partial match."""
+        keep = len(self.delimiter) - 1
+        while True:
+            index = self.buffer.find(self.delimiter)
+            if index >= 0:
+                if index:
+                    write(self.buffer[:index])
+                del self.buffer[:index + len(self.delimiter)]
+                return
+            if len(self.buffer) > keep:
+                write(self.buffer[:-keep])
+                del self.buffer[:-keep]
+            if not self._fill():
+                raise MultipartError("Unexpected end of multipart body")
+
+    def _after_delimiter(self):
+        """Return True if the delimiter just consumed was the closing one."""
+        while len(self.buffer) < 2:
+            if not self._fill():
+                raise MultipartError("Truncated multipart delimiter")
+        if self.buffer[:2] == b'--':
+            return True
+        self._read_until(b'\r\n', MAX_HEADER_SIZE)
+        return False
+
+    def parse(self):
+        """Parse the whole body, returning (fields, files); files map names to StoredFile objects."""
+        fields = {}
+        files = {}
+        try:
+            # The first delimiter has no leading CRLF
+            self._read_until(self.delimiter[2:], MAX_HEADER_SIZE + self.buffer_size)
+            while not self._after_delimiter():
+                headers = _parse_part_headers(self._read_until(b'\r\n\r\n', MAX_HEADER_SIZE))
+                _, params = parse_options_header(headers.get('content-disposition'))
+                name = params.get('name', '')
+                if 'filename' in params:
+                    stored = self._stream_file(params['filename'])
+                    # A repeated name keeps the last part, as fields do, and the earlier temp file goes
+                    if name in files:
+                        files[name].discard()
+                    files[name] = stored
+                else:
+                    value = bytearray()
+
+                    def append(data):
+                        if len(value) + len(data) > MAX_FIELD_SIZE:
+                            raise MultipartError(f"Form field '{name}' is too large")
+                        value.extend(data)
+
+                    self._stream_body(append)
+                    fields[name] = value.decode('utf-8', 'replace')
+        except Exception:
+            for stored in files.values():
+                stored.discard()
+            raise
+        # Drain any epilogue so the connection stays in sync
+        while self._fill():
+            self.buffer.clear()
+        return fields, files
+
+    def _stream_file(self, filename):
+        fd, temp_path = tempfile.mkstemp(dir=self.upload_dir, prefix='.upload-', suffix='.part')
+        stored = StoredFile(os.path.basename(filename.replace('\\', '/')), temp_path, self.upload_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                def write(data):
+                    f.write(data)
+                    stored.hash.update(data)
+                    stored.size += len(data)
+
+                self._stream_body(write)
+        except Exception:
+            stored.discard()
+            raise
+        return stored
+
+
+def parse_form(fp, content_type, content_length, upload_dir, buffer_size=BUFFER_SIZE):
+    """Stream a multipart/form-data request body; file parts land in temp files under upload_dir."""
+    mimetype, params = parse_options_header(content_type)
+    if mimetype != 'multipart/form-data':
+        raise MultipartError(f"Expected multipart/form-data, got {mimetype or 'nothing'}")
+    parser = MultipartParser(fp, params.get('boundary'), int(content_length or 0), upload_dir, buffer_size)
+    return parser.parse()
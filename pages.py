@@ -0,0 +1,214 @@
+import gzip
+import socket
+import hashlib
+import threading
+from string import Formatter
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Whole rendered pages kept per template for pages without per-request content
+PAGE_CACHE_SIZE = 128
+# Rendered page sections kept by FragmentCache, across all sections and their variants
+FRAGMENT_CACHE_SIZE = 256
+# Cached pages may be stored but must be revalidated; they differ by login state and encoding
+CACHED_PAGE_HEADERS = (('Cache-Control', 'no-cache'), ('Vary', 'Cookie, Accept-Encoding'))
+
+# Content codings in order of preference; brotli is used only when the package is installed
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+# Dynamic pages smaller than this go out uncompressed; the CPU is not worth the bytes
+COMPRESS_MIN_SIZE = 1024
+# Cached pages are compressed once, so they get the slowest, smallest settings
+STATIC_LEVELS = {'br': 11, 'gzip': 9}
+DYNAMIC_LEVELS = {'br': 4, 'gzip': 6}
+
+
+class PageTemplate:
+    """A page layout split once into pre-encoded byte segments around its {fields}.
+
+    The source uses str.format syntax (so CSS braces stay doubled); rendering only encodes the
+    dynamic values and returns a list of segments ready for a vectored write.
+    """
+
+    def __init__(self, source, encoding='utf-8', cache_size=PAGE_CACHE_SIZE):
+        self.encoding = encoding
+        self.cache_size = cache_size
+        self._parts = []
+        for literal, field, _, _ in Formatter().parse(source):
+            if literal:
+                self._parts.append(literal.encode(encoding))
+            if field is not None:
+                self._parts.append(field)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def segments(self, **values):
+        """Return the page as a list of bytes: static parts as-is, fields encoded now."""
+        return [part if isinstance(part, bytes) else str(values[part]).encode(self.encoding)
+                for part in self._parts]
+
+    def render(self, **values):
+        return b''.join(self.segments(**values))
+
+    def cached(self, **values):
+        """Render once and reuse the CachedPage; only for values that do not vary per user."""
+        key = tuple(values.items())
+        page = self._cache.get(key)
+        if page is None:
+            page = CachedPage(self.render(**values))
+            with self._lock:
+                if len(self._cache) >= self.cache_size:
+                    self._cache.pop(next(iter(self._cache)))
+                self._cache[key] = page
+        return page
+
+
+class CachedPage:
+    """A rendered page with its precompressed variants, each with its own strong ETag."""
+
+    __slots__ = ('variants',)
+
+    def __init__(self, body):
+        self.variants = {'identity': (body, etag_for(body))}
+        for encoding in ENCODINGS:
+            data = compress(body, encoding, STATIC_LEVELS[encoding])
+            if len(data) < len(body):
+                self.variants[encoding] = (data, etag_for(data))
+
+    def select(self, accept_encoding):
+        """Return (encoding, body, etag) for the best variant the client accepts."""
+        encoding = negotiate(accept_encoding, self.variants)
+        body, etag = self.variants[encoding]
+        return encoding, body, etag
+
+
+class FragmentCache:
+    """Rendered sections of pages, each reused until the version it was rendered at changes.
+
+    The version is whatever the section's source bumps on every change (a store's generation),
+    so a hit costs that one read and a dict lookup, and a stale section is never served.
+    """
+
+    def __init__(self, size=FRAGMENT_CACHE_SIZE):
+        self.size = size
+        self._fragments = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version, render):
+        """Return the section cached under key if it is at version, else render() it and keep that."""
+        entry = self._fragments.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        fragment = render()
+        with self._lock:
+            if key not in self._fragments and len(self._fragments) >= self.size:
+                self._fragments.pop(next(iter(self._fragments)))
+            self._fragments[key] = (version, fragment)
+        return fragment
+
+
+def compress(body, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    # mtime=0 keeps the output, and so the ETag, stable across restarts
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def negotiate(accept_encoding, available=ENCODINGS):
+    """Pick the preferred coding from Accept-Encoding that is in available, else 'identity'."""
+    if not accept_encoding:
+        return 'identity'
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    best, best_q = 'identity', 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if encoding in available and q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def etag_for(body):
+    """Strong ETag for a complete response body."""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against etag, as RFC 9110 asks for GET."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
+
+
+def write_segments(handler, segments):
+    """Write byte segments with one sendmsg when the handler owns a plain socket."""
+    sock = getattr(handler, 'connection', None)
+    if type(sock) is not socket.socket or not hasattr(sock, 'sendmsg'):
+        handler.wfile.writelines(segments)
+        return
+    views = [memoryview(segment) for segment in segments if segment]
+    while views:
+        sent = sock.sendmsg(views)
+        while views and sent >= len(views[0]):
+            sent -= len(views[0])
+            views.pop(0)
+        if views and sent:
+            views[0] = views[0][sent:]
+
+
+def send_page(handler, segments, status=200, content_type='text/html'):
+    """Send an HTML response built from byte segments, compressed if it is large enough."""
+    length = sum(len(segment) for segment in segments)
+    compressible = length >= COMPRESS_MIN_SIZE
+    encoding = 'identity'
+    if compressible:
+        encoding = negotiate(handler.headers.get('Accept-Encoding'))
+        if encoding != 'identity':
+            segments = [compress(b''.join(segments), encoding, DYNAMIC_LEVELS[encoding])]
+            length = len(segments[0])
+    handler.send_response(status)
+    handler.send_header('Content-type', content_type)
+    handler.send_header('Content-Length', str(length))
+    if encoding != 'identity':
+        handler.send_header('Content-Encoding', encoding)
+    if compressible:
+        handler.send_header('Vary', 'Accept-Encoding')
+    handler.end_headers()
+    if handler.command != 'HEAD':
+        write_segments(handler, segments)
+
+
+def send_cached_page(handler, page, headers=CACHED_PAGE_HEADERS):
+    """Send the best variant of a CachedPage, or a 304 if the client already has it."""
+    encoding, body, etag = page.select(handler.headers.get('Accept-Encoding'))
+    if handler.command in ('GET', 'HEAD') and etag_matches(handler.headers.get('If-None-Match'), etag):
+        handler.send_response(304)
+        handler.send_header('ETag', etag)
+        for key, value in headers:
+            handler.send_header(key, value)
+        handler.end_headers()
+        return
+    handler.send_response(200)
+    handler.send_header('Content-type', 'text/html')
+    handler.send_header('Content-Length', str(len(body)))
+    if encoding != 'identity':
+        handler.send_header('Content-Encoding', encoding)
+    handler.send_header('ETag', etag)
+    for key, value in headers:
+        handler.send_header(key, value)
+    handler.end_headers()
+    if handler.command != 'HEAD':
+        handler.wfile.write(body)
@@ -0,0 +1,88 @@
+import os
+import json
+import fcntl
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Seconds a connection waits for another process's write to finish before failing
+SQLITE_TIMEOUT = 30
+
+
+class ThreadConnections:
+    """Call for this thread's connection to an SQLite database, opened on first use.
+
+    WAL lets readers and the writer work concurrently. Connections do not survive fork, so a
+    thread in a forked worker opens its own.
+    """
+
+    def __init__(self, path, timeout=SQLITE_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __call__(self):
+        db = getattr(self._local, 'db', None)
+        if db is None or getattr(self._local, 'pid', None) != os.getpid():
+            db = sqlite3.connect(self.path, timeout=self.timeout)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+
+class JSONFile:
+    """A JSON object kept in a file that threads and pre-forked worker processes share.
+
+    Every save is a fresh file put in place with os.replace, so the inode changes on each
+    rewrite and a reader only reparses the file when another thread or process has saved it.
+    """
+
+    def __init__(self, path, mode=0o644):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.mode = mode
+        self.data = {}
+        self._lock = threading.Lock()
+        self._version = None
+
+    def _load(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self.data, self._version = {}, None
+            return
+        version = (st.st_ino, st.st_mtime_ns)
+        if version != self._version:
+            with open(self.path) as f:
+                self.data = json.load(f)
+            self._version = version
+
+    def save(self):
+        """Write data out; only call it inside locked()."""
+        tmp_path = self.path + '.tmp'
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, self.mode), 'w') as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
+        st = os.stat(self.path)
+        self._version = (st.st_ino, st.st_mtime_ns)
+
+    @contextmanager
+    def loaded(self):
+        """Yield the current data, held steady against other threads for reading."""
+        with self._lock:
+            self._load()
+            yield self.data
+
+    @contextmanager
+    def locked(self):
+        """Yield the current data for an update; an flock keeps other processes' updates out too."""
+        with self._lock:
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, self.mode)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                self._load()
+                yield self.data
+            finally:
+                os.close(fd)
@@ -0,0 +1,211 @@
+import os
+import json
+import uuid
+import fcntl
+import base64
+from contextlib import contextmanager
+
+# Resumable, tus-style uploads: create a session, PUT byte ranges in any order, then commit
+SESSION_DIR_NAME = ".sessions"
+CHUNK_SIZE = 64 * 1024
+MAX_UPLOAD_LENGTH = 64 * 1024 * 1024 * 1024
+
+
+class UploadError(ValueError):
+    """Raised for bad session ids, ranges or commits; status is the HTTP code to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_metadata(value):
+    """Decode a tus Upload-Metadata header ('key base64value, key2 base64value2')."""
+    metadata = {}
+    for item in (value or '').split(','):
+        key, _, encoded = item.strip().partition(' ')
+        if not key:
+            continue
+        try:
+            metadata[key] = base64.b64decode(encoded).decode('utf-8') if encoded else ''
+        except ValueError:
+            raise UploadError(f"Bad metadata value for {key}")
+    return metadata
+
+
+def parse_content_range(value, length):
+    """Parse 'bytes start-end/total' into a half-open (start, end) range."""
+    if not value or not value.startswith('bytes '):
+        raise UploadError("Missing or invalid Content-Range header")
+    span, _, total = value[6:].partition('/')
+    first, _, last = span.partition('-')
+    try:
+        start, end = int(first), int(last) + 1
+    except ValueError:
+        raise UploadError("Invalid Content-Range header")
+    if total not in ('*', str(length)) or start < 0 or end <= start or end > length:
+        raise UploadError("Content-Range does not fit the upload", status=416)
+    return start, end
+
+
+def merge_ranges(ranges):
+    """Merge overlapping or touching (start, end) ranges."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(r) for r in merged]
+
+
+class UploadSession:
+    """One in-progress upload: a sparse data file plus an append-only log of received ranges."""
+
+    def __init__(self, path):
+        self.path = path
+        self.id = os.path.basename(path)
+        with open(os.path.join(path, 'info.json')) as f:
+            info = json.load(f)
+        self.filename = info['filename']
+        self.length = info['length']
+        self.owner = info.get('owner')
+
+    @property
+    def data_path(self):
+        return os.path.join(self.path, 'data')
+
+    @property
+    def ranges_path(self):
+        return os.path.join(self.path, 'ranges')
+
+    def received(self):
+        """Return the merged list of byte ranges written so far."""
+        ranges = []
+        try:
+            with open(self.ranges_path) as f:
+                for line in f:
+                    first, _, last = line.partition(' ')
+                    if last.strip():
+                        ranges.append((int(first), int(last)))
+        except FileNotFoundError:
+            pass
+        return merge_ranges(ranges)
+
+    def offset(self):
+        """Return how many contiguous bytes from the start have arrived."""
+        ranges = self.received()
+        return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+    @contextmanager
+    def _locked(self, exclusive=True):
+        """flock the session directory: commit and abort hold it alone, range writes share it."""
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            raise UploadError("Unknown upload session", status=404)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            # Another request may have committed or aborted the session while this one waited
+            if not os.path.isdir(self.path):
+                raise UploadError("Unknown upload session", status=404)
+            yield
+        finally:
+            os.close(fd)
+
+    def write_range(self, fp, start, end):
+        """Copy end - start bytes from fp into the data file at start; safe to run in parallel."""
+        with self._locked(exclusive=False):
+            fd = os.open(self.data_path, os.O_WRONLY)
+            try:
+                position = start
+                while position < end:
+                    chunk = fp.read(min(CHUNK_SIZE, end - position))
+                    if not chunk:
+                        break
+                    os.pwrite(fd, chunk, position)
+                    position += len(chunk)
+            finally:
+                os.close(fd)
+            if position > start:
+                # O_APPEND keeps concurrent small records from interleaving
+                with open(self.ranges_path, 'a') as f:
+                    f.write(f"{start} {position}\n")
+        if position < end:
+            raise UploadError("Request body ended before the declared range")
+        return position
+
+    def commit(self, store):
+        """fsync the assembled file once, hand it to the blob store and drop the session."""
+        with self._locked():
+            if self.length and self.received() != [(0, self.length)]:
+                raise UploadError("Upload is incomplete", status=409)
+            fd = os.open(self.data_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            # Ranges arrive out of order, so the digest is taken in one sequential pass here
+            name = store.add(self.data_path, self.filename, durable=True)
+            self._remove()
+        return name
+
+    def abort(self):
+        """Delete everything the session left on disk."""
+        with self._locked():
+            self._remove()
+
+    def _remove(self):
+        for name in os.listdir(self.path):
+            os.remove(os.path.join(self.path, name))
+        os.rmdir(self.path)
+
+    def status(self):
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "length": self.length,
+            "offset": self.offset(),
+            "received": self.received(),
+        }
+
+
+class SessionStore:
+    """Creates and looks up upload sessions kept under UPLOAD_DIR/.sessions."""
+
+    def __init__(self, upload_dir):
+        self.upload_dir = upload_dir
+        self.root = os.path.join(upload_dir, SESSION_DIR_NAME)
+        os.makedirs(self.root, exist_ok=True)
+
+    def create(self, filename, length, owner=None):
+        filename = os.path.basename((filename or '').replace('\\', '/'))
+        if not filename:
+            raise UploadError("A filename is required")
+        if length < 0 or length > MAX_UPLOAD_LENGTH:
+            raise UploadError("Invalid Upload-Length", status=413)
+        session_id = uuid.uuid4().hex
+        path = os.path.join(self.root, session_id)
+        os.mkdir(path)
+        with open(os.path.join(path, 'info.json'), 'w') as f:
+            json.dump({"filename": filename, "length": length, "owner": owner}, f)
+        # Sparse preallocation so parallel PUTs can pwrite() anywhere in the file
+        with open(os.path.join(path, 'data'), 'wb') as f:
+            f.truncate(length)
+        return UploadSession(path)
+
+    def get(self, session_id, owner=None):
+        if not session_id or not session_id.isalnum():
+            raise UploadError("Unknown upload session", status=404)
+        try:
+            session = UploadSession(os.path.join(self.root, session_id))
+        except (FileNotFoundError, NotADirectoryError):
+            raise UploadError("Unknown upload session", status=404)
+        if owner is not None and session.owner not in (None, owner):
+            raise UploadError("Upload session belongs to another user", status=403)
+        return session
+
+
+def format_ranges(ranges):
+    """Render received ranges for the Upload-Ranges header, e.g. '0-1023,4096-8191'."""
+    return ','.join(f"{start}-{end - 1}" for start, end in ranges)
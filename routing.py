@@ -0,0 +1,102 @@
+import functools
+from urllib.parse import parse_qs, unquote
+
+# Trie keys that cannot collide with path segments
+_PARAM = object()
+_METHODS = object()
+
+
+class Router:
+    """Maps (method, path) to handler functions without scanning a list of routes.
+
+    Literal paths are a single dict lookup. Paths with <name> segments are matched one segment
+    at a time through a trie, preferring literal segments, so neither cost grows with the
+    number of routes.
+    """
+
+    def __init__(self):
+        self._static = {}
+        self._root = {}
+        self._middleware = []
+
+    def add(self, path, func, methods=("GET",)):
+        if '<' not in path:
+            table = self._static.setdefault(path, {})
+        else:
+            node = self._root
+            for segment in path.strip('/').split('/'):
+                if segment.startswith('<') and segment.endswith('>'):
+                    name, child = node.setdefault(_PARAM, (segment[1:-1], {}))
+                    if name != segment[1:-1]:
+                        raise ValueError(f"Conflicting parameter names at {path}")
+                    node = child
+                else:
+                    node = node.setdefault(segment, {})
+            table = node.setdefault(_METHODS, {})
+        for method in methods:
+            if method in table:
+                raise ValueError(f"Duplicate route: {method} {path}")
+            table[method] = func
+
+    def route(self, path, methods=("GET",)):
+        """Decorator form of add()."""
+        def decorator(func):
+            self.add(path, func, methods)
+            return func
+        return decorator
+
+    def use(self, middleware):
+        """Wrap every matched request: middleware(handler, call_next) runs the rest by calling call_next()."""
+        self._middleware.append(middleware)
+        return middleware
+
+    def match(self, path):
+        """Return ({method: func}, params) for path, or (None, None) if nothing is routed there."""
+        table = self._static.get(path)
+        if table is not None:
+            return table, {}
+        node, params = self._root, {}
+        for segment in path.strip('/').split('/'):
+            child = node.get(segment)
+            if child is None:
+                param = node.get(_PARAM)
+                if param is None or not segment:
+                    return None, None
+                params[param[0]] = unquote(segment) if '%' in segment else segment
+                child = param[1]
+            node = child
+        table = node.get(_METHODS)
+        return (table, params) if table else (None, None)
+
+    def dispatch(self, handler):
+        """Route a BaseHTTPRequestHandler's current request, answering 404/405 itself."""
+        path, _, query = handler.path.partition('?')
+        handler.route_path = path
+        handler.query = parse_qs(query) if query else {}
+        table, params = self.match(path)
+        if table is None:
+            handler.send_error(404)
+            return
+        func = table.get(handler.command)
+        if func is None:
+            handler.send_response(405)
+            handler.send_header('Allow', ', '.join(sorted(table)))
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return
+        handler.route_name = func.__name__
+        call = functools.partial(func, handler, **params)
+        for middleware in reversed(self._middleware):
+            call = functools.partial(middleware, handler, call)
+        call()
+
+
+class RoutedHandler:
+    """Mixin for BaseHTTPRequestHandler subclasses: every method goes through the class's router."""
+
+    router = None
+
+    def _dispatch(self):
+        self.router.dispatch(self)
+
+    do_GET = do_HEAD = do_POST = do_PUT = do_DELETE = _dispatch
@@ -0,0 +1,196 @@
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import argparse
+import threading
+from email.utils import formatdate
+from urllib.parse import urlsplit, parse_qs, unquote
+from xml.etree import ElementTree
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Stand-in for an S3-compatible object store, for developing and benchmarking storage.S3Backend.
+# It keeps objects as files under --root and does not check signatures.
+DEFAULT_ROOT = "s3data"
+UPLOADS_DIR_NAME = ".multipart"
+BLOCK_SIZE = 256 * 1024
+
+
+class ObjectStoreHandler(BaseHTTPRequestHandler):
+    """Path-style bucket/key requests: object PUT/GET/HEAD/DELETE and the multipart upload calls."""
+
+    protocol_version = "HTTP/1.1"
+    root = DEFAULT_ROOT
+    # Simulated network: seconds added to every request, and a per-connection bandwidth cap in bytes/s
+    latency = 0
+    bandwidth = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _target(self):
+        url = urlsplit(self.path)
+        bucket, _, key = unquote(url.path).lstrip('/').partition('/')
+        query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        if not bucket or not key or '..' in key.split('/'):
+            return None, None, query
+        return os.path.join(self.root, bucket), key, query
+
+    def _object_path(self, bucket_dir, key):
+        return os.path.join(bucket_dir, *key.split('/'))
+
+    def _reply(self, status, body=b'', headers=()):
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_response(status)
+        for key, value in headers:
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _error(self, status, code):
+        self._reply(status, f"<Error><Code>{code}</Code></Error>".encode(), (('Content-Type', 'application/xml'),))
+
+    def _receive(self, path):
+        """Write the request body to path and return its MD5, pacing reads to the bandwidth cap."""
+        remaining = int(self.headers.get('Content-Length') or 0)
+        digest = hashlib.md5()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        started = time.monotonic()
+        received = 0
+        with open(tmp_path, 'wb') as f:
+            while remaining:
+                block = self.rfile.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                f.write(block)
+                digest.update(block)
+                remaining -= len(block)
+                received += len(block)
+                if self.bandwidth:
+                    ahead = received / self.bandwidth - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        os.replace(tmp_path, path)
+        return digest.hexdigest()
+
+    def do_PUT(self):
+        bucket_dir, key, query = self._target()
+        if key is None:
+            self._error(400, 'InvalidRequest')
+            return
+        if 'uploadId' in query:
+            upload_dir = os.path.join(self.root, UPLOADS_DIR_NAME, query['uploadId'])
+            if not os.path.isdir(upload_dir):
+                self._error(404, 'NoSuchUpload')
+                return
+            etag = self._receive(os.path.join(upload_dir, str(int(query['partNumber']))))
+        else:
+            etag = self._receive(self._object_path(bucket_dir, key))
+        self._reply(200, headers=(('ETag', f'"{etag}"'),))
+
+    def do_POST(self):
+        bucket_dir, key, query = self._target()
+        if key is None:
+            self._error(400, 'InvalidRequest')
+            return
+        if 'uploads' in query:
+            upload_id = uuid.uuid4().hex
+            os.makedirs(os.path.join(self.root, UPLOADS_DIR_NAME, upload_id))
+            body = f"<InitiateMultipartUploadResult><Key>{key}</Key><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+            self._reply(200, body.encode(), (('Content-Type', 'application/xml'),))
+            return
+        if 'uploadId' not in query:
+            self._error(400, 'InvalidRequest')
+            return
+        upload_dir = os.path.join(self.root, UPLOADS_DIR_NAME, query['uploadId'])
+        manifest = ElementTree.fromstring(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+        if not os.path.isdir(upload_dir):
+            self._error(404, 'NoSuchUpload')
+            return
+        path = self._object_path(bucket_dir, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as out:
+            for part in manifest.iter('Part'):
+                part_path = os.path.join(upload_dir, part.findtext('PartNumber'))
+                if not os.path.exists(part_path):
+                    out.close()
+                    os.remove(tmp_path)
+                    self._error(400, 'InvalidPart')
+                    return
+                with open(part_path, 'rb') as f:
+                    shutil.copyfileobj(f, out, BLOCK_SIZE)
+        os.replace(tmp_path, path)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        self._reply(200, f"<CompleteMultipartUploadResult><Key>{key}</Key></CompleteMultipartUploadResult>".encode(),
+                    (('Content-Type', 'application/xml'),))
+
+    def do_GET(self):
+        bucket_dir, key, _ = self._target()
+        path = key and self._object_path(bucket_dir, key)
+        if not path or not os.path.isfile(path):
+            self._error(404, 'NoSuchKey')
+            return
+        if self.latency:
+            time.sleep(self.latency)
+        st = os.stat(path)
+        self.send_response(200)
+        self.send_header('Content-Length', str(st.st_size))
+        self.send_header('Last-Modified', formatdate(st.st_mtime, usegmt=True))
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, BLOCK_SIZE)
+
+    do_HEAD = do_GET
+
+    def do_DELETE(self):
+        bucket_dir, key, query = self._target()
+        if key is None:
+            self._error(400, 'InvalidRequest')
+            return
+        if 'uploadId' in query:
+            shutil.rmtree(os.path.join(self.root, UPLOADS_DIR_NAME, query['uploadId']), ignore_errors=True)
+        else:
+            try:
+                os.remove(self._object_path(bucket_dir, key))
+            except FileNotFoundError:
+                pass
+        self._reply(204)
+
+
+def make_server(port, root=DEFAULT_ROOT, latency=0, bandwidth=0):
+    """An object store server on 127.0.0.1:port keeping its objects under root."""
+    os.makedirs(root, exist_ok=True)
+    handler = type('Handler', (ObjectStoreHandler,), {'root': root, 'latency': latency, 'bandwidth': bandwidth})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    """Run the stand-in object store: python s3local.py --port 9000 --root s3data"""
+    parser = argparse.ArgumentParser(prog="s3local.py", description=main.__doc__)
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--root", default=DEFAULT_ROOT)
+    parser.add_argument("--latency", type=float, default=0, help="seconds added to every request")
+    parser.add_argument("--bandwidth", type=float, default=0, help="per-connection upload cap, MB/s")
+    args = parser.parse_args(argv)
+    server = make_server(args.port, args.root, args.latency, args.bandwidth * 1024 * 1024)
+    print(f"Object store stand-in on port {args.port}, keeping objects under {args.root}...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
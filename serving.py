@@ -0,0 +1,264 @@
+import os
+import sys
+import queue
+import signal
+import socket
+import argparse
+import threading
+from time import perf_counter
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import metrics
+import accesslog
+
+# Serving modes can be picked with --mode/--workers or SERVER_MODE/SERVER_WORKERS
+SERVING_MODES = ("single", "threaded", "prefork", "async")
+DEFAULT_MODE = os.environ.get("SERVER_MODE", "threaded")
+DEFAULT_WORKERS = int(os.environ.get("SERVER_WORKERS", 0)) or None
+# Threads mostly wait on sockets (uploads, chat streams), so the pool is larger than the core count
+DEFAULT_THREADS = 32
+DEFAULT_PROCESSES = os.cpu_count() or 1
+# Threads in each pre-forked worker; with one, chat streams are refused as one would hold the whole process
+PREFORK_THREADS = int(os.environ.get("SERVER_THREADS", 8))
+# Persistent connections are closed after this many idle seconds or this many requests
+KEEPALIVE_TIMEOUT = 5
+MAX_KEEPALIVE_REQUESTS = 100
+# A request that stalls mid-read for this long is dropped
+REQUEST_TIMEOUT = 60
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """BaseHTTPRequestHandler that speaks HTTP/1.1 and keeps connections open between requests.
+
+    A response is only left persistent when it is framed (Content-Length, or a status that
+    has no body). Anything else, error replies to requests whose body may be unread, and
+    requests that got no response at all close the connection as HTTP/1.0 did, and so does
+    every response from a server without a thread pool.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, Nagle holds the body for a delayed ACK
+    disable_nagle_algorithm = True
+    timeout = REQUEST_TIMEOUT
+    idle_timeout = KEEPALIVE_TIMEOUT
+    max_requests = MAX_KEEPALIVE_REQUESTS
+    requests_served = 0
+    # Status of the response sent for the current request, for metrics
+    response_status = 0
+    # Body length the response declared, for the access log; None when it is streamed
+    response_length = None
+
+    def handle_one_request(self):
+        if not getattr(self.server, 'pooled', False):
+            # One thread serves every connection, so an idle one would keep the next client waiting
+            self.max_requests = 1
+        if self.requests_served:
+            # Wait for the next request with the short idle timeout; pipelined requests are already buffered
+            self.connection.settimeout(self.idle_timeout)
+            try:
+                pending = self.rfile.peek(1)
+            except (TimeoutError, ConnectionError):
+                pending = b''
+            if not pending:
+                self.close_connection = True
+                return
+            self.connection.settimeout(self.timeout)
+        self._responded = False
+        self.response_status = 0
+        self.response_length = None
+        # So a request that fails to parse is not logged with the previous one's details
+        self.raw_requestline = b''
+        self.headers = self.path = self.route_name = None
+        start = perf_counter()
+        super().handle_one_request()
+        if not self._responded:
+            self.close_connection = True
+        if self.raw_requestline:
+            self._log_access(perf_counter() - start)
+
+    def _log_access(self, seconds):
+        headers = self.headers
+        if headers is None:
+            bytes_in, user_agent = 0, None
+        else:
+            length = headers.get('Content-Length')
+            bytes_in = int(length) if length and length.isdigit() else 0
+            user_agent = headers.get('User-Agent')
+        bytes_out = 0 if self.command == 'HEAD' else self.response_length
+        accesslog.LOG.access(self.client_address[0], self.command, self.path, self.route_name,
+                             self.response_status, bytes_in, bytes_out, seconds, user_agent)
+
+    def log_request(self, code='-', size='-'):
+        # Every request gets a structured access record once it has been handled instead
+        pass
+
+    def log_message(self, format, *args):
+        accesslog.LOG.event('server', client=self.client_address[0], message=format % args)
+
+    def send_response(self, code, message=None):
+        super().send_response(code, message)
+        self._responded = True
+        self.response_status = code
+        self._framed = code < 200 or code in (204, 304)
+        self._connection_sent = False
+        self.requests_served += 1
+        headers = getattr(self, 'headers', None)
+        if self.requests_served >= self.max_requests:
+            self.close_connection = True
+        elif code >= 400 and headers is not None and headers.get('Content-Length', '0') != '0':
+            self.close_connection = True
+
+    def send_header(self, keyword, value):
+        key = keyword.lower()
+        if key == 'content-length':
+            self._framed = True
+            self.response_length = int(value)
+        elif key == 'transfer-encoding':
+            self._framed = True
+        elif key == 'connection':
+            self._connection_sent = True
+        super().send_header(keyword, value)
+
+    def end_headers(self):
+        if not getattr(self, '_framed', True):
+            self.close_connection = True
+        if not getattr(self, '_connection_sent', True):
+            if self.close_connection:
+                self.send_header('Connection', 'close')
+            elif self.request_version == 'HTTP/1.0':
+                self.send_header('Connection', 'keep-alive')
+        super().end_headers()
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that hands connections to a fixed pool of worker threads."""
+
+    daemon_threads = True
+    request_queue_size = 128
+    # Other connections have threads of their own, so handlers may keep theirs open between requests
+    pooled = True
+
+    def __init__(self, server_address, handler_class, workers=DEFAULT_THREADS, backlog=None, bind_and_activate=True):
+        self.workers = max(1, workers)
+        # Bound the hand-off queue so a flood of connections waits in the kernel backlog
+        self._requests = queue.Queue(maxsize=backlog or self.workers * 4)
+        self._threads = []
+        super().__init__(server_address, handler_class, bind_and_activate)
+
+    def serve_forever(self, poll_interval=0.5):
+        # Started here rather than in __init__ so a server built before a fork gets threads in each child
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._worker, daemon=self.daemon_threads)
+            thread.start()
+            self._threads.append(thread)
+        super().serve_forever(poll_interval)
+
+    def _worker(self):
+        """Pull accepted connections off the queue and handle them."""
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        self._requests.put((request, client_address))
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._threads:
+            self._requests.put(None)
+
+
+def serve_prefork(handler_class, port, workers=DEFAULT_PROCESSES, threads=PREFORK_THREADS):
+    """Bind once, then fork workers that all accept on the shared listening socket."""
+    if not hasattr(os, "fork"):
+        raise RuntimeError("prefork mode needs os.fork()")
+
+    if threads > 1:
+        httpd = PooledHTTPServer(('', port), handler_class, workers=threads, bind_and_activate=False)
+    else:
+        httpd = HTTPServer(('', port), handler_class, bind_and_activate=False)
+    httpd.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    httpd.server_bind()
+    httpd.server_activate()
+    # Workers pool their counts so a scrape of /metrics on any of them sees the whole server
+    remove_metrics = metrics.share_between_processes()
+
+    children = []
+    for _ in range(max(1, workers)):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                httpd.serve_forever()
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def _stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    finally:
+        httpd.server_close()
+        remove_metrics()
+
+
+def make_server(handler_class, port, mode=DEFAULT_MODE, workers=DEFAULT_THREADS):
+    """Build an in-process server for the single or threaded modes."""
+    if mode == "single":
+        return HTTPServer(('', port), handler_class)
+    if mode == "threaded":
+        return PooledHTTPServer(('', port), handler_class, workers=workers)
+    raise ValueError(f"Unknown serving mode: {mode}")
+
+
+def serve(handler_class, port, mode=None, workers=None):
+    """Run handler_class on port using the selected serving mode."""
+    mode = mode or DEFAULT_MODE
+    workers = workers or DEFAULT_WORKERS
+    if mode == "prefork":
+        serve_prefork(handler_class, port, workers=workers or DEFAULT_PROCESSES, threads=PREFORK_THREADS)
+        return
+    if mode == "async":
+        # Imported here: asyncio is a large share of startup for the modes that do not use it
+        import async_server
+        # workers sizes the thread pool used for uploads and other disk-bound requests
+        async_server.run(handler_class, port, disk_workers=workers or async_server.DISK_WORKERS)
+        return
+    httpd = make_server(handler_class, port, mode=mode, workers=workers or DEFAULT_THREADS)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+def parse_args(default_port, argv=None):
+    """Read --port/--mode/--workers/--wsgi, falling back to PORT/SERVER_MODE/SERVER_WORKERS."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", default_port)))
+    parser.add_argument("--mode", choices=SERVING_MODES, default=DEFAULT_MODE)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    # Serve the app through its WSGI callable instead of running the handler class directly
+    parser.add_argument("--wsgi", action="store_true", dest="use_wsgi")
+    args = parser.parse_args(argv)
+    return {"port": args.port, "mode": args.mode, "workers": args.workers, "use_wsgi": args.use_wsgi}
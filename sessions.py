@@ -0,0 +1,314 @@
+import os
+import hmac
+import json
+import time
+import heapq
+import base64
+import secrets
+import threading
+from collections import OrderedDict
+
+import persistence
+
+# Login sessions keyed by opaque random IDs; the backend can be picked with SESSION_BACKEND
+SESSION_COOKIE = "session"
+SESSION_TTL = 7 * 24 * 3600
+SESSION_BACKENDS = ("memory", "sqlite", "file")
+# sqlite works in every serving mode (prefork workers share the database) and survives restarts
+DEFAULT_BACKEND = os.environ.get("SESSION_BACKEND", "sqlite")
+SESSION_FILES = {"sqlite": "sessions.sqlite3", "file": "sessions.jsonl"}
+# The in-process backends drop the least recently used session beyond this many
+MAX_SESSIONS = 1_000_000
+# Expired rows in the sqlite backend are purged at most this often
+PURGE_INTERVAL = 60
+# Session cookies carry an HMAC so forged or garbled ones are rejected before any store lookup.
+# The key comes from SESSION_SECRET, or a file created on first use and shared by every worker.
+SECRET_FILE = "sessions.secret"
+SIGNATURE_BYTES = 16
+
+
+def new_session_id():
+    return secrets.token_urlsafe(32)
+
+
+class MemorySessionStore:
+    """In-process sessions: a dict kept in LRU order plus a heap of expiry times.
+
+    Lookups are O(1). Expired sessions are popped off the heap on writes and checked on
+    reads, so one never outlives its TTL even if nothing evicts it.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._expiry = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self, username):
+        """Start a session for username and return its ID."""
+        sid = new_session_id()
+        self._add(sid, username, time.time() + self.ttl)
+        return sid
+
+    def get(self, sid):
+        """Return the username for a live session, or None."""
+        if not sid:
+            return None
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._sessions[sid]
+                return None
+            self._sessions.move_to_end(sid)
+            return entry[0]
+
+    def delete(self, sid):
+        with self._lock:
+            return self._sessions.pop(sid, None) is not None
+
+    def _add(self, sid, username, expires):
+        with self._lock:
+            self._expire(time.time())
+            self._sessions[sid] = (username, expires)
+            heapq.heappush(self._expiry, (expires, sid))
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            # Deleted and evicted sessions leave stale heap entries; rebuild when they dominate
+            if len(self._expiry) > 2 * len(self._sessions) + 1024:
+                self._expiry = [(entry[1], key) for key, entry in self._sessions.items()]
+                heapq.heapify(self._expiry)
+
+    def _expire(self, now):
+        while self._expiry and self._expiry[0][0] <= now:
+            expires, sid = heapq.heappop(self._expiry)
+            entry = self._sessions.get(sid)
+            if entry is not None and entry[1] == expires:
+                del self._sessions[sid]
+
+
+class FileSessionStore(MemorySessionStore):
+    """MemorySessionStore with an append-only journal replayed at startup, so logins survive restarts.
+
+    For a single server process; use the sqlite backend when prefork workers share sessions.
+    """
+
+    def __init__(self, path, ttl=SESSION_TTL, max_sessions=MAX_SESSIONS):
+        super().__init__(ttl, max_sessions)
+        self.path = path
+        self._entries = 0
+        now = time.time()
+        live = {}
+        try:
+            with open(path) as f:
+                for line in f:
+                    self._entries += 1
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if 'user' in record:
+                        live[record['sid']] = (record['user'], record['exp'])
+                    else:
+                        live.pop(record['sid'], None)
+        except FileNotFoundError:
+            pass
+        self._sessions.update((sid, entry) for sid, entry in live.items() if entry[1] > now)
+        self._expiry = [(entry[1], sid) for sid, entry in self._sessions.items()]
+        heapq.heapify(self._expiry)
+        # Session IDs are bearer credentials, so the journal is private to the server user
+        self._log = open(os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600), 'a', buffering=1)
+        self._compact()
+
+    def _add(self, sid, username, expires):
+        super()._add(sid, username, expires)
+        self._write({"sid": sid, "user": username, "exp": expires})
+
+    def delete(self, sid):
+        deleted = super().delete(sid)
+        if deleted:
+            self._write({"sid": sid})
+        return deleted
+
+    def _write(self, record):
+        with self._lock:
+            self._log.write(json.dumps(record) + '\n')
+            self._entries += 1
+        if self._entries > 2 * len(self._sessions) + 1024:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the journal with only the live sessions."""
+        with self._lock:
+            temp_path = self.path + '.tmp'
+            with open(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+                for sid, (username, expires) in self._sessions.items():
+                    f.write(json.dumps({"sid": sid, "user": username, "exp": expires}) + '\n')
+            os.replace(temp_path, self.path)
+            self._log.close()
+            self._log = open(self.path, 'a', buffering=1)
+            self._entries = len(self._sessions)
+
+
+class SQLiteSessionStore:
+    """Sessions in SQLite, shared by every worker process and kept across restarts."""
+
+    def __init__(self, path, ttl=SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        # One connection per thread; WAL lets readers and the writer work concurrently
+        self._connect = persistence.ThreadConnections(self.path)
+        self._next_purge = 0
+        # Session IDs are bearer credentials; SQLite gives the -wal/-shm files the database's mode
+        os.close(os.open(path, os.O_WRONLY | os.O_CREAT, 0o600))
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    username TEXT NOT NULL,
+                    expires REAL NOT NULL
+                ) WITHOUT ROWID""")
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM sessions WHERE expires > ?", (time.time(),)).fetchone()[0]
+
+    def create(self, username):
+        sid = new_session_id()
+        now = time.time()
+        with self._connect() as db:
+            db.execute("INSERT INTO sessions (id, username, expires) VALUES (?, ?, ?)", (sid, username, now + self.ttl))
+            if now >= self._next_purge:
+                self._next_purge = now + PURGE_INTERVAL
+                db.execute("DELETE FROM sessions WHERE expires <= ?", (now,))
+        return sid
+
+    def get(self, sid):
+        if not sid:
+            return None
+        row = self._connect().execute(
+            "SELECT username FROM sessions WHERE id = ? AND expires > ?", (sid, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def delete(self, sid):
+        with self._connect() as db:
+            return db.execute("DELETE FROM sessions WHERE id = ?", (sid,)).rowcount > 0
+
+
+def open_session_store(backend=None, path=None, ttl=SESSION_TTL):
+    """Open the configured session backend ("memory", "sqlite" or "file")."""
+    backend = backend or DEFAULT_BACKEND
+    if backend == "memory":
+        return MemorySessionStore(ttl)
+    if backend not in SESSION_FILES:
+        raise ValueError(f"Unknown session backend: {backend}")
+    path = path or SESSION_FILES[backend]
+    if backend == "sqlite":
+        return SQLiteSessionStore(path, ttl)
+    return FileSessionStore(path, ttl)
+
+
+def load_secret(path=SECRET_FILE):
+    """Return the signing key, creating a random one in path if there is none yet."""
+    secret = os.environ.get("SESSION_SECRET")
+    if secret:
+        return secret.encode()
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, 'rb') as f:
+            return f.read()
+    secret = secrets.token_bytes(32)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(secret)
+    return secret
+
+
+class TokenSigner:
+    """Appends a truncated HMAC-SHA256 to session IDs and checks it in constant time."""
+
+    def __init__(self, secret):
+        self._key = secret
+
+    def _signature(self, value):
+        digest = hmac.digest(self._key, value.encode(), 'sha256')[:SIGNATURE_BYTES]
+        return base64.urlsafe_b64encode(digest).rstrip(b'=')
+
+    def sign(self, value):
+        return f"{value}.{self._signature(value).decode()}"
+
+    def unsign(self, token):
+        """Return the signed value, or None if the signature does not match."""
+        value, sep, signature = token.rpartition('.')
+        if not sep or not hmac.compare_digest(signature.encode(), self._signature(value)):
+            return None
+        return value
+
+
+_signer = None
+
+
+def signer():
+    global _signer
+    if _signer is None:
+        _signer = TokenSigner(load_secret())
+    return _signer
+
+
+def cookie_value(header, name):
+    """Return one cookie's value from a Cookie header, scanning only as far as that cookie."""
+    if not header:
+        return None
+    prefix = name + '='
+    start = 0
+    while True:
+        i = header.find(prefix, start)
+        if i < 0:
+            return None
+        # Must start the header or follow a separator, so "xsession=" does not match "session="
+        if i == 0 or header[i - 1] in '; ':
+            end = header.find(';', i)
+            value = header[i + len(prefix):end if end >= 0 else len(header)].strip()
+            if len(value) > 1 and value[0] == value[-1] == '"':
+                value = value[1:-1]
+            return value
+        start = i + 1
+
+
+def parse_cookies(header):
+    """Parse a whole Cookie header into a dict; the first of any repeated names wins, as in browsers."""
+    cookies = {}
+    if header:
+        for item in header.split(';'):
+            name, sep, value = item.partition('=')
+            name = name.strip()
+            if sep and name and name not in cookies:
+                value = value.strip()
+                if len(value) > 1 and value[0] == value[-1] == '"':
+                    value = value[1:-1]
+                cookies[name] = value
+    return cookies
+
+
+def session_id(cookie_header):
+    """Return the verified session ID from a Cookie header, or None."""
+    token = cookie_value(cookie_header, SESSION_COOKIE)
+    if not token:
+        return None
+    return signer().unsign(token)
+
+
+def session_cookie(sid, ttl=SESSION_TTL):
+    """Set-Cookie value for a new session."""
+    return f"{SESSION_COOKIE}={signer().sign(sid)}; Max-Age={int(ttl)}; Path=/; HttpOnly; SameSite=Lax"
+
+
+def expired_cookie():
+    """Set-Cookie value that removes the session cookie."""
+    return f"{SESSION_COOKIE}=; Max-Age=0; Path=/; HttpOnly; SameSite=Lax"
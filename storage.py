@@ -0,0 +1,412 @@
+import os
+import hmac
+import time
+import queue
+import shutil
+import hashlib
+import threading
+import http.client
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+from concurrent.futures import ThreadPoolExecutor
+
+# Where blob contents go: "local" (the original layout), "sharded" or "s3"; picked with UPLOAD_BACKEND
+BACKENDS = ("local", "sharded", "s3")
+DEFAULT_BACKEND = os.environ.get("UPLOAD_BACKEND", "local")
+BLOB_DIR_NAME = ".blobs"
+# The sharded layout nests blobs this many two-hex-digit directories deep (256**depth directories)
+SHARD_DEPTH = int(os.environ.get("UPLOAD_SHARD_DEPTH", 2))
+
+# S3-compatible object store settings; s3local.py serves a stand-in for development
+S3_ENDPOINT = os.environ.get("S3_ENDPOINT", "http://127.0.0.1:9000")
+S3_BUCKET = os.environ.get("S3_BUCKET", "uploads")
+S3_ACCESS_KEY = os.environ.get("S3_ACCESS_KEY", "")
+S3_SECRET_KEY = os.environ.get("S3_SECRET_KEY", "")
+S3_REGION = os.environ.get("S3_REGION", "us-east-1")
+# Files larger than one part go up as a multipart upload, parts sent in parallel; S3 needs parts >= 5 MiB
+S3_PART_SIZE = int(os.environ.get("S3_PART_SIZE", 8 * 1024 * 1024))
+S3_MAX_PARTS = 10_000
+# Keep-alive connections to the store, shared by every thread of a process; also the part upload parallelism
+S3_CONNECTIONS = int(os.environ.get("S3_CONNECTIONS", 8))
+S3_TIMEOUT = 60
+# Part bodies and downloads are streamed in blocks of this size
+S3_BLOCK_SIZE = 256 * 1024
+# Uploaded blobs are kept in, and downloaded blobs fetched into, this local cache for sendfile and media jobs
+S3_CACHE_DIR_NAME = ".s3cache"
+
+
+class StorageError(OSError):
+    """The storage backend failed; the upload or download can be retried."""
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _sharded(root, digest, depth):
+    return os.path.join(root, *(digest[2 * i:2 * i + 2] for i in range(depth)), digest)
+
+
+class DiskBackend:
+    """Blobs as files under root/.blobs, in directories named after the leading digits of their digest.
+
+    depth=1 is the original layout (.blobs/ab/<digest>), which also keeps every stored name as a
+    visible hardlink in root. Deeper layouts spread blobs over 256**depth directories and skip
+    the links, so no directory grows with the number of uploads.
+    """
+
+    def __init__(self, root, depth=1, links=True):
+        self.root = root
+        self.depth = depth
+        self.links = links
+        self.blob_root = os.path.join(root, BLOB_DIR_NAME)
+        os.makedirs(self.blob_root, exist_ok=True)
+
+    def blob_path(self, digest):
+        return _sharded(self.blob_root, digest, self.depth)
+
+    def exists(self, digest):
+        return os.path.exists(self.blob_path(digest))
+
+    def put(self, path, digest, durable=False):
+        """Store the content of the file at path as digest; path itself is left in place."""
+        blob = self.blob_path(digest)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        # mkstemp creates 0600 files; blobs should read like any other upload
+        os.chmod(path, 0o644)
+        try:
+            os.link(path, blob)
+        except FileExistsError:
+            return
+        except OSError:
+            # No hardlinks here (another filesystem, say): copy, then rename into place
+            tmp_path = f"{blob}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.copyfile(path, tmp_path)
+            if durable:
+                with open(tmp_path, 'rb') as f:
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, blob)
+        if durable:
+            _fsync_dir(os.path.dirname(blob))
+
+    def discard(self, path, digest):
+        """Drop the caller's copy once the content is stored."""
+        os.remove(path)
+
+    def local_path(self, digest):
+        return self.blob_path(digest)
+
+    def open(self, digest):
+        return open(self.blob_path(digest), 'rb')
+
+    def mtime(self, digest):
+        try:
+            return os.stat(self.blob_path(digest)).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def delete(self, digest):
+        try:
+            os.remove(self.blob_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def name_taken(self, name, digest):
+        """Whether a file that is not this blob already sits where name's link would go."""
+        if not self.links:
+            return False
+        link = os.path.join(self.root, name)
+        return os.path.exists(link) and not os.path.samefile(link, self.blob_path(digest))
+
+    def link(self, name, digest):
+        if not self.links:
+            return
+        link = os.path.join(self.root, name)
+        if not os.path.exists(link):
+            try:
+                os.link(self.blob_path(digest), link)
+            except OSError:
+                pass
+
+    def unlink(self, name, digest):
+        if not self.links:
+            return
+        link = os.path.join(self.root, name)
+        if os.path.exists(link) and os.path.samefile(link, self.blob_path(digest)):
+            os.remove(link)
+
+
+class ConnectionPool:
+    """Up to size keep-alive HTTP connections to one host, shared by threads that wait for a free one."""
+
+    def __init__(self, scheme, host, port, size=S3_CONNECTIONS, timeout=S3_TIMEOUT):
+        self.connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        self.host = host
+        self.port = port
+        self.size = size
+        self.timeout = timeout
+        self._reset()
+        # Sockets inherited over fork belong to the parent; a forked worker opens its own
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+
+    @contextmanager
+    def connection(self, fresh=False):
+        """Borrow a connection; one that raised is closed rather than handed to the next caller."""
+        self._slots.acquire()
+        try:
+            conn = None
+            if not fresh:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    pass
+            if conn is None:
+                conn = self.connection_class(self.host, self.port, timeout=self.timeout)
+            try:
+                yield conn
+            except BaseException:
+                conn.close()
+                raise
+            self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+
+def _file_blocks(file, offset, count, block_size=S3_BLOCK_SIZE):
+    """count bytes of file from offset, read positionally so threads can share one file object."""
+    end = offset + count
+    while offset < end:
+        block = os.pread(file.fileno(), min(block_size, end - offset), offset)
+        if not block:
+            raise StorageError(f"{file.name} ended early")
+        offset += len(block)
+        yield block
+
+
+def _hmac(key, text):
+    return hmac.new(key, text.encode(), hashlib.sha256).digest()
+
+
+class S3Backend:
+    """Blobs as objects in an S3-compatible bucket, with a local read-through cache for this node.
+
+    Requests are signed with AWS Signature V4 over a bounded pool of keep-alive connections.
+    Blobs larger than one part are sent as a multipart upload whose parts go up in parallel,
+    one per pooled connection, so upload throughput grows with the number of parts in flight.
+    Downloads and media jobs read from the cache, which is filled on first use.
+    """
+
+    def __init__(self, root, endpoint=S3_ENDPOINT, bucket=S3_BUCKET, access_key=S3_ACCESS_KEY,
+                 secret_key=S3_SECRET_KEY, region=S3_REGION, part_size=S3_PART_SIZE, connections=S3_CONNECTIONS):
+        url = urlsplit(endpoint)
+        self.host = url.netloc
+        self.prefix = f"{url.path.rstrip('/')}/{bucket}"
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.part_size = part_size
+        self.connections = connections
+        self.pool = ConnectionPool(url.scheme, url.hostname, url.port, size=connections)
+        self.cache_root = os.path.join(root, S3_CACHE_DIR_NAME)
+        os.makedirs(self.cache_root, exist_ok=True)
+        self._executor = None
+        self._executor_pid = None
+
+    def _parts_executor(self):
+        # Threads do not survive fork, so each process makes its own
+        if self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.connections, thread_name_prefix='s3-part')
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    @staticmethod
+    def key(digest):
+        return f"blobs/{digest[:2]}/{digest}"
+
+    def cache_path(self, digest):
+        return _sharded(self.cache_root, digest, 1)
+
+    def _headers(self, method, path, query, payload_hash='UNSIGNED-PAYLOAD'):
+        """Signature V4 headers for a request; the body is not part of the signature."""
+        amz_date = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+        headers = {'host': self.host, 'x-amz-content-sha256': payload_hash, 'x-amz-date': amz_date}
+        if not self.access_key:
+            return headers
+        scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
+        canonical_query = '&'.join(f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}" for k, v in sorted(query))
+        signed = ';'.join(sorted(headers))
+        canonical = '\n'.join([
+            method, quote(path, safe='/-_.~'), canonical_query,
+            ''.join(f"{k}:{headers[k]}\n" for k in sorted(headers)), signed, payload_hash,
+        ])
+        to_sign = '\n'.join(['AWS4-HMAC-SHA256', amz_date, scope, hashlib.sha256(canonical.encode()).hexdigest()])
+        key = ('AWS4' + self.secret_key).encode()
+        for part in (amz_date[:8], self.region, 's3', 'aws4_request'):
+            key = _hmac(key, part)
+        signature = hmac.new(key, to_sign.encode(), hashlib.sha256).hexdigest()
+        headers['authorization'] = (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                                    f"SignedHeaders={signed}, Signature={signature}")
+        return headers
+
+    def _request(self, method, key, query=(), body=b'', file_span=None, expect=(200,), sink=None):
+        """Send one request and return (status, headers, body); sink, a file, takes a 200's body instead.
+
+        file_span is an (open file, offset, count) to send as the body. A request on a pooled
+        connection the server has meanwhile closed is retried once on a new one.
+        """
+        path = f"{self.prefix}/{key}"
+        target = quote(path, safe='/-_.~')
+        if query:
+            target += '?' + '&'.join(f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}" if v else quote(k, safe='-_.~')
+                                     for k, v in query)
+        for attempt in (0, 1):
+            headers = self._headers(method, path, query)
+            if file_span is not None:
+                file, offset, count = file_span
+                headers['content-length'] = str(count)
+                data = _file_blocks(file, offset, count)
+            else:
+                headers['content-length'] = str(len(body))
+                data = body
+            try:
+                with self.pool.connection(fresh=attempt > 0) as conn:
+                    conn.request(method, target, body=data, headers=headers)
+                    response = conn.getresponse()
+                    if sink is not None and response.status == 200:
+                        for block in iter(lambda: response.read(S3_BLOCK_SIZE), b''):
+                            sink.write(block)
+                        content = b''
+                    else:
+                        content = response.read()
+                    if response.will_close:
+                        conn.close()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                if attempt:
+                    raise StorageError(f"S3 {method} {key}: connection lost")
+            except (OSError, http.client.HTTPException) as e:
+                raise StorageError(f"S3 {method} {key}: {e}") from e
+        if response.status not in expect:
+            if response.status == 404:
+                raise FileNotFoundError(key)
+            raise StorageError(f"S3 {method} {key}: {response.status} {content[:200]!r}")
+        return response.status, response.headers, content
+
+    def exists(self, digest):
+        status, _, _ = self._request('HEAD', self.key(digest), expect=(200, 404))
+        return status == 200
+
+    def mtime(self, digest):
+        try:
+            _, headers, _ = self._request('HEAD', self.key(digest))
+        except FileNotFoundError:
+            return None
+        return parsedate_to_datetime(headers['Last-Modified']).timestamp()
+
+    def put(self, path, digest, durable=False):
+        """Upload the file at path as digest; every stored object is durable once the store answers."""
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            if size <= self.part_size:
+                self._request('PUT', self.key(digest), file_span=(f, 0, size))
+            else:
+                self._put_multipart(f, self.key(digest), size)
+
+    def _put_multipart(self, file, key, size):
+        part_size = max(self.part_size, -(-size // S3_MAX_PARTS))
+        _, _, content = self._request('POST', key, query=(('uploads', ''),))
+        upload_id = _xml_text(content, 'UploadId')
+        query = (('uploadId', upload_id),)
+        try:
+            parts = [(number, offset, min(part_size, size - offset))
+                     for number, offset in enumerate(range(0, size, part_size), 1)]
+            etags = list(self._parts_executor().map(
+                lambda part: self._put_part(file, key, upload_id, *part), parts))
+            manifest = ''.join(f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                               for (number, _, _), etag in zip(parts, etags))
+            body = f"<CompleteMultipartUpload>{manifest}</CompleteMultipartUpload>".encode()
+            _, _, content = self._request('POST', key, query=query, body=body)
+            # S3 can answer 200 and still report a failure in the body
+            if b'<Error>' in content:
+                raise StorageError(f"S3 complete {key}: {content[:200]!r}")
+        except BaseException:
+            try:
+                self._request('DELETE', key, query=query, expect=(200, 204, 404))
+            except OSError:
+                pass
+            raise
+
+    def _put_part(self, file, key, upload_id, number, offset, count):
+        query = (('partNumber', str(number)), ('uploadId', upload_id))
+        _, headers, _ = self._request('PUT', key, query=query, file_span=(file, offset, count))
+        return headers['ETag']
+
+    def discard(self, path, digest):
+        """Keep the uploaded copy as this node's cached one, so its first download is local."""
+        cached = self.cache_path(digest)
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        os.replace(path, cached)
+
+    def local_path(self, digest):
+        """The cached copy of the blob, downloaded first if this node does not have it."""
+        cached = self.cache_path(digest)
+        if os.path.exists(cached):
+            return cached
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        tmp_path = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                self._request('GET', self.key(digest), sink=f)
+            os.replace(tmp_path, cached)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return cached
+
+    def open(self, digest):
+        return open(self.local_path(digest), 'rb')
+
+    def delete(self, digest):
+        self._request('DELETE', self.key(digest), expect=(200, 204, 404))
+        try:
+            os.remove(self.cache_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def name_taken(self, name, digest):
+        return False
+
+    def link(self, name, digest):
+        pass
+
+    def unlink(self, name, digest):
+        pass
+
+
+def _xml_text(content, tag):
+    """Text of the first element named tag in an S3 XML reply, whatever its namespace."""
+    for element in ElementTree.fromstring(content).iter():
+        if element.tag.rpartition('}')[2] == tag:
+            return element.text
+    raise StorageError(f"S3 reply has no {tag}: {content[:200]!r}")
+
+
+def open_backend(root, name=DEFAULT_BACKEND):
+    """Build the storage backend called name for an upload directory."""
+    if name == "local":
+        return DiskBackend(root)
+    if name == "sharded":
+        return DiskBackend(root, depth=SHARD_DEPTH, links=False)
+    if name == "s3":
+        return S3Backend(root)
+    raise ValueError(f"Unknown upload backend: {name} (expected one of {', '.join(BACKENDS)})")
@@ -0,0 +1,149 @@
+import io
+import os
+import sys
+import http.client
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import downloads
+
+CONTENT = bytes(range(256)) * 4
+DIGEST = "0123abcd"
+
+
+@pytest.fixture
+def download(tmp_path):
+    path = tmp_path / "blob"
+    path.write_bytes(CONTENT)
+    with downloads.Download(open(path, 'rb'), DIGEST, "clip.mp4") as download:
+        yield download
+
+
+def request_headers(**fields):
+    headers = http.client.HTTPMessage()
+    for key, value in fields.items():
+        headers[key.replace('_', '-')] = value
+    return headers
+
+
+class FakeHandler:
+    """Just enough of a BaseHTTPRequestHandler for downloads.send()."""
+
+    def __init__(self, command, headers):
+        self.command = command
+        self.headers = headers
+        self.wfile = io.BytesIO()
+        self.status = None
+        self.response_headers = {}
+
+    def send_response(self, status):
+        self.status = status
+
+    def send_header(self, key, value):
+        self.response_headers[key] = value
+
+    def end_headers(self):
+        pass
+
+
+def send(download, command='GET', **fields):
+    handler = FakeHandler(command, request_headers(**fields))
+    downloads.send(handler, download)
+    return handler
+
+
+def test_whole_file(download):
+    handler = send(download)
+    assert handler.status == 200
+    assert handler.response_headers['Content-Length'] == str(len(CONTENT))
+    assert handler.response_headers['ETag'] == f'"{DIGEST}"'
+    assert handler.wfile.getvalue() == CONTENT
+
+
+def test_byte_range(download):
+    handler = send(download, range="bytes=10-19")
+    assert handler.status == 206
+    assert handler.response_headers['Content-Range'] == f"bytes 10-19/{len(CONTENT)}"
+    assert handler.wfile.getvalue() == CONTENT[10:20]
+
+
+@pytest.mark.parametrize("header, start", [("bytes=-100", len(CONTENT) - 100), ("bytes=-5000", 0)])
+def test_suffix_range(download, header, start):
+    handler = send(download, range=header)
+    assert handler.status == 206
+    assert handler.response_headers['Content-Range'] == f"bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}"
+    assert handler.wfile.getvalue() == CONTENT[start:]
+
+
+def test_open_ended_range_is_clamped(download):
+    handler = send(download, range="bytes=1000-99999")
+    assert handler.status == 206
+    assert handler.wfile.getvalue() == CONTENT[1000:]
+
+
+@pytest.mark.parametrize("header", [f"bytes={len(CONTENT)}-", f"bytes={len(CONTENT) + 10}-{len(CONTENT) + 20}", "bytes=-0"])
+def test_range_not_satisfiable(download, header):
+    handler = send(download, range=header)
+    assert handler.status == 416
+    assert handler.response_headers['Content-Range'] == f"bytes */{len(CONTENT)}"
+    assert handler.response_headers['Content-Length'] == '0'
+    assert handler.wfile.getvalue() == b''
+
+
+@pytest.mark.parametrize("header", ["bytes=0-9,20-29", "bytes=0-9, -10", "items=0-9", "bytes=20-10"])
+def test_multiple_or_unusable_ranges_send_whole_file(download, header):
+    handler = send(download, range=header)
+    assert handler.status == 200
+    assert 'Content-Range' not in handler.response_headers
+    assert handler.wfile.getvalue() == CONTENT
+
+
+def test_if_range_strong_match(download):
+    handler = send(download, range="bytes=0-9", if_range=f'"{DIGEST}"')
+    assert handler.status == 206
+    assert handler.wfile.getvalue() == CONTENT[:10]
+
+
+def test_if_range_last_modified(download):
+    handler = send(download, range="bytes=0-9", if_range=download.last_modified)
+    assert handler.status == 206
+
+
+@pytest.mark.parametrize("if_range", [f'W/"{DIGEST}"', '"somethingelse"', "Thu, 01 Jan 1970 00:00:00 GMT"])
+def test_if_range_weak_or_mismatched_sends_whole_file(download, if_range):
+    handler = send(download, range="bytes=0-9", if_range=if_range)
+    assert handler.status == 200
+    assert handler.wfile.getvalue() == CONTENT
+
+
+@pytest.mark.parametrize("if_none_match", [f'"{DIGEST}"', f'W/"{DIGEST}"', f'"other", "{DIGEST}"', "*"])
+def test_if_none_match_not_modified(download, if_none_match):
+    handler = send(download, if_none_match=if_none_match)
+    assert handler.status == 304
+    assert 'Content-Length' not in handler.response_headers
+    assert handler.response_headers['ETag'] == f'"{DIGEST}"'
+    assert handler.wfile.getvalue() == b''
+
+
+def test_if_none_match_wins_over_range(download):
+    handler = send(download, range="bytes=0-9", if_none_match=f'"{DIGEST}"')
+    assert handler.status == 304
+
+
+def test_if_none_match_other_etag(download):
+    handler = send(download, if_none_match='"other"', if_modified_since=download.last_modified)
+    assert handler.status == 200
+
+
+@pytest.mark.parametrize("since, status", [(None, 304), ("Thu, 01 Jan 1970 00:00:00 GMT", 200), ("not a date", 200)])
+def test_if_modified_since(download, since, status):
+    assert send(download, if_modified_since=since or download.last_modified).status == status
+
+
+def test_head_sends_length_without_body(download):
+    handler = send(download, 'HEAD', range="bytes=0-9")
+    assert handler.status == 200
+    assert handler.response_headers['Content-Length'] == str(len(CONTENT))
+    assert handler.wfile.getvalue() == b''
@@ -0,0 +1,90 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import multipart
+
+BOUNDARY = "----formboundary7MA4YWxk"
+
+
+def body(*parts, boundary=BOUNDARY):
+    """Encode (name, filename or None, content bytes) parts as a multipart/form-data body."""
+    out = b''
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        out += f"--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + content + b"\r\n"
+    return out + f"--{boundary}--\r\n".encode()
+
+
+def parse(data, directory, buffer_size=multipart.BUFFER_SIZE):
+    return multipart.parse_form(io.BytesIO(data), f"multipart/form-data; boundary={BOUNDARY}",
+                                len(data), str(directory), buffer_size)
+
+
+def temp_files(directory):
+    return [name for name in os.listdir(directory) if name.endswith('.part')]
+
+
+def test_fields_and_file(tmp_path):
+    fields, files = parse(body(("tag", None, b"demo"), ("file", "reel.mp4", b"\x00video\r\n")), tmp_path)
+    assert fields == {"tag": "demo"}
+    stored = files["file"]
+    assert stored.filename == "reel.mp4"
+    assert stored.size == 8
+    with open(stored.temp_path, 'rb') as f:
+        assert f.read() == b"\x00video\r\n"
+    stored.discard()
+    assert temp_files(tmp_path) == []
+
+
+@pytest.mark.parametrize("buffer_size", [1, 2, 3, 5, 7, 11, 13, 31, 64])
+def test_boundary_split_across_reads(tmp_path, buffer_size):
+    # Content that looks like the start of a delimiter must survive every split of the reads
+    content = b"a\r\n--" + BOUNDARY[:10].encode() + b"b\r\n-" * 3 + b"end"
+    fields, files = parse(body(("file", "a.bin", content), ("tag", None, b"x")), tmp_path, buffer_size)
+    assert fields == {"tag": "x"}
+    with open(files["file"].temp_path, 'rb') as f:
+        assert f.read() == content
+    assert files["file"].size == len(content)
+    files["file"].discard()
+
+
+@pytest.mark.parametrize("cut", [10, 60, 120, -3])
+def test_truncated_body(tmp_path, cut):
+    data = body(("file", "a.bin", b"x" * 100))[:cut]
+    with pytest.raises(multipart.MultipartError):
+        parse(data, tmp_path, buffer_size=16)
+    assert temp_files(tmp_path) == []
+
+
+def test_repeated_name_keeps_last_part(tmp_path):
+    _, files = parse(body(("file", "first.bin", b"one"), ("file", "second.bin", b"two")), tmp_path)
+    assert files["file"].filename == "second.bin"
+    assert temp_files(tmp_path) == [os.path.basename(files["file"].temp_path)]
+    files["file"].discard()
+    assert temp_files(tmp_path) == []
+
+
+def test_extra_file_parts_are_returned(tmp_path):
+    _, files = parse(body(("file", "a.bin", b"a"), ("other", "b.bin", b"b")), tmp_path)
+    assert sorted(files) == ["file", "other"]
+    for stored in files.values():
+        stored.discard()
+    assert temp_files(tmp_path) == []
+
+
+def test_filename_is_reduced_to_basename(tmp_path):
+    _, files = parse(body(("file", "C:\\clips\\..\\reel.mp4", b"a")), tmp_path)
+    assert files["file"].filename == "reel.mp4"
+    files["file"].discard()
+
+
+def test_wrong_content_type(tmp_path):
+    with pytest.raises(multipart.MultipartError):
+        multipart.parse_form(io.BytesIO(b""), "application/x-www-form-urlencoded", 0, str(tmp_path))
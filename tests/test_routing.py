@@ -0,0 +1,139 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import routing
+
+
+def make_router():
+    router = routing.Router()
+
+    @router.route("/events")
+    def events(handler):
+        handler.called = ("events",)
+
+    @router.route("/events/upcoming")
+    def upcoming(handler):
+        handler.called = ("upcoming",)
+
+    @router.route("/events/<event_id>", methods=("GET", "DELETE"))
+    def event(handler, event_id):
+        handler.called = ("event", event_id)
+
+    @router.route("/reels/<name>/thumbnail")
+    def thumbnail(handler, name):
+        handler.called = ("thumbnail", name)
+
+    @router.route("/reels/<name>/<kind>", methods=("GET", "HEAD"))
+    def rendition(handler, name, kind):
+        handler.called = ("rendition", name, kind)
+
+    return router
+
+
+class FakeHandler:
+    """Records what Router.dispatch sends instead of writing to a socket."""
+
+    def __init__(self, command, path):
+        self.command = command
+        self.path = path
+        self.called = None
+        self.error = None
+        self.status = None
+        self.response_headers = {}
+
+    def send_error(self, status):
+        self.error = status
+
+    def send_response(self, status):
+        self.status = status
+
+    def send_header(self, key, value):
+        self.response_headers[key] = value
+
+    def end_headers(self):
+        pass
+
+
+def dispatch(command, path, router=None):
+    handler = FakeHandler(command, path)
+    (router or make_router()).dispatch(handler)
+    return handler
+
+
+@pytest.mark.parametrize("path, called", [
+    ("/events", ("events",)),
+    ("/events/upcoming", ("upcoming",)),
+    ("/events/42", ("event", "42")),
+    ("/reels/clip.mp4/thumbnail", ("thumbnail", "clip.mp4")),
+    ("/reels/clip.mp4/720p", ("rendition", "clip.mp4", "720p")),
+])
+def test_static_routes_win_over_parameters(path, called):
+    assert dispatch("GET", path).called == called
+
+
+@pytest.mark.parametrize("path, called", [
+    ("/events/summer%20jam", ("event", "summer jam")),
+    ("/events/a%2Fb", ("event", "a/b")),
+    ("/reels/my%20clip.mp4/thumbnail", ("thumbnail", "my clip.mp4")),
+    ("/reels/caf%C3%A9.mp4/1080p", ("rendition", "café.mp4", "1080p")),
+])
+def test_parameters_are_percent_decoded(path, called):
+    assert dispatch("GET", path).called == called
+
+
+def test_query_string_is_split_off():
+    handler = dispatch("GET", "/events/42?days=30&days=7")
+    assert handler.called == ("event", "42")
+    assert handler.route_path == "/events/42"
+    assert handler.query == {"days": ["30", "7"]}
+    assert handler.route_name == "event"
+
+
+@pytest.mark.parametrize("command, path, allow", [
+    ("POST", "/events", "GET"),
+    ("PUT", "/events/42", "DELETE, GET"),
+    ("DELETE", "/reels/clip.mp4/720p", "GET, HEAD"),
+])
+def test_method_not_allowed(command, path, allow):
+    handler = dispatch(command, path)
+    assert handler.called is None
+    assert handler.status == 405
+    assert handler.response_headers["Allow"] == allow
+    assert handler.response_headers["Content-Length"] == "0"
+
+
+@pytest.mark.parametrize("path", ["/", "/nothing", "/events/42/extra", "/events/", "/reels/clip.mp4", "/reels//720p"])
+def test_not_found(path):
+    handler = dispatch("GET", path)
+    assert handler.called is None
+    assert handler.error == 404
+
+
+def test_middleware_wraps_in_order():
+    router = make_router()
+    seen = []
+
+    @router.use
+    def outer(handler, call_next):
+        seen.append("outer")
+        call_next()
+
+    @router.use
+    def inner(handler, call_next):
+        seen.append(("inner", handler.route_name))
+        call_next()
+
+    assert dispatch("GET", "/events/7", router).called == ("event", "7")
+    assert seen == ["outer", ("inner", "event")]
+
+
+def test_conflicting_routes_are_rejected():
+    router = make_router()
+    with pytest.raises(ValueError):
+        router.add("/events/<other_id>/tickets", lambda handler, other_id: None)
+    with pytest.raises(ValueError):
+        router.add("/events", lambda handler: None)
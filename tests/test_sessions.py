@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sessions
+
+BACKENDS = ("memory", "sqlite", "file")
+
+
+@pytest.fixture
+def signer(monkeypatch):
+    signer = sessions.TokenSigner(b"test key")
+    monkeypatch.setattr(sessions, "_signer", signer)
+    return signer
+
+
+def open_store(backend, directory, ttl=sessions.SESSION_TTL):
+    path = os.path.join(str(directory), "sessions") if backend != "memory" else None
+    return sessions.open_session_store(backend, path, ttl)
+
+
+def test_signed_cookie_round_trip(signer):
+    cookie = sessions.session_cookie("abc123").split(';')[0]
+    assert sessions.session_id(cookie) == "abc123"
+    assert sessions.session_id(f"theme=dark; {cookie}; lang=en") == "abc123"
+
+
+def test_tampered_signature(signer):
+    token = signer.sign("abc123")
+    value, signature = token.rsplit('.', 1)
+    flipped = ('A' if signature[0] != 'A' else 'B') + signature[1:]
+    assert sessions.session_id(f"session={value}.{flipped}") is None
+    assert sessions.session_id(f"session={value}.{signature[:-1]}") is None
+    # A valid signature does not carry over to another ID
+    assert sessions.session_id(f"session=abc124.{signature}") is None
+
+
+def test_signature_from_another_key(signer):
+    forged = sessions.TokenSigner(b"other key").sign("abc123")
+    assert sessions.session_id(f"session={forged}") is None
+
+
+@pytest.mark.parametrize("header", [
+    None,
+    "",
+    "session=",
+    "session=abc123",
+    "session=.",
+    "session=abc123.",
+    "session=\"\"",
+    "session",
+    "xsession=abc123",
+    "theme=dark",
+    ";;;",
+])
+def test_malformed_cookies(signer, header):
+    assert sessions.session_id(header) is None
+
+
+def test_quoted_cookie_and_name_prefix(signer):
+    token = signer.sign("abc123")
+    assert sessions.session_id(f'session="{token}"') == "abc123"
+    assert sessions.session_id(f"xsession=junk; session={token}") == "abc123"
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_revoked_session(tmp_path, backend):
+    store = open_store(backend, tmp_path)
+    sid = store.create("ann")
+    other = store.create("bob")
+    assert store.get(sid) == "ann"
+    assert store.delete(sid)
+    assert store.get(sid) is None
+    assert not store.delete(sid)
+    assert store.get(other) == "bob"
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_expired_session(tmp_path, monkeypatch, backend):
+    store = open_store(backend, tmp_path, ttl=60)
+    sid = store.create("ann")
+    assert store.get(sid) == "ann"
+    later = time.time() + 61
+    monkeypatch.setattr(sessions.time, "time", lambda: later)
+    assert store.get(sid) is None
+
+
+@pytest.mark.parametrize("backend", ("sqlite", "file"))
+def test_revoked_and_expired_stay_gone_after_reopen(tmp_path, monkeypatch, backend):
+    store = open_store(backend, tmp_path, ttl=60)
+    revoked = store.create("ann")
+    live = store.create("bob")
+    store.delete(revoked)
+    reopened = open_store(backend, tmp_path, ttl=60)
+    assert reopened.get(revoked) is None
+    assert reopened.get(live) == "bob"
+    later = time.time() + 61
+    monkeypatch.setattr(sessions.time, "time", lambda: later)
+    assert open_store(backend, tmp_path, ttl=60).get(live) is None
@@ -0,0 +1,451 @@
+import os
+import json
+import functools
+from html import escape
+from urllib.parse import parse_qs
+
+import serving
+import routing
+import admission
+import sessions
+import credentials
+import pages
+import multipart
+import resumable
+import blobstore
+import catalog
+import media
+import downloads
+import chat
+import events
+import metrics
+import accesslog
+import storage
+import wsgi
+
+UPLOAD_DIR = "uploads"
+
+# Registered users with salted password hashes, persisted across restarts
+USERS = credentials.CredentialStore()
+# Demo account, created on first start
+USERS.ensure('testuser', 'password123')
+
+# Logged-in sessions, keyed by the opaque ID in the session cookie
+SESSIONS = sessions.open_session_store()
+
+# Ensure upload directory exists
+if not os.path.exists(UPLOAD_DIR):
+    os.makedirs(UPLOAD_DIR)
+
+# In-progress resumable uploads, kept on disk so they survive restarts
+UPLOAD_SESSIONS = resumable.SessionStore(UPLOAD_DIR)
+
+# Content-addressed storage for uploads; identical reels share one blob, kept by the UPLOAD_BACKEND backend
+UPLOAD_STORE = blobstore.BlobStore(UPLOAD_DIR, storage.open_backend(UPLOAD_DIR))
+
+# Catalog of uploads (owner, size, mtime, digest) for paginated listings
+UPLOAD_CATALOG = catalog.open_catalog(UPLOAD_DIR, UPLOAD_STORE)
+
+# Background metadata, poster and preview jobs for uploads, run on a niced process pool
+MEDIA_QUEUE = media.open_media_queue(UPLOAD_DIR, UPLOAD_STORE, UPLOAD_CATALOG)
+# Files the media queue derives from a reel, served under /reels/<name>/<kind>
+MEDIA_FILES = {"poster": media.POSTER_NAME, "preview": media.PREVIEW_NAME}
+
+# Chat rooms with bounded history and a persistent log
+CHAT_ROOM = chat.ChatHub().room()
+
+# Upcoming events; each look keeps its own rendered /events pages until they change
+EVENTS = events.open_event_store()
+# Accounts that may add and remove events over HTTP (EVENT_ADMINS=alice,bob); python events.py works without one
+EVENT_ADMINS = frozenset(name for name in os.environ.get("EVENT_ADMINS", "").split(',') if name)
+
+# Body size caps, rate limits and the in-flight upload budget for the POST/PUT routes
+LIMITS = admission.RouteLimits()
+
+# Routes for AppHandler, registered by the decorators on its methods
+ROUTES = routing.Router()
+# Count and time every routed request for /metrics
+ROUTES.use(metrics.record_request)
+
+# Page values that are plain text and get escaped; the others (chat history, event lists) are HTML
+TEXT_VALUES = frozenset(('username', 'filename', 'tag'))
+
+
+def needs_logins(method):
+    """Route decorator: the route only exists on looks with logins; the others answer 404."""
+    @functools.wraps(method)
+    def wrapper(handler, *args, **kwargs):
+        if not handler.logins:
+            handler.send_error(404)
+            return None
+        return method(handler, *args, **kwargs)
+    return wrapper
+
+
+class AppHandler(routing.RoutedHandler, serving.KeepAliveHandler):
+    """The application every front end shares: routes, auth, uploads, chat and events.
+
+    A subclass gives it a look: layout is a pages.PageTemplate with a {content} field (and
+    optionally {title}), views maps each page to its content as str.format text, and titles
+    maps pages to titles. With logins = False there are no accounts and every visitor may
+    use every feature. Run it with serving.serve(), or as WSGI through wsgi.WSGIApp.
+    """
+
+    router = ROUTES
+
+    # Lets the asyncio server serve this room's chat feeds natively
+    chat_room = CHAT_ROOM
+    # Lets the asyncio server send reel downloads natively with sendfile
+    download_store = UPLOAD_STORE
+    # Started by whichever server runs the app, before any workers are forked
+    media_queue = MEDIA_QUEUE
+
+    logins = True
+    # Author of chat messages when there are no logins
+    guest = "You"
+    layout = None
+    views = {}
+    titles = {}
+    # CSS class for chat history and event list items
+    item_class = ''
+
+    # Auth result for the last Cookie header seen on this connection
+    _auth_cookie = None
+    _auth_user = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Rendered /events pages, kept per look
+        cls.events_pages = events.PageCache(EVENTS)
+
+    def _is_logged_in(self):
+        """Return the username for the request's session cookie, or None.
+
+        The answer is reused for later requests on the same connection with the same Cookie header.
+        """
+        if not self.logins:
+            return None
+        cookie = self.headers.get('Cookie')
+        if cookie != self._auth_cookie:
+            self._auth_cookie = cookie
+            self._auth_user = SESSIONS.get(sessions.session_id(cookie))
+        return self._auth_user
+
+    def _allowed(self):
+        """True when the request may use the features behind the login."""
+        return not self.logins or bool(self._is_logged_in())
+
+    def _send_empty(self, status, headers=()):
+        """Send a response with no body."""
+        self.send_response(status)
+        for key, value in headers:
+            self.send_header(key, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send_json(self, status, data, headers=None):
+        """Send a JSON response with an explicit Content-Length."""
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _read_form(self):
+        content_length = int(self.headers.get('Content-Length', 0))
+        return parse_qs(self.rfile.read(content_length).decode())
+
+    def _start_session(self, username):
+        """Log username in with a new session cookie and go home."""
+        session = SESSIONS.create(username)
+        self._send_empty(302, (('Set-Cookie', sessions.session_cookie(session)), ('Location', '/')))
+
+    def _layout_values(self, view, values):
+        content = self.views[view]
+        if values:
+            content = content.format(**{
+                key: escape(value) if key in TEXT_VALUES and isinstance(value, str) else value
+                for key, value in values.items()
+            })
+        return {'title': self.titles.get(view, ''), 'content': content}
+
+    def page_bytes(self, view, **values):
+        """The whole page for view, rendered with values."""
+        return self.layout.render(**self._layout_values(view, values))
+
+    def render(self, view, **values):
+        """Send a page; one with no values is the same for everyone and comes from the page cache."""
+        if values:
+            pages.send_page(self, self.layout.segments(**self._layout_values(view, values)))
+        else:
+            pages.send_cached_page(self, self.layout.cached(**self._layout_values(view, values)))
+
+    def chat_history(self):
+        """The history value of the chat page."""
+        return chat.render_history(CHAT_ROOM, self.item_class)
+
+    def events_list(self, rows):
+        """The events value of the events page."""
+        return events.render_list(rows, self.item_class)
+
+    @ROUTES.route("/uploads", methods=("POST",))
+    @ROUTES.route("/uploads/<session_id>", methods=("GET", "HEAD", "PUT", "DELETE"))
+    @ROUTES.route("/uploads/<session_id>/commit", methods=("POST",))
+    @needs_logins
+    @admission.limited(LIMITS.upload_chunk)
+    def resumable_upload(self, session_id=None):
+        """Resumable upload protocol under /uploads (create, PUT ranges, HEAD/GET status, commit)."""
+        username = self._is_logged_in()
+        if not username:
+            self._send_json(403, {"error": "You must be logged in to upload."})
+            return
+        try:
+            if session_id is None:
+                metadata = resumable.parse_metadata(self.headers.get('Upload-Metadata'))
+                length = int(self.headers.get('Upload-Length', '-1'))
+                session = UPLOAD_SESSIONS.create(metadata.get('filename'), length, owner=username)
+                self._send_json(201, session.status(), {'Location': f'/uploads/{session.id}'})
+                return
+            session = UPLOAD_SESSIONS.get(session_id, owner=username)
+            if self.command == 'POST':
+                filename = session.commit(UPLOAD_STORE)
+                entry = UPLOAD_STORE.get(filename)
+                UPLOAD_CATALOG.record(filename, username, entry['size'], entry['digest'])
+                MEDIA_QUEUE.submit(filename, entry['digest'])
+                self._send_json(201, {"filename": filename, "length": session.length})
+            elif self.command == 'PUT':
+                start, end = resumable.parse_content_range(self.headers.get('Content-Range'), session.length)
+                if int(self.headers.get('Content-Length', '0')) != end - start:
+                    raise resumable.UploadError("Content-Length does not match Content-Range")
+                session.write_range(self.rfile, start, end)
+                self._send_json(200, session.status(), {'Upload-Offset': str(session.offset())})
+            elif self.command == 'DELETE':
+                session.abort()
+                self.send_response(204)
+                self.end_headers()
+            else:
+                self._send_json(200, session.status(), {
+                    'Upload-Offset': str(session.offset()),
+                    'Upload-Length': str(session.length),
+                    'Upload-Ranges': resumable.format_ranges(session.received()),
+                    'Cache-Control': 'no-store',
+                })
+        except ValueError as e:
+            self._send_json(getattr(e, 'status', 400), {"error": str(e)})
+        except storage.StorageError:
+            # The session is left as it was, so the commit can simply be retried
+            self._send_json(503, {"error": "Upload storage is unavailable, try again."})
+
+    @ROUTES.route("/chat/messages")
+    @ROUTES.route("/chat/stream")
+    def chat_feed(self):
+        """Long-poll and Server-Sent Events feeds for the chat room."""
+        if not self._allowed():
+            self._send_empty(403)
+        else:
+            chat.serve_chat_api(self, CHAT_ROOM)
+
+    @ROUTES.route("/reels/<name>", methods=("GET", "HEAD"))
+    def reel(self, name):
+        """Stream an uploaded reel, with Range requests for seeking."""
+        if not self._allowed():
+            self._send_empty(403)
+        else:
+            downloads.send_download(self, UPLOAD_STORE, name)
+
+    @ROUTES.route("/reels/<name>/<kind>", methods=("GET", "HEAD"))
+    def reel_media(self, name, kind):
+        """Poster frame or low-bitrate preview made by the media queue."""
+        if not self._allowed():
+            self._send_empty(403)
+            return
+        filename = MEDIA_FILES.get(kind)
+        entry = UPLOAD_STORE.get(name)
+        if filename is None or entry is None:
+            self.send_error(404)
+            return
+        try:
+            file = open(MEDIA_QUEUE.output_path(entry['digest'], filename), 'rb')
+        except FileNotFoundError:
+            self.send_error(404)
+            return
+        downloads.send(self, downloads.Download(file, f"{entry['digest']}-{kind}", filename))
+
+    @ROUTES.route("/")
+    def home(self):
+        """Main page with options."""
+        username = self._is_logged_in()
+        if username:
+            self.render('home', username=username)
+        else:
+            self.render('welcome' if self.logins else 'home')
+
+    @ROUTES.route("/login")
+    @needs_logins
+    def login_page(self):
+        """Login form."""
+        self.render('login')
+
+    @ROUTES.route("/signup")
+    @needs_logins
+    def signup_page(self):
+        """Signup form."""
+        self.render('signup')
+
+    @ROUTES.route("/upload")
+    def upload_page(self):
+        """Upload form."""
+        self.render('upload' if self._allowed() else 'denied')
+
+    @ROUTES.route("/chat")
+    def chat_page(self):
+        """Chat room with its recent history."""
+        if not self._allowed():
+            self.render('denied')
+        else:
+            self.render('chat', username=self._is_logged_in() or self.guest, history=self.chat_history())
+
+    @ROUTES.route("/events/upcoming")
+    def events_api(self):
+        """Upcoming events as JSON: ?days=N or ?from=&to=, optional tag, paginated with limit and cursor."""
+        events.serve_events_api(self, EVENTS)
+
+    @ROUTES.route("/events", methods=("POST",))
+    @needs_logins
+    @admission.limited(LIMITS.events)
+    def add_event(self):
+        """Add an event from form fields title, starts, tags, location and description."""
+        if self._is_logged_in() not in EVENT_ADMINS:
+            self._send_empty(403)
+            return
+        try:
+            event = events.add_from_form(EVENTS, self._read_form())
+        except events.EventError as e:
+            events.send_json(self, 400, {"error": str(e)})
+            return
+        events.send_json(self, 201, event)
+
+    @ROUTES.route("/events/<event_id>", methods=("DELETE",))
+    @needs_logins
+    def remove_event(self, event_id):
+        """Remove an event."""
+        if self._is_logged_in() not in EVENT_ADMINS:
+            self._send_empty(403)
+        elif event_id.isdigit() and EVENTS.remove(int(event_id)):
+            self._send_empty(204)
+        else:
+            self._send_empty(404)
+
+    @ROUTES.route("/events")
+    def events(self):
+        """Upcoming events, rendered once and served from memory until they change."""
+        tag = self.query.get('tag', [None])[0]
+        pages.send_cached_page(self, self.events_pages.get(
+            lambda rows: self.page_bytes('events', events=self.events_list(rows), tag=tag), tag))
+
+    @ROUTES.route("/metrics")
+    def metrics(self):
+        """Request counts, latency histograms and in-flight gauges in Prometheus text format."""
+        metrics.send_metrics(self)
+
+    @ROUTES.route("/logout")
+    @needs_logins
+    def logout(self):
+        """End the session and go back home."""
+        if self._is_logged_in():
+            SESSIONS.delete(sessions.session_id(self.headers.get('Cookie')))
+            self._auth_cookie = self._auth_user = None
+        self._send_empty(302, (('Set-Cookie', sessions.expired_cookie()), ('Location', '/')))
+
+    @ROUTES.route("/login", methods=("POST",))
+    @needs_logins
+    @admission.limited(LIMITS.login)
+    def login(self):
+        """Handle login."""
+        post_data = self._read_form()
+        username = post_data.get('username', [''])[0]
+        password = post_data.get('password', [''])[0]
+
+        # Validate user credentials
+        if USERS.verify(username, password):
+            self._start_session(username)
+        else:
+            self.render('login_failed')
+
+    @ROUTES.route("/signup", methods=("POST",))
+    @needs_logins
+    @admission.limited(LIMITS.signup)
+    def signup(self):
+        """Handle signup."""
+        post_data = self._read_form()
+        username = post_data.get('username', [''])[0]
+        password = post_data.get('password', [''])[0]
+
+        # Register the user unless the name is taken
+        if not USERS.add(username, password):
+            self.render('signup_failed')
+        else:
+            self._start_session(username)
+
+    @ROUTES.route("/upload", methods=("POST",))
+    @admission.limited(LIMITS.upload)
+    def upload(self):
+        """Handle file upload."""
+        if not self._allowed():
+            self._send_empty(403)
+            return
+        try:
+            fields, files = multipart.parse_form(self.rfile, self.headers.get('Content-Type'), self.headers.get('Content-Length'), UPLOAD_DIR)
+        except multipart.MultipartError:
+            self._send_empty(400)
+            return
+        file_item = files.pop('file', None)
+        # Only the "file" part is kept; any other file parts would be left behind as temp files
+        for unused in files.values():
+            unused.discard()
+        if file_item and file_item.filename:
+            try:
+                filename = file_item.save(store=UPLOAD_STORE, durable=True)
+            except storage.StorageError:
+                file_item.discard()
+                self._send_empty(503)
+                return
+            UPLOAD_CATALOG.record(filename, self._is_logged_in(), file_item.size, file_item.digest)
+            MEDIA_QUEUE.submit(filename, file_item.digest)
+            self.render('uploaded', filename=filename)
+        else:
+            if file_item:
+                file_item.discard()
+            self.render('upload_failed')
+
+    @ROUTES.route("/chat", methods=("POST",))
+    @admission.limited(LIMITS.chat)
+    def post_chat(self):
+        """Post a chat message, then go back to the chat page, which now shows it."""
+        if not self._allowed():
+            self._send_empty(403)
+            return
+        message = CHAT_ROOM.post(self._is_logged_in() or self.guest, self._read_form().get('message', [''])[0])
+        if message is not None:
+            # The text itself is already in the room's log
+            accesslog.LOG.event('chat_message', id=message.id, user=message.user, length=len(message.text))
+        self._send_empty(303, (('Location', '/chat'),))
+
+
+def run(handler_class, port, server_class=None, mode=None, workers=None, use_wsgi=False):
+    """Start the app's background work and serve handler_class on port in the selected mode."""
+    print(f"Server running on port {port}...")
+    if server_class is not None:
+        # An explicit server class keeps the old single-server behaviour
+        httpd = server_class(('', port), handler_class)
+        httpd.serve_forever()
+        return
+    handler_class.media_queue.start()
+    if use_wsgi:
+        wsgi.serve(wsgi.WSGIApp(handler_class), port, mode=mode, workers=workers)
+    else:
+        serving.serve(handler_class, port, mode=mode, workers=workers)
@@ -0,0 +1,423 @@
+import os
+import sys
+import socket
+import argparse
+import importlib
+import functools
+import traceback
+from urllib.parse import quote, unquote_to_bytes
+
+import serving
+
+# Files handed to the server are read in blocks of this size where sendfile() is not possible
+FILE_BLOCK = 256 * 1024
+# Response headers that belong to the server's connection handling, not to a WSGI application
+HOP_BY_HOP = frozenset(('connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+                        'te', 'trailers', 'transfer-encoding', 'upgrade'))
+# Characters PATH_INFO keeps unquoted when it is turned back into the path the router matches
+_PATH_SAFE = "/:@!$&'()*+,;=~"
+# Where WSGIApp leaves the name of the route that answered, for the server's access log
+ROUTE_KEY = 'webapp.route'
+
+
+class EnvironHeaders:
+    """Request headers read straight out of a WSGI environ, for handler code that calls headers.get()."""
+
+    __slots__ = ('environ',)
+
+    def __init__(self, environ):
+        self.environ = environ
+
+    @staticmethod
+    def _key(name):
+        key = name.upper().replace('-', '_')
+        return key if key in ('CONTENT_TYPE', 'CONTENT_LENGTH') else 'HTTP_' + key
+
+    def get(self, name, default=None):
+        # Servers may pass an absent Content-Length or Content-Type as ''
+        return self.environ.get(self._key(name)) or default
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def __contains__(self, name):
+        return self._key(name) in self.environ
+
+
+class FileSlice:
+    """count bytes of an open file from offset, read with pread so the file position does not matter."""
+
+    __slots__ = ('file', 'offset', 'count')
+
+    def __init__(self, file, offset, count):
+        self.file = file
+        self.offset = offset
+        self.count = count
+
+    def __iter__(self):
+        fd, pos, end = self.file.fileno(), self.offset, self.offset + self.count
+        while pos < end:
+            data = os.pread(fd, min(FILE_BLOCK, end - pos), pos)
+            if not data:
+                return
+            pos += len(data)
+            yield data
+
+    def close(self):
+        self.file.close()
+
+
+class Body:
+    """A response iterable of bytes and FileSlices; closing it closes the files."""
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def __iter__(self):
+        for part in self.parts:
+            if type(part) is FileSlice:
+                yield from part
+            else:
+                yield part
+
+    def close(self):
+        for part in self.parts:
+            if type(part) is FileSlice:
+                part.close()
+
+
+class Output:
+    """The wfile of a handler run by WSGIApp.
+
+    Writes are kept and returned as the response iterable, so the server frames and sends them
+    in one go. Once the handler calls flush() (event streams do, after every event) they go
+    out through start_response's write() as they are made. sendfile() keeps a duplicate of the
+    file for the server to send after the handler has closed its own.
+    """
+
+    __slots__ = ('parts', 'write_out', 'streaming')
+
+    def __init__(self):
+        self.parts = []
+        self.write_out = None
+        self.streaming = False
+
+    def write(self, data):
+        data = data if type(data) is bytes else bytes(data)
+        if self.streaming:
+            self.write_out(data)
+        else:
+            self.parts.append(data)
+        return len(data)
+
+    def writelines(self, lines):
+        for data in lines:
+            self.write(data)
+
+    def flush(self):
+        if self.streaming or self.write_out is None:
+            return
+        self.streaming = True
+        for data in Body(self.parts):
+            self.write_out(data)
+        Body(self.parts).close()
+        self.parts = []
+
+    def sendfile(self, file, offset, count):
+        self.parts.append(FileSlice(os.fdopen(os.dup(file.fileno()), 'rb'), offset, count))
+
+
+class ResponseAdapter:
+    """Mixin for a BaseHTTPRequestHandler class run by WSGIApp: responses go to start_response."""
+
+    def send_response(self, code, message=None):
+        self.response_status = code
+        if message is None:
+            message = self.responses[code][0] if code in self.responses else ''
+        self._status = f"{code} {message}"
+        self._response_headers = []
+
+    def send_header(self, keyword, value):
+        if keyword.lower() not in HOP_BY_HOP:
+            self._response_headers.append((keyword, str(value)))
+
+    def end_headers(self):
+        self.wfile.write_out = self.start_response(self._status, self._response_headers)
+
+
+class WSGIApp:
+    """A routed BaseHTTPRequestHandler class (webapp.AppHandler and its looks) as a WSGI application.
+
+    Requests go straight to the handler's router with no HTTP parsing and no copy of the
+    headers: the handler reads the environ through EnvironHeaders and writes into an Output.
+    Paths the router does not know go to fallback when one is given, which is how a Flask app
+    keeps its own views after mounting this one.
+    """
+
+    def __init__(self, handler_class, fallback=None):
+        self.handler_class = type(handler_class.__name__, (ResponseAdapter, handler_class), {})
+        self.router = handler_class.router
+        self.fallback = fallback
+
+    def start(self):
+        """Start the app's background work; servers call this once, before forking workers."""
+        media_queue = getattr(self.handler_class, 'media_queue', None)
+        if media_queue is not None:
+            media_queue.start()
+
+    def __call__(self, environ, start_response):
+        path = quote(environ.get('PATH_INFO', '').encode('latin-1'), _PATH_SAFE) or '/'
+        if self.fallback is not None and self.router.match(path)[0] is None:
+            return self.fallback(environ, start_response)
+        handler = self.handler_class.__new__(self.handler_class)
+        query = environ.get('QUERY_STRING')
+        handler.path = f"{path}?{query}" if query else path
+        handler.command = environ['REQUEST_METHOD']
+        handler.request_version = environ.get('SERVER_PROTOCOL', 'HTTP/1.0')
+        handler.requestline = f"{handler.command} {handler.path} {handler.request_version}"
+        handler.client_address = (environ.get('REMOTE_ADDR', ''), int(environ.get('REMOTE_PORT') or 0))
+        handler.server = None
+        handler.close_connection = True
+        handler.headers = EnvironHeaders(environ)
+        handler.rfile = environ['wsgi.input']
+        handler.wfile = output = Output()
+        handler.start_response = start_response
+        try:
+            method = getattr(handler, 'do_' + handler.command, None)
+            if method is None:
+                handler.send_error(501)
+            else:
+                method()
+        except BaseException:
+            Body(output.parts).close()
+            raise
+        environ[ROUTE_KEY] = getattr(handler, 'route_name', None)
+        if output.write_out is None:
+            # The handler sent nothing at all
+            start_response('500 Internal Server Error', [('Content-Length', '0')])
+            return []
+        if output.streaming:
+            return []
+        parts = output.parts
+        if not any(type(part) is FileSlice for part in parts):
+            return parts
+        if len(parts) == 1 and 'wsgi.file_wrapper' in environ:
+            part = parts[0]
+            if part.offset == 0 and part.count == os.fstat(part.file.fileno()).st_size:
+                # A whole file: the server's file_wrapper may send it with sendfile()
+                return environ['wsgi.file_wrapper'](part.file, FILE_BLOCK)
+        return Body(parts)
+
+
+class LimitedInput:
+    """wsgi.input: the request body and nothing past it, read from the connection."""
+
+    __slots__ = ('rfile', 'remaining')
+
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        if not size:
+            return b''
+        data = self.rfile.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        if not size:
+            return b''
+        data = self.rfile.readline(size)
+        self.remaining -= len(data)
+        return data
+
+    def readlines(self, hint=-1):
+        return list(self)
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+
+class FileWrapper:
+    """wsgi.file_wrapper for WSGIHandler: a file it sends with sendfile() from where it stands."""
+
+    def __init__(self, file, block_size=FILE_BLOCK):
+        self.file = file
+        self.block_size = block_size
+
+    def __iter__(self):
+        return iter(functools.partial(self.file.read, self.block_size), b'')
+
+    def close(self):
+        self.file.close()
+
+
+class WSGIHandler(serving.KeepAliveHandler):
+    """Serves a WSGI application over the serving module's servers, keeping connections alive.
+
+    Subclasses set application; serve() makes one per application and mode.
+    """
+
+    application = None
+    _body = None
+    multithread = True
+    multiprocess = False
+
+    def _environ(self):
+        path, _, query = self.path.partition('?')
+        length = self.headers.get('Content-Length')
+        self._input = LimitedInput(self.rfile, int(length) if length and length.isdigit() else 0)
+        environ = {
+            'REQUEST_METHOD': self.command,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote_to_bytes(path).decode('latin-1'),
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.server.server_address[0] or 'localhost',
+            'SERVER_PORT': str(self.server.server_address[1]),
+            'SERVER_PROTOCOL': self.request_version,
+            'REMOTE_ADDR': self.client_address[0],
+            'REMOTE_PORT': str(self.client_address[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': self._input,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': self.multithread,
+            'wsgi.multiprocess': self.multiprocess,
+            'wsgi.run_once': False,
+            'wsgi.file_wrapper': FileWrapper,
+        }
+        for key, value in self.headers.items():
+            key = key.upper().replace('-', '_')
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = 'HTTP_' + key
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _start_response(self, status, headers, exc_info=None):
+        if exc_info is not None and self._headers_sent:
+            raise exc_info[1].with_traceback(exc_info[2])
+        self._app_status, self._app_headers = status, headers
+        return self._write
+
+    def _send_headers(self):
+        code, _, message = self._app_status.partition(' ')
+        self.send_response(int(code), message)
+        for key, value in self._app_headers:
+            self.send_header(key, value)
+        self.end_headers()
+        self._headers_sent = True
+
+    def _write(self, data):
+        if not self._headers_sent:
+            self._send_headers()
+        if data and self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def _sendfile(self, file, offset, count):
+        if not self._headers_sent:
+            self._send_headers()
+        if self.command == 'HEAD':
+            return
+        if type(self.connection) is socket.socket:
+            self.connection.sendfile(file, offset, count)
+        else:
+            for data in FileSlice(file, offset, count if count is not None else os.fstat(file.fileno()).st_size - offset):
+                self.wfile.write(data)
+
+    def flush_headers(self):
+        if self._body:
+            self._headers_buffer.extend(self._body)
+            self._body = None
+        super().flush_headers()
+
+    def _run_application(self):
+        self._body = None
+        self._headers_sent = False
+        self._app_status = self._app_headers = None
+        try:
+            environ = self._environ()
+            result = self.application(environ, self._start_response)
+            self.route_name = environ.get(ROUTE_KEY)
+            try:
+                if type(result) is list:
+                    if not any(key.lower() == 'content-length' for key, _ in self._app_headers):
+                        self._app_headers = [*self._app_headers, ('Content-Length', str(sum(map(len, result))))]
+                    # A buffered body goes out in the same write as the headers
+                    if self.command != 'HEAD':
+                        self._body = result
+                    self._send_headers()
+                elif type(result) is FileWrapper:
+                    self._sendfile(result.file, result.file.tell(), None)
+                elif type(result) is Body:
+                    for part in result.parts:
+                        if type(part) is FileSlice:
+                            self._sendfile(part.file, part.offset, part.count)
+                        else:
+                            self._write(part)
+                else:
+                    for data in result:
+                        self._write(data)
+                if not self._headers_sent:
+                    self._send_headers()
+            finally:
+                close = getattr(result, 'close', None)
+                if close is not None:
+                    close()
+        except Exception:
+            if self._headers_sent:
+                raise
+            self.log_error("WSGI application failed:\n%s", traceback.format_exc())
+            self.send_error(500)
+        if self._input.remaining:
+            # The rest of the body is still on the connection
+            self.close_connection = True
+
+    do_GET = do_HEAD = do_POST = do_PUT = do_DELETE = do_PATCH = do_OPTIONS = _run_application
+
+
+def serve(application, port, mode=None, workers=None):
+    """Serve a WSGI application in one of the serving modes; with prefork it is a pre-fork WSGI server."""
+    mode = mode or serving.DEFAULT_MODE
+    if mode == "async":
+        raise ValueError("The async mode runs handler classes; use single, threaded or prefork for WSGI")
+    handler_class = type('WSGIHandler', (WSGIHandler,), {
+        'application': staticmethod(application),
+        'multithread': mode == "threaded" or (mode == "prefork" and serving.PREFORK_THREADS > 1),
+        'multiprocess': mode == "prefork",
+    })
+    serving.serve(handler_class, port, mode=mode, workers=workers)
+
+
+def load(spec):
+    """Import "module:name" and return the WSGI application it names (a Flask app's is wsgi_app)."""
+    module_name, _, name = spec.partition(':')
+    application = getattr(importlib.import_module(module_name), name or 'application')
+    # Flask.__call__ only runs wsgi_app; going to it directly also finds WSGIApp.start
+    return getattr(application, 'wsgi_app', application)
+
+
+def main(argv=None):
+    """python wsgi.py DJ:application --mode prefork --workers 4"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("app", help='module:callable, e.g. "DJ:application" or "main:app"')
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--mode", choices=[m for m in serving.SERVING_MODES if m != "async"],
+                        default=serving.DEFAULT_MODE if serving.DEFAULT_MODE != "async" else "threaded")
+    parser.add_argument("--workers", type=int, default=serving.DEFAULT_WORKERS)
+    args = parser.parse_args(argv)
+    sys.path.insert(0, os.getcwd())
+    application = load(args.app)
+    start = getattr(application, 'start', None)
+    if start is not None:
+        start()
+    print(f"Serving {args.app} on port {args.port} ({args.mode})...")
+    serve(application, args.port, mode=args.mode, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()